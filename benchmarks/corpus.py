@@ -0,0 +1,239 @@
+import argparse
+import chess
+import hashlib
+import os
+import random
+import zstandard as zstd
+
+from dataclasses import asdict, dataclass
+
+
+# ----------------------------
+# Synthetic Lichess PGN corpus
+# ----------------------------
+
+# Writes a deterministic corpus of games in the format of Lichess database dumps
+# - Headers, %clk and %eval comments and results look just like the real ones, all moves are legal
+# - The same parameters (including the seed) always give byte-identical files
+# - The corpus is written as plain PGN and as .zst (a single frame, like the original dumps, optionally split into frames)
+# Usage: python -m benchmarks.corpus <output.pgn> [--games N] [--seed S] [--frame-size B] ...
+
+# Time controls of each tempo, as (base [s], increment [s])
+TIME_CONTROLS = {
+    "Bullet": [(60, 0), (120, 1)],
+    "Blitz": [(180, 0), (180, 2), (300, 0), (300, 3)],
+    "Rapid": [(600, 0), (600, 5), (900, 10)],
+    "Classical": [(1800, 0), (1800, 20)],
+}
+
+# Terminations of games which did not end on the board (resignation, timeout, ...)
+TERMINATIONS = [("Normal", 0.85), ("Time forfeit", 0.14), ("Abandoned", 0.01)]
+
+OPENINGS = [
+    ("C20", "King's Pawn Game"), ("C50", "Italian Game"), ("B01", "Scandinavian Defense"), ("B20", "Sicilian Defense"),
+    ("A40", "Queen's Pawn Game"), ("D00", "Queen's Pawn Game: Accelerated London System"), ("C00", "French Defense"),
+    ("B10", "Caro-Kann Defense"), ("A00", "Van't Kruijs Opening"), ("C41", "Philidor Defense"),
+]
+
+
+# Parameters of a corpus
+# - tempo_mix: relative frequencies of tempos (keys of TIME_CONTROLS)
+# - eval_fraction, clock_fraction: fractions of games with %eval and %clk annotations (Lichess has evals for ~10% of games)
+# - bot_fraction: fraction of players with 'bot' in their names
+# - min_plies, max_plies: range of game lengths, moves are replayed from a pool of no_lines random legal games
+@dataclass
+class CorpusConfig:
+    games: int = 20000
+    seed: int = 2025
+    players: int = 2000
+    tempo_mix: tuple[tuple[str, float], ...] = (("Bullet", 0.25), ("Blitz", 0.40), ("Rapid", 0.30), ("Classical", 0.05))
+    eval_fraction: float = 0.3
+    clock_fraction: float = 0.95
+    bot_fraction: float = 0.01
+    min_plies: int = 10
+    max_plies: int = 160
+    no_lines: int = 256
+
+
+# Generates random legal games (SAN moves and the final board), which are then shared by all generated games
+def generate_lines(rng: random.Random, config: CorpusConfig) -> list[tuple[list[str], str | None]]:
+    lines = []
+
+    for _ in range(config.no_lines):
+        board = chess.Board()
+        moves = []
+
+        for _ in range(config.max_plies):
+            legal_moves = list(board.legal_moves)
+            if not legal_moves:
+                break
+
+            # Captures are preferred a bit, so games get to the endgame (and to the end) more often
+            captures = [move for move in legal_moves if board.is_capture(move)]
+            move = rng.choice(captures if captures and rng.random() < 0.3 else legal_moves)
+
+            moves.append(board.san(move))
+            board.push(move)
+
+        lines.append((moves, board.result() if board.is_game_over() else None))
+
+    return lines
+
+
+# Formats a clock annotation value
+def format_clock(seconds: int) -> str:
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+# Yields PGN data of all games of the corpus
+def generate_games(config: CorpusConfig):
+    rng = random.Random(config.seed)
+    lines = generate_lines(rng, config)
+
+    names = [f"{'Bot' if rng.random() < config.bot_fraction else 'Player'}{i:05d}" for i in range(config.players)]
+    ratings = [min(max(int(rng.gauss(1550, 380)), 600), 3200) for _ in range(config.players)]
+
+    tempos, tempo_weights = zip(*config.tempo_mix)
+    terminations, termination_weights = zip(*TERMINATIONS)
+
+    for n_game in range(config.games):
+        # Some players play a lot more games than others
+        white, black = (int(config.players * rng.random() ** 2) for _ in range(2))
+        if white == black:
+            black = (black + 1) % config.players
+
+        tempo = rng.choices(tempos, tempo_weights)[0]
+        base, increment = rng.choice(TIME_CONTROLS[tempo])
+        eco, opening = rng.choice(OPENINGS)
+
+        moves, board_result = rng.choice(lines)
+        if board_result is None or board_result == "*":
+            moves = moves[:rng.randint(min(config.min_plies, len(moves)), len(moves))]
+
+            termination = rng.choices(terminations, termination_weights)[0]
+            result = rng.choice(["1-0", "0-1"]) if termination != "Normal" or rng.random() < 0.9 else "1/2-1/2"
+        else:
+            termination, result = "Normal", board_result
+
+        white_diff = rng.randint(3, 9)
+        white_diff = {"1-0": white_diff, "0-1": -white_diff}.get(result, 0)
+        seconds = n_game * 86400 * 28 // config.games
+
+        headers = [
+            ("Event", f"Rated {tempo} game"),
+            ("Site", f"https://lichess.org/{hashlib.sha1(f'{config.seed}/{n_game}'.encode()).hexdigest()[:8]}"),
+            ("Date", f"2025.02.{seconds // 86400 + 1:02d}"),
+            ("Round", "-"),
+            ("White", names[white]),
+            ("Black", names[black]),
+            ("Result", result),
+            ("UTCDate", f"2025.02.{seconds // 86400 + 1:02d}"),
+            ("UTCTime", format_clock(seconds % 86400).zfill(8)),
+            ("WhiteElo", str(ratings[white])),
+            ("BlackElo", str(ratings[black])),
+            ("WhiteRatingDiff", f"{white_diff:+d}"),
+            ("BlackRatingDiff", f"{-white_diff:+d}"),
+            ("ECO", eco),
+            ("Opening", opening),
+            ("TimeControl", f"{base}+{increment}"),
+            ("Termination", termination),
+        ]
+
+        has_evals = rng.random() < config.eval_fraction
+        has_clocks = rng.random() < config.clock_fraction
+
+        # Main line with annotations
+        clocks = [base, base]
+        eval = rng.gauss(0, 0.3)
+        tokens = []
+
+        for ply, move in enumerate(moves):
+            tokens.append(f"{ply // 2 + 1}{'.' if ply % 2 == 0 else '...'} {move}")
+
+            comments = []
+            if has_evals:
+                eval += rng.gauss(0, 0.6)
+                if abs(eval) > 12 and rng.random() < 0.5:
+                    comments.append(f"[%eval #{'-' if eval < 0 else ''}{rng.randint(1, 8)}]")
+                else:
+                    comments.append(f"[%eval {eval:.2f}]")
+
+            if has_clocks:
+                clocks[ply % 2] = max(clocks[ply % 2] - int(rng.expovariate(1 / max(base / 60, 1))), 0) + increment
+                comments.append(f"[%clk {format_clock(clocks[ply % 2])}]")
+
+            if comments:
+                tokens.append("{ " + " ".join(comments) + " }")
+
+        tokens.append(result)
+
+        header_text = "".join(f"[{name} \"{value}\"]\n" for name, value in headers)
+        yield f"{header_text}\n{' '.join(tokens)}\n\n".encode()
+
+
+# Writes the corpus as plain PGN and .zst files, returns their paths
+# - With frame_size, the .zst file is made of independent frames of (about) frame_size decompressed bytes, each one ending at
+#   a game boundary (like files rewritten by reader.reframe)
+def write_corpus(output_file: str, config: CorpusConfig, frame_size: int | None = None) -> tuple[str, str]:
+    compressed_file = output_file + ".zst"
+    cctx = zstd.ZstdCompressor(level=3)
+
+    with open(output_file, "wb") as output, open(compressed_file, "wb") as compressed:
+        writer = cctx.stream_writer(compressed, closefd=False) if frame_size is None else None
+        frame = bytearray()
+
+        for game in generate_games(config):
+            output.write(game)
+
+            if writer is not None:
+                writer.write(game)
+                continue
+
+            frame += game
+            if len(frame) >= frame_size:
+                compressed.write(cctx.compress(frame))
+                frame.clear()
+
+        if writer is not None:
+            writer.close()
+        elif frame:
+            compressed.write(cctx.compress(frame))
+
+    return output_file, compressed_file
+
+
+# Returns a digest identifying the content of a corpus file
+def file_digest(input_file: str) -> str:
+    digest = hashlib.sha256()
+
+    with open(input_file, "rb") as file:
+        while chunk := file.read(1 << 20):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+if __name__ == "__main__":
+    defaults = CorpusConfig()
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("output_file")
+    arg_parser.add_argument("--games", type=int, default=defaults.games)
+    arg_parser.add_argument("--seed", type=int, default=defaults.seed)
+    arg_parser.add_argument("--players", type=int, default=defaults.players)
+    arg_parser.add_argument("--eval-fraction", type=float, default=defaults.eval_fraction)
+    arg_parser.add_argument("--clock-fraction", type=float, default=defaults.clock_fraction)
+    arg_parser.add_argument("--min-plies", type=int, default=defaults.min_plies)
+    arg_parser.add_argument("--max-plies", type=int, default=defaults.max_plies)
+    arg_parser.add_argument("--frame-size", type=int, default=None)
+    args = arg_parser.parse_args()
+
+    config = CorpusConfig(
+        games=args.games, seed=args.seed, players=args.players, eval_fraction=args.eval_fraction, clock_fraction=args.clock_fraction,
+        min_plies=args.min_plies, max_plies=args.max_plies
+    )
+
+    for file_path in write_corpus(args.output_file, config, args.frame_size):
+        print(f"{file_path}: {os.path.getsize(file_path) / 1e6:.1f} MB, sha256 {file_digest(file_path)[:16]}")
+
+    print(asdict(config))
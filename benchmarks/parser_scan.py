@@ -0,0 +1,100 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+# ---------------------
+# PGN scanner benchmark
+# ---------------------
+
+# Measures games/s and GB/s of pyparser.Parser.parse_next() on an in-memory PGN file
+# - With --baseline, the same measurement is done with pyparser module built from another revision
+#   (each build is imported in it's own subprocess) and outputs of both builds are compared
+# Usage: python -m benchmarks.parser_scan <file.pgn> [--baseline <directory with pyparser module>] [--repeat N]
+
+HEADERS = ["Event", "White", "Black", "WhiteElo", "BlackElo", "TimeControl", "Termination"]
+
+
+# Runs the benchmark with currently importable pyparser module, returns the results
+def measure(input_file: str, repeat: int) -> dict:
+    import pyparser
+
+    with open(input_file, "rb") as file:
+        data = file.read()
+
+    # Scanning only
+    scan_s = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+
+        parser = pyparser.Parser(data)
+        no_games = 0
+        while parser.parse_next():
+            no_games += 1
+
+        scan_s = min(scan_s, time.perf_counter() - start)
+
+    # Scanning with header access, output digest is calculated here
+    digest = hashlib.sha256()
+    start = time.perf_counter()
+
+    parser = pyparser.Parser(data)
+    while parser.parse_next():
+        digest.update(parser.all_data().encode())
+        for header in HEADERS:
+            digest.update(parser.header(header).encode())
+
+    headers_s = time.perf_counter() - start
+
+    return {
+        "module": pyparser.__file__,
+        "games": no_games,
+        "scan_games_per_s": no_games / scan_s,
+        "scan_gb_per_s": len(data) / scan_s / 1e9,
+        "headers_games_per_s": no_games / headers_s,
+        "digest": digest.hexdigest(),
+    }
+
+
+# Runs the benchmark in a subprocess, with given directory in front of the module search path
+def measure_in_subprocess(input_file: str, repeat: int, module_dir: str | None) -> dict:
+    env = dict(os.environ)
+    if module_dir:
+        env["PYTHONPATH"] = os.pathsep.join([module_dir, env.get("PYTHONPATH", "")])
+
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.parser_scan", input_file, "--repeat", str(repeat), "--measure"],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+
+    return json.loads(output)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("input_file")
+    arg_parser.add_argument("--baseline", default=None)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.input_file, args.repeat)))
+        sys.exit(0)
+
+    results = {"current": measure_in_subprocess(args.input_file, args.repeat, None)}
+    if args.baseline:
+        results["baseline"] = measure_in_subprocess(args.input_file, args.repeat, args.baseline)
+
+    for name, result in results.items():
+        print(f"{name:>8}: {result['games']} games, scan {result['scan_games_per_s']:10.0f} games/s {result['scan_gb_per_s']:6.3f} GB/s, "
+              f"with headers {result['headers_games_per_s']:10.0f} games/s ({result['module']})")
+
+    if args.baseline:
+        same = results["current"]["digest"] == results["baseline"]["digest"]
+        speedup = results["current"]["scan_gb_per_s"] / results["baseline"]["scan_gb_per_s"]
+        print(f"Outputs {'match' if same else 'DIFFER'}, scan speedup {speedup:.2f}x")
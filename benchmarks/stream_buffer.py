@@ -0,0 +1,71 @@
+import pyparser
+
+import argparse
+import mmap
+import os
+import time
+import tracemalloc
+
+
+# -----------------------
+# Stream buffer benchmark
+# -----------------------
+
+# Compares throughput of pyparser.Parser over all supported kinds of data sources
+# - read: a reader with read() only (data is copied from a new bytes object for each chunk)
+# - readinto: a binary file (data is written directly into the parser buffer)
+# - bytes, mmap: objects supporting the buffer protocol (data is parsed in place)
+# Usage: python -m benchmarks.stream_buffer <file.pgn> [--repeat N]
+
+
+# A reader which hides readinto() of the wrapped file
+class ReadOnly:
+    def __init__(self, file):
+        self.file = file
+
+    def read(self, size: int = -1) -> bytes:
+        return self.file.read(size)
+
+
+# Parses all games from the source, returns the number of games, time [s] and peak Python memory allocated [B]
+def parse_all(source) -> tuple[int, float, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    parser = pyparser.Parser(source)
+    no_games = 0
+    while parser.parse_next():
+        no_games += 1
+
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return no_games, elapsed, peak
+
+
+def benchmark(input_file: str, source_kind: str) -> tuple[int, float, int]:
+    with open(input_file, "rb") as file:
+        if source_kind == "read":
+            return parse_all(ReadOnly(file))
+        elif source_kind == "readinto":
+            return parse_all(file)
+        elif source_kind == "bytes":
+            return parse_all(file.read())
+        elif source_kind == "mmap":
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                result = parse_all(data)
+                return result
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("input_file")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    size_mb = os.path.getsize(args.input_file) / 1e6
+
+    for source_kind in ["read", "readinto", "bytes", "mmap"]:
+        no_games, elapsed, peak = min((benchmark(args.input_file, source_kind) for _ in range(args.repeat)), key=lambda r: r[1])
+        print(f"{source_kind:>8}: {no_games} games, {size_mb / elapsed:8.1f} MB/s, peak Python allocations {peak / 1024:8.1f} KB")
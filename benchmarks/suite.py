@@ -0,0 +1,304 @@
+from . import corpus
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from dataclasses import asdict
+
+try:
+    import resource         # Not available on Windows, peak RSS is not reported there
+except ImportError:
+    resource = None
+
+
+# ---------------
+# Benchmark suite
+# ---------------
+
+# Measures throughput of the whole processing pipeline on a synthetic corpus (see benchmarks.corpus)
+# - Each stage runs in its own subprocess, so peak RSS is measured separately for each of them
+# - Results (games/s, MB/s of decompressed PGN data, peak RSS and time of each stage) are saved as JSON, together with the commit,
+#   so results of different commits can be compared with --compare
+# - Everything runs offline, the final stage runs without an engine
+# Usage: python -m benchmarks.suite [--games N] [--seed S] [--stages a,b,...] [--repeat N] [--output results.json] [--compare old.json]
+
+STAGES = ["parser_scan", "parser_batch", "zstd_quick_reader", "standard_slow_reader", "build_index", "find_players", "sample_games", "create_dataset"]
+
+# Search parameters of find_players and sample_games stages
+RATING_BUCKETS = [(0, 1000, 20), (1000, 1500, 20), (1500, 2000, 20), (2000, 3000, 10)]
+MIN_GAMES = 3
+
+
+# ----------------
+# Benchmark stages
+# ----------------
+
+# Each stage processes the corpus and returns the number of games it has read and the amount of (decompressed) PGN data in bytes
+# - Searching stages read the whole corpus, even though the parser skips most of the games
+# - Imports are done inside stages, so they are not a part of measured time, but their memory is (just like in real runs)
+
+def parser_scan(plain_file: str, compressed_file: str, args: argparse.Namespace) -> tuple[int, int]:
+    import pyparser
+
+    with open(plain_file, "rb") as file:
+        data = file.read()
+
+    parser = pyparser.Parser(data)
+    no_games = 0
+    while parser.parse_next():
+        no_games += 1
+
+    return no_games, len(data)
+
+
+def parser_batch(plain_file: str, compressed_file: str, args: argparse.Namespace) -> tuple[int, int]:
+    import pyparser
+    from preprocessing import search
+
+    parser = pyparser.Parser(compressed_file)
+    no_games = 0
+    while len(batch := parser.parse_batch(4096, search.BATCH_FIELDS)["has_evals"]) > 0:
+        no_games += len(batch)
+
+    return no_games, os.path.getsize(plain_file)
+
+
+def zstd_quick_reader(plain_file: str, compressed_file: str, args: argparse.Namespace) -> tuple[int, int]:
+    from preprocessing import reader
+
+    no_games = 0
+    with reader.ZstdQuickReader(compressed_file, max_games=sys.maxsize) as game_repo:
+        for game in game_repo:
+            game.players()
+            no_games += 1
+
+    return no_games, os.path.getsize(plain_file)
+
+
+# python-chess is much slower, so only a part of the corpus is read (its size is estimated from the average game size)
+def standard_slow_reader(plain_file: str, compressed_file: str, args: argparse.Namespace) -> tuple[int, int]:
+    from preprocessing import reader
+
+    no_games = 0
+    with reader.StandardSlowReader(plain_file, max_games=args.slow_games) as game_repo:
+        for game in game_repo:
+            game.players()
+            no_games += 1
+
+    return no_games, os.path.getsize(plain_file) * no_games // args.games
+
+
+def build_index(plain_file: str, compressed_file: str, args: argparse.Namespace) -> tuple[int, int]:
+    from preprocessing import index
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        with index.build_index(compressed_file, index_dir=index_dir) as game_index:
+            return len(game_index), os.path.getsize(plain_file)
+
+
+def find_players(plain_file: str, compressed_file: str, args: argparse.Namespace) -> tuple[int, int]:
+    from preprocessing import reader, search
+
+    with reader.ZstdQuickReader(compressed_file, max_games=sys.maxsize, game_filter=search.STD_RAPID_10_MINUTES_WITH_EVAL_FILTER) as game_repo:
+        search.find_players(
+            game_repo, search.is_std_rapid_10_minutes_with_eval, search.is_std_rapid_10_minutes_with_eval_batch,
+            k_players=sys.maxsize, rating_buckets=RATING_BUCKETS, min_games=MIN_GAMES
+        )
+
+    return args.games, os.path.getsize(plain_file)
+
+
+def sample_games(plain_file: str, compressed_file: str, args: argparse.Namespace) -> tuple[int, int]:
+    from preprocessing import reader, search, sink
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        with reader.ZstdQuickReader(compressed_file, max_games=sys.maxsize, game_filter=search.STD_RAPID_10_MINUTES_WITH_EVAL_FILTER) as game_repo, \
+             sink.open_sink(os.path.join(output_dir, "games.pgn.zst")) as output:
+            search.sample_games(
+                game_repo, output, search.is_std_rapid_10_minutes_with_eval,
+                k_players=sys.maxsize, rating_buckets=RATING_BUCKETS, min_games=MIN_GAMES
+            )
+
+    return args.games, os.path.getsize(plain_file)
+
+
+# Final stage without an engine and an opening book, over the first final_games games of the corpus
+def create_dataset(plain_file: str, compressed_file: str, args: argparse.Namespace) -> tuple[int, int]:
+    from preprocessing import final, reader
+
+    with reader.StandardQuickReader(plain_file, max_games=args.final_games) as game_repo:
+        final.create_dataset(game_repo, engine_filepath=None, book_filepath=None, gpp=MIN_GAMES)
+
+        return game_repo.position().games, os.path.getsize(plain_file) * args.final_games // args.games
+
+
+# Returns peak RSS of this process [MB], or None if it's not available
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3       # Bytes on macOS, kilobytes elsewhere
+
+
+# Runs a single stage in this process, returns its results
+def measure(stage: str, plain_file: str, compressed_file: str, args: argparse.Namespace) -> dict:
+    stage_function = globals()[stage]
+    rss_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    no_games, no_bytes = stage_function(plain_file, compressed_file, args)
+    elapsed = time.perf_counter() - start
+
+    rss_after = peak_rss_mb()
+
+    return {
+        "seconds": elapsed,
+        "games": no_games,
+        "games_per_s": no_games / elapsed,
+        "mb_per_s": no_bytes / elapsed / 1e6,
+        "peak_rss_mb": rss_after,
+        "rss_growth_mb": rss_after - rss_before if rss_after is not None else None,
+    }
+
+
+# Runs a single stage in a subprocess, returns its results
+def measure_in_subprocess(stage: str, plain_file: str, compressed_file: str, args: argparse.Namespace) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.suite", "--measure", stage, "--plain-file", plain_file, "--compressed-file", compressed_file,
+         "--games", str(args.games), "--slow-games", str(args.slow_games), "--final-games", str(args.final_games)],
+        capture_output=True, text=True, check=True
+    ).stdout
+
+    return json.loads(output.splitlines()[-1])
+
+
+# ---------------
+# Corpus handling
+# ---------------
+
+# Writes the corpus into the work directory, unless it's already there (with the same parameters)
+def prepare_corpus(work_dir: str, config: corpus.CorpusConfig) -> tuple[str, str, dict]:
+    os.makedirs(work_dir, exist_ok=True)
+
+    plain_file = os.path.join(work_dir, f"corpus-{config.games}-{config.seed}.pgn")
+    meta_file = plain_file + ".json"
+    meta = {"config": asdict(config)}
+
+    if os.path.exists(meta_file):
+        with open(meta_file, "r") as file:
+            stored = json.load(file)
+
+        if stored["config"] == json.loads(json.dumps(meta["config"])) and os.path.exists(plain_file + ".zst"):
+            return plain_file, plain_file + ".zst", stored
+
+    print(f"[ Generating corpus of {config.games} games into {work_dir} ]")
+
+    start = time.perf_counter()
+    plain_file, compressed_file = corpus.write_corpus(plain_file, config)
+
+    meta["generation_seconds"] = time.perf_counter() - start
+    meta["plain_bytes"] = os.path.getsize(plain_file)
+    meta["compressed_bytes"] = os.path.getsize(compressed_file)
+    meta["sha256"] = corpus.file_digest(plain_file)
+
+    with open(meta_file, "w") as file:
+        json.dump(meta, file)
+
+    return plain_file, compressed_file, meta
+
+
+# Returns the current commit (with '+' if the working tree has changes), or None outside of a git repository
+def git_revision() -> str | None:
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    try:
+        commit = subprocess.run(["git", "-C", repo_dir, "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "-C", repo_dir, "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return commit + ("+" if dirty else "")
+
+
+# ---------
+# Reporting
+# ---------
+
+# Prints results of all stages, with speedups against the baseline (results of another run) if given
+def print_results(results: dict, baseline: dict | None = None):
+    if baseline is not None and baseline["corpus"]["sha256"] != results["corpus"]["sha256"]:
+        print(f"[ WARNING: Baseline {baseline['revision']} was measured on a different corpus ]")
+
+    for stage, result in results["stages"].items():
+        rss = f"{result['peak_rss_mb']:8.1f} MB" if result["peak_rss_mb"] is not None else "       n/a"
+        line = f"{stage:>22}: {result['games']:8d} games {result['seconds']:8.3f} s {result['games_per_s']:10.0f} games/s {result['mb_per_s']:8.1f} MB/s, peak RSS {rss}"
+
+        if baseline is not None and stage in baseline["stages"]:
+            line += f", {result['games_per_s'] / baseline['stages'][stage]['games_per_s']:5.2f}x vs {baseline['revision']}"
+
+        print(line)
+
+
+if __name__ == "__main__":
+    defaults = corpus.CorpusConfig()
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--games", type=int, default=defaults.games)
+    arg_parser.add_argument("--seed", type=int, default=defaults.seed)
+    arg_parser.add_argument("--stages", default=",".join(STAGES))
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--slow-games", type=int, default=2000, help="games read by standard_slow_reader stage")
+    arg_parser.add_argument("--final-games", type=int, default=2000, help="games read by create_dataset stage")
+    arg_parser.add_argument("--work-dir", default=".benchmark", help="directory of generated corpora (reused between runs)")
+    arg_parser.add_argument("--output", default=None, help="JSON file for results")
+    arg_parser.add_argument("--compare", default=None, help="JSON results of another run to compare with")
+    arg_parser.add_argument("--measure", default=None, help=argparse.SUPPRESS)
+    arg_parser.add_argument("--plain-file", default=None, help=argparse.SUPPRESS)
+    arg_parser.add_argument("--compressed-file", default=None, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.plain_file, args.compressed_file, args)))
+        sys.exit(0)
+
+    config = corpus.CorpusConfig(games=args.games, seed=args.seed)
+    plain_file, compressed_file, corpus_meta = prepare_corpus(args.work_dir, config)
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "corpus": corpus_meta,
+        "stages": {},
+    }
+
+    # The fastest run of each stage is reported (with the highest peak RSS of all runs)
+    for stage in args.stages.split(","):
+        runs = [measure_in_subprocess(stage, plain_file, compressed_file, args) for _ in range(args.repeat)]
+
+        results["stages"][stage] = min(runs, key=lambda run: run["seconds"])
+        if resource is not None:
+            results["stages"][stage]["peak_rss_mb"] = max(run["peak_rss_mb"] for run in runs)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as file:
+            baseline = json.load(file)
+
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+        print(f"[ Results saved to {args.output} ]")
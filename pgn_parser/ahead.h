@@ -0,0 +1,161 @@
+#pragma once
+
+#include "filter.h"
+#include "game.h"
+#include "scanner.h"
+#include "source.h"
+#include <algorithm>
+#include <atomic>
+#include <condition_variable>
+#include <exception>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+
+
+// ----------------
+// Parse-ahead ring
+// ----------------
+
+// Reads, decompresses and scans games of a file on a background thread, which never touches Python objects
+// - Games matching the filters are put into a bounded ring of records, the consumer takes them with pop()
+// - Records are swapped between the ring and the consumer, so their storage is reused and nothing is copied
+// - Waiting side is woken up only after half of the ring changes, so the threads do not ping-pong game by game
+// - Errors of the background thread are rethrown by pop(), once all games scanned before the error are consumed
+class ParseAhead
+{
+public:
+    ParseAhead(const std::string& path, StreamPosition start, std::size_t queue_size, std::size_t storage_size)
+        : m_source(std::make_unique<FileSource>(path, start)), m_storage_size(storage_size) {
+        for (std::size_t i = 0; i < std::max<std::size_t>(queue_size, 1); i++)
+            m_ring.emplace_back(storage_size);
+    }
+
+    ~ParseAhead() { stop(); }
+
+    ParseAhead(const ParseAhead&) = delete;
+    ParseAhead& operator=(const ParseAhead&) = delete;
+
+    // Starts the background thread - filters and limit can not be changed after that
+    void start(const GameFilters& filters, std::size_t limit) {
+        m_filters = filters;
+        m_limit = limit;
+        m_started = true;
+        m_thread = std::thread(&ParseAhead::run, this);
+    }
+
+    bool started() const { return m_started; }
+
+    // Returns true if pop() would not block
+    bool ready() {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        return m_count > 0 || m_done;
+    }
+
+    // Swaps given record with the next game from the ring, returns false at the end of data (or after reaching the limit)
+    // - Blocks until the background thread scans the game, so it should be called with the GIL released (unless it's ready)
+    bool pop(GameRecord& game) {
+        std::unique_lock<std::mutex> lock(m_mutex);
+        m_not_empty.wait(lock, [this] { return m_count > 0 || m_done; });
+
+        if (m_count == 0) {
+            if (m_error)
+                std::rethrow_exception(m_error);
+            return false;
+        }
+
+        std::swap(game, m_ring[m_head]);
+        m_head = (m_head + 1) % m_ring.size();
+        m_count--;
+
+        if (m_count == m_ring.size() / 2)
+            m_not_full.notify_one();
+        return true;
+    }
+
+    // Stops the background thread (even if the ring is full), games left in the ring are dropped
+    void stop() {
+        {
+            std::lock_guard<std::mutex> lock(m_mutex);
+            m_stop = true;
+            m_done = true;
+            m_count = 0;
+        }
+        m_not_full.notify_all();
+        m_not_empty.notify_all();
+
+        if (m_thread.joinable())
+            m_thread.join();
+    }
+
+    // Number of games which did not pass the filters
+    std::size_t skipped() const { return m_skipped.load(std::memory_order_relaxed); }
+
+    // Number of bytes read from the file by the background thread
+    uint64_t bytes_read() const { return m_source->bytes_read(); }
+
+private:
+    void run() {
+        try {
+            GameRecord game(m_storage_size);
+            std::size_t read = 0;
+
+            while (read < m_limit && scan_game(*m_source, game)) {
+                game.number = read++;
+                game.end = m_source->stream_position();
+
+                if (!m_filters.matches(game)) {
+                    m_skipped.fetch_add(1, std::memory_order_relaxed);
+                    continue;
+                }
+
+                std::unique_lock<std::mutex> lock(m_mutex);
+                m_not_full.wait(lock, [this] { return m_count < m_ring.size() || m_stop; });
+
+                if (m_stop)
+                    return;
+
+                std::swap(m_ring[(m_head + m_count) % m_ring.size()], game);
+                m_count++;
+
+                if (m_count == std::max<std::size_t>(m_ring.size() / 2, 1))
+                    m_not_empty.notify_one();
+            }
+        }
+        catch (...) {
+            std::lock_guard<std::mutex> lock(m_mutex);
+            m_error = std::current_exception();
+        }
+
+        {
+            std::lock_guard<std::mutex> lock(m_mutex);
+            m_done = true;
+        }
+        m_not_empty.notify_all();
+    }
+
+    std::unique_ptr<FileSource> m_source;
+
+    // Ring of scanned games - m_count records starting at m_head
+    std::vector<GameRecord> m_ring;
+    std::size_t m_head = 0;
+    std::size_t m_count = 0;
+    std::size_t m_storage_size;
+
+    // Synchronization
+    std::thread m_thread;
+    bool m_started = false;
+    std::mutex m_mutex;
+    std::condition_variable m_not_empty;
+    std::condition_variable m_not_full;
+    bool m_done = false;                        // No more games will be put into the ring
+    bool m_stop = false;
+    std::exception_ptr m_error;
+
+    // Selection
+    GameFilters m_filters;
+    std::size_t m_limit = 0;
+    std::atomic<std::size_t> m_skipped{0};
+};
@@ -0,0 +1,137 @@
+#pragma once
+
+#include <cstdint>
+#include <limits>
+#include <string>
+#include <string_view>
+#include <unordered_map>
+#include <utility>
+#include <vector>
+
+#include <pybind11/numpy.h>
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+
+
+namespace py = pybind11;
+
+
+// -------------------
+// Batch header column
+// -------------------
+
+// Value of integer columns for missing or malformed headers
+constexpr int32_t MISSING_INT = std::numeric_limits<int32_t>::min();
+
+
+// Parses an integer (with optional sign) of a header value starting at given position
+// - Returns parsed value (or MISSING_INT) and the position after it
+inline std::pair<int32_t, std::size_t> parse_int(std::string_view s, std::size_t pos) {
+    bool negative = pos < s.size() && s[pos] == '-';
+    if (pos < s.size() && (s[pos] == '-' || s[pos] == '+')) pos++;
+
+    int64_t value = 0;
+    std::size_t start = pos;
+    for (; pos < s.size() && s[pos] >= '0' && s[pos] <= '9' && value < (1LL << 31); pos++)
+        value = value * 10 + (s[pos] - '0');
+
+    if (pos == start || value >= (1LL << 31))
+        return {MISSING_INT, pos};
+
+    return {static_cast<int32_t>(negative ? -value : value), pos};
+}
+
+
+// Parses a "base+increment" time control, returns (MISSING_INT, MISSING_INT) if it's malformed (like "-" of correspondence games)
+// - With strict, nothing can follow the increment
+inline std::pair<int32_t, int32_t> parse_time_control(std::string_view s, bool strict = false) {
+    auto base = parse_int(s, 0);
+    auto increment = base.second < s.size() && s[base.second] == '+' ? parse_int(s, base.second + 1) : std::make_pair(MISSING_INT, s.size());
+
+    if (base.first == MISSING_INT || increment.first == MISSING_INT || (strict && increment.second != s.size()))
+        return {MISSING_INT, MISSING_INT};
+
+    return {base.first, increment.first};
+}
+
+
+// Returns a Python string of given UTF-8 value, invalid bytes are replaced by U+FFFD (like bytes.decode(errors="replace") does)
+inline py::str decode_utf8(std::string_view value) {
+    PyObject* string = PyUnicode_DecodeUTF8(value.data(), static_cast<Py_ssize_t>(value.size()), "replace");
+
+    if (string == nullptr)
+        throw py::error_already_set();
+
+    return py::reinterpret_steal<py::str>(string);
+}
+
+
+// A single column of headers of a batch of games
+// - Ratings (and rating differences) are stored as int32 values
+// - Time control is stored as (base, increment) int32 pairs, in seconds
+// - Any other header is dictionary-encoded (int32 codes + list of distinct values, see decode_utf8)
+class Column
+{
+public:
+    enum Type { INT, TIME_CONTROL, STRING };
+
+    Column(std::string tag) : m_tag(tag) {
+        if (tag == "WhiteElo" || tag == "BlackElo" || tag == "WhiteRatingDiff" || tag == "BlackRatingDiff")
+            m_type = INT;
+        else if (tag == "TimeControl")
+            m_type = TIME_CONTROL;
+        else
+            m_type = STRING;
+    }
+
+    const std::string& tag() const { return m_tag; }
+
+    // Appends a header value of the next game
+    void append(std::string_view value) {
+        if (m_type == INT)
+            m_data.push_back(parse_int(value, 0).first);
+        else if (m_type == TIME_CONTROL) {
+            auto [base, increment] = parse_time_control(value);
+
+            m_data.push_back(base);
+            m_data.push_back(increment);
+        }
+        else {
+            auto it = m_codes.try_emplace(std::string(value), static_cast<int32_t>(m_values.size())).first;
+            if (it->second == static_cast<int32_t>(m_values.size()))
+                m_values.emplace_back(value);
+
+            m_data.push_back(it->second);
+        }
+    }
+
+    // Converts the column to NumPy array (or to a (codes, values) pair for dictionary-encoded columns)
+    py::object to_python() const {
+        if (m_type == TIME_CONTROL) {
+            py::array_t<int32_t> array({static_cast<py::ssize_t>(m_data.size() / 2), static_cast<py::ssize_t>(2)});
+            std::copy(m_data.begin(), m_data.end(), array.mutable_data());
+            return array;
+        }
+
+        py::array_t<int32_t> array(m_data.size());
+        std::copy(m_data.begin(), m_data.end(), array.mutable_data());
+
+        if (m_type == STRING) {
+            py::list values(m_values.size());
+            for (std::size_t i = 0; i < m_values.size(); i++)
+                values[i] = decode_utf8(m_values[i]);
+
+            return py::make_tuple(array, values);
+        }
+
+        return array;
+    }
+
+private:
+    std::string m_tag;
+    Type m_type;
+
+    std::vector<int32_t> m_data;
+    std::unordered_map<std::string, int32_t> m_codes;
+    std::vector<std::string> m_values;
+};
\ No newline at end of file
@@ -2,11 +2,57 @@
 
 
 PYBIND11_MODULE(pyparser, m) {
+    m.attr("MISSING") = MISSING_INT;
+    m.attr("MATE_SCORE") = MATE_SCORE;
+
     py::class_<Parser>(m, "Parser")
-        .def(py::init<py::object>())
+        .def(py::init(&Parser::create), py::arg("source"), py::arg("queue_size") = QUEUE_SIZE, py::arg("start") = py::none())
+        .def("close", &Parser::close)
         .def("parse_next", &Parser::parse_next)
+        .def("parse_batch", &Parser::parse_batch, py::arg("n"), py::arg("fields"))
+        .def("filter_equals", &Parser::filter_equals, py::arg("tag"), py::arg("value"), py::arg("negate") = false)
+        .def("filter_prefix", &Parser::filter_prefix, py::arg("tag"), py::arg("value"), py::arg("negate") = false)
+        .def("filter_contains", &Parser::filter_contains, py::arg("tag"), py::arg("value"), py::arg("negate") = false,
+             py::arg("ignore_case") = false)
+        .def("filter_range", &Parser::filter_range, py::arg("tag"), py::arg("min"), py::arg("max"))
+        .def("filter_has_evals", &Parser::filter_has_evals)
+        .def("filter_has_clocks", &Parser::filter_has_clocks)
+        .def("clear_filters", &Parser::clear_filters)
+        .def("set_limit", &Parser::set_limit)
+        .def("set_schema", &Parser::set_schema, py::arg("fields"))
         .def("header", &Parser::header)
+        .def("fields", &Parser::fields)
         .def("all_data", &Parser::all_data)
+        .def("all_data_view", &Parser::all_data_view, py::arg("strip") = false)
         .def("has_clocks", &Parser::has_clocks)
-        .def("has_evals", &Parser::has_evals);
+        .def("has_evals", &Parser::has_evals)
+        .def("offset", &Parser::offset)
+        .def("position", &Parser::position)
+        .def("moves", &Parser::moves)
+        .def("clocks", &Parser::clocks)
+        .def("evals", &Parser::evals)
+        .def("replay", &Parser::replay)
+        .def("matched", &Parser::matched)
+        .def("skipped", &Parser::skipped)
+        .def("bytes_read", &Parser::bytes_read);
+
+    py::class_<GameView>(m, "GameView", py::buffer_protocol())
+        .def_buffer([](const GameView& view) {
+            return py::buffer_info(const_cast<char*>(view.data.get() + view.begin), 1, py::format_descriptor<uint8_t>::format(),
+                                   1, {static_cast<py::ssize_t>(view.size)}, {1}, true);
+        });
+
+    py::class_<Replay>(m, "Replay")
+        .def_property_readonly("plies", &Replay::plies)
+        .def_property_readonly("turn", &Replay::turn)
+        .def_property_readonly("checkmate", &Replay::checkmate)
+        .def_property_readonly("stalemate", &Replay::stalemate)
+        .def_property_readonly("keys", &Replay::keys)
+        .def_property_readonly("book_moves", &Replay::book_moves)
+        .def_property_readonly("material", &Replay::material);
+
+    // Replays SAN (or UCI) moves of a main line from given FEN (or the starting position), for games not read by Parser
+    m.def("replay", [](const std::vector<std::string>& moves, const std::string& fen) {
+        return Replay(std::vector<std::string_view>(moves.begin(), moves.end()), fen);
+    }, py::arg("moves"), py::arg("fen") = "");
 }
\ No newline at end of file
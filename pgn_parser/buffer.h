@@ -1,6 +1,8 @@
 ﻿#pragma once
 
 #include <array>
+#include <cstdint>
+#include <cstring>
 #include <exception>
 #include <iostream>
 #include <string>
@@ -19,53 +21,131 @@ namespace py = pybind11;
 // -------------------
 
 // An efficient implementation of simple buffering for std::istream
+// - Objects supporting the buffer protocol (bytes, bytearray, mmap, memoryview, ...) are read in place, without any copies
+// - Readers with readinto() method (binary files, zstandard stream readers, ...) fill the buffer directly
+// - Any other reader is asked for data with read(), which returns str or bytes
 template <int SIZE = 4096>
 class StreamBuffer : public std::streambuf
 {
 public:
-    StreamBuffer(py::object reader) : m_reader(reader) {
+    StreamBuffer(py::object source) : m_source(source) {
         char* base = m_buffer.data();
         setg(base, base, base);
+
+        if (PyObject_CheckBuffer(source.ptr())) {
+            if (PyObject_GetBuffer(source.ptr(), &m_view, PyBUF_SIMPLE) != 0)
+                throw py::error_already_set();
+
+            m_mode = SOURCE_BUFFER;
+
+            // The whole source is a get area
+            char* data = static_cast<char*>(m_view.buf);
+            setg(data, data, data + m_view.len);
+        }
+        else if (py::hasattr(source, "readinto")) {
+            m_mode = SOURCE_READINTO;
+            m_read = source.attr("readinto");
+            m_window = py::memoryview::from_memory(m_buffer.data(), static_cast<py::ssize_t>(m_buffer.size()), false);
+        }
+        else {
+            m_mode = SOURCE_READ;
+            m_read = source.attr("read");
+        }
+    }
+
+    ~StreamBuffer() override {
+        if (m_mode == SOURCE_BUFFER)
+            PyBuffer_Release(&m_view);
     }
 
+    StreamBuffer(const StreamBuffer&) = delete;
+    StreamBuffer& operator=(const StreamBuffer&) = delete;
+
+    // Direct access to buffered data, for scanners working on whole chunks instead of single characters
+    // - fill() makes sure there is some data available, returns false at the end of data
+    bool fill() { return gptr() < egptr() || underflow() != traits_type::eof(); }
+    const char* begin() const { return gptr(); }
+    const char* end() const { return egptr(); }
+    void consume(std::size_t n) { setg(eback(), gptr() + n, egptr()); }
+
+    // Number of bytes consumed from the source so far
+    uint64_t position() const { return m_position + static_cast<uint64_t>(gptr() - eback()); }
+
 protected:
     // This method is called when the get area is exhausted
     int_type underflow() override {
-        if (gptr() < egptr()) 
+        if (gptr() < egptr())
             return traits_type::to_int_type(*gptr());
 
-        // Call reader.read(buffer_size)
-        py::object data = m_reader.attr("read")(m_buffer.size());
-        if (data.is_none()) return traits_type::eof();
+        std::size_t size = 0;
+
+        if (m_mode == SOURCE_READINTO)
+            size = fill_readinto();
+        else if (m_mode == SOURCE_READ)
+            size = fill_read();
+
+        if (size == 0) return traits_type::eof();
+
+        m_position += static_cast<uint64_t>(egptr() - eback());
+
+        char* base = m_buffer.data();
+        setg(base, base, base + size);
+
+        return traits_type::to_int_type(*gptr());
+    }
+
+private:
+    enum SourceMode { SOURCE_BUFFER, SOURCE_READINTO, SOURCE_READ };
+
+    // Calls reader.readinto(window), returns the number of bytes written into the buffer
+    std::size_t fill_readinto() {
+        py::object result = m_read(m_window);
+        if (result.is_none()) return 0;
+
+        std::size_t size = result.cast<std::size_t>();
+        if (size > m_buffer.size())
+            throw std::runtime_error("reader.readinto() returned invalid size");
+
+        return size;
+    }
+
+    // Calls reader.read(buffer_size) and copies the data into the buffer, returns the number of bytes copied
+    std::size_t fill_read() {
+        py::object data = m_read(m_buffer.size());
+        if (data.is_none()) return 0;
 
         // Expect bytes or str
-        std::string s;
-        if (py::isinstance<py::bytes>(data)) {
-            s = data.cast<std::string>();
-        } else if (py::isinstance<py::str>(data)) {
-            s = data.cast<std::string>();
+        char* ptr = nullptr;
+        Py_ssize_t size = 0;
+
+        if (PyBytes_Check(data.ptr())) {
+            if (PyBytes_AsStringAndSize(data.ptr(), &ptr, &size) != 0)
+                throw py::error_already_set();
+        } else if (PyUnicode_Check(data.ptr())) {
+            ptr = const_cast<char*>(PyUnicode_AsUTF8AndSize(data.ptr(), &size));
+            if (ptr == nullptr)
+                throw py::error_already_set();
         } else {
             throw std::runtime_error("reader.read() must return str or bytes");
         }
 
-        if (s.empty()) return traits_type::eof();
-
-        if (s.size() > m_buffer.size()) {
+        if (static_cast<std::size_t>(size) > m_buffer.size()) {
             throw std::runtime_error("reader returned too much data for buffer");
         }
 
-        std::memcpy(m_buffer.data(), s.data(), s.size());
+        std::memcpy(m_buffer.data(), ptr, size);
 
-        char* base = m_buffer.data();
-        setg(base, base, base + s.size());
-
-        return traits_type::to_int_type(*gptr());
+        return static_cast<std::size_t>(size);
     }
 
-private:
-    // Python reader adaptation
-    py::object m_reader;
+    // Python data source
+    py::object m_source;
+    SourceMode m_mode = SOURCE_READ;
+    py::object m_read;                  // Bound read() or readinto() method
+    py::object m_window;                // Writable memoryview of m_buffer
+    Py_buffer m_view{};                 // Exported buffer of the source
+    uint64_t m_position = 0;            // Number of bytes consumed before the current get area
 
     // Buffer container
     std::array<char, SIZE> m_buffer;
-};
\ No newline at end of file
+};
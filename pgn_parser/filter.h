@@ -0,0 +1,99 @@
+#pragma once
+
+#include "game.h"
+#include <algorithm>
+#include <cctype>
+#include <string>
+#include <string_view>
+#include <vector>
+
+
+// ------------
+// Game filters
+// ------------
+
+enum FilterKind {
+    FILTER_EQUALS = 0,          // Header value is equal to given string
+    FILTER_PREFIX,              // Header value starts with given string
+    FILTER_CONTAINS,            // Header value contains given string (ASCII case-insensitively with ignore_case)
+    FILTER_RANGE                // Leading integer of header value is within [min, max]
+};
+
+
+// A single declarative test on a value of named header
+// - Missing headers are treated as empty strings, just like Parser::header() does
+struct HeaderFilter
+{
+    FilterKind kind;
+    std::string tag;
+    std::string value;
+    long long min = 0;
+    long long max = 0;
+    bool negate = false;
+    bool ignore_case = false;   // value is then in lower case
+
+    bool matches(std::string_view header) const {
+        bool result = false;
+
+        switch (kind) {
+            case FILTER_EQUALS:
+                result = header == value;
+                break;
+            case FILTER_PREFIX:
+                result = header.compare(0, value.size(), value) == 0;
+                break;
+            case FILTER_CONTAINS:
+                if (ignore_case) {
+                    auto equal = [](char h, char v) { return std::tolower(static_cast<unsigned char>(h)) == v; };
+                    result = std::search(header.begin(), header.end(), value.begin(), value.end(), equal) != header.end();
+                } else {
+                    result = header.find(value) != std::string_view::npos;
+                }
+                break;
+            case FILTER_RANGE: {
+                // Parse leading integer (for example 600 from "600+0" time control)
+                std::size_t i = 0;
+                bool negative = i < header.size() && header[i] == '-';
+                if (negative) i++;
+
+                long long number = 0;
+                std::size_t digits = 0;
+                for (; i < header.size() && header[i] >= '0' && header[i] <= '9'; i++, digits++)
+                    number = number * 10 + (header[i] - '0');
+
+                if (negative) number = -number;
+
+                result = digits > 0 && min <= number && number <= max;
+                break;
+            }
+        }
+
+        return result != negate;
+    }
+};
+
+
+// All filters registered for a parser - a game has to pass every one of them
+struct GameFilters
+{
+    std::vector<HeaderFilter> headers;
+    bool require_evals = false;
+    bool require_clocks = false;
+
+    void clear() {
+        headers.clear();
+        require_evals = require_clocks = false;
+    }
+
+    bool matches(const GameRecord& game) const {
+        if ((require_evals && !game.evals) || (require_clocks && !game.clocks))
+            return false;
+
+        for (const HeaderFilter& filter : headers) {
+            if (!filter.matches(game.header(filter.tag)))
+                return false;
+        }
+
+        return true;
+    }
+};
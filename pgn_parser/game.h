@@ -0,0 +1,94 @@
+#pragma once
+
+#include "storage.h"
+#include <cctype>
+#include <cstdint>
+#include <string>
+#include <string_view>
+#include <utility>
+#include <vector>
+
+
+// -----------
+// Game record
+// -----------
+
+// A position in the data of a file, from which reading can start (or resume)
+// - Compressed files can be decompressed only from a beginning of a frame, so it's given by the frame and the offset in decompressed data
+// - For plain text files, only the offset matters
+struct StreamPosition
+{
+    uint64_t frame_offset = 0;          // Compressed offset of the frame
+    uint64_t frame_start = 0;           // Decompressed offset of the beginning of the frame
+    uint64_t offset = 0;                // Decompressed offset
+};
+
+
+// A single PGN header, stored as (offset, length) views
+// - Name always points into the game data
+// - Value points into the game data (without surrounding quotes), or into the scratch storage if quotes had to be removed from inside of it
+struct HeaderView
+{
+    uint32_t name_offset;
+    uint32_t name_length;
+    uint32_t value_offset;
+    uint32_t value_length;
+    bool value_in_scratch = false;
+};
+
+
+// Everything the scanner finds out about a single game
+// - Records are reused (and swapped between threads) without reallocating their storage
+struct GameRecord
+{
+    GameRecord(std::size_t capacity) : data(capacity) {}
+
+    GameStorage data;                                           // An entire PGN
+    uint64_t offset = 0;                                        // Position of data in the whole data read by the parser
+    uint64_t number = 0;                                        // Number of games read before this one (both matched and skipped)
+    StreamPosition end;                                         // Position right after the game (if the source can tell it)
+    std::vector<HeaderView> headers;                            // PGN headers, in order of appearance
+    std::string scratch;                                        // Header values with quotes removed from inside
+    std::size_t movetext_start = 0;                             // Position of movetext in data (after the last tag)
+    bool clocks = false;
+    bool evals = false;
+
+    void clear() {
+        data.clear();
+        headers.clear();
+        scratch.clear();
+        movetext_start = 0;
+        clocks = evals = false;
+    }
+
+    // Returns [begin, end) positions of data without leading and trailing whitespace
+    std::pair<std::size_t, std::size_t> stripped() const {
+        std::size_t begin = 0, end = data.size();
+
+        while (begin < end && std::isspace(static_cast<unsigned char>(data[begin]))) begin++;
+        while (end > begin && std::isspace(static_cast<unsigned char>(data[end - 1]))) end--;
+
+        return {begin, end};
+    }
+
+    // Returns the name of given header
+    std::string_view name(const HeaderView& header) const {
+        return std::string_view(data.data() + header.name_offset, header.name_length);
+    }
+
+    // Returns the value of given header
+    std::string_view value(const HeaderView& header) const {
+        const char* base = header.value_in_scratch ? scratch.data() : data.data();
+        return std::string_view(base + header.value_offset, header.value_length);
+    }
+
+    // Returns a value of the header with given name (the last one, if repeated), or an empty string if there is none
+    std::string_view header(std::string_view name) const {
+        for (auto it = headers.rbegin(); it != headers.rend(); ++it) {
+            if (this->name(*it) == name)
+                return value(*it);
+        }
+
+        return std::string_view();
+    }
+};
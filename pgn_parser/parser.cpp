@@ -1,64 +1,331 @@
 #include "parser.h"
 #include <cctype>
+#include <cerrno>
+#include <cmath>
+#include <cstdlib>
+#include <cstring>
+#include <stdexcept>
+#include <system_error>
+#include <tuple>
 
 
 // ------------------
 // PGN parser methods
 // ------------------
 
+std::unique_ptr<Parser> Parser::create(py::object source, std::size_t queue_size, py::object start)
+{
+    py::object fspath = py::module_::import("os").attr("fspath");
+
+    if (py::isinstance<py::str>(source) || py::hasattr(source, "__fspath__")) {
+        std::string path = fspath(source).cast<std::string>();
+
+        StreamPosition position;
+        if (!start.is_none()) {
+            auto [frame_offset, frame_start, offset] = start.cast<std::tuple<uint64_t, uint64_t, uint64_t>>();
+            position = {frame_offset, frame_start, offset};
+        }
+
+        try {
+            return std::make_unique<Parser>(path, position, queue_size);
+        }
+        catch (const std::system_error& e) {
+            // Raise the matching OSError subclass (FileNotFoundError, PermissionError, ...), just like open() does
+            errno = e.code().value();
+            PyErr_SetFromErrnoWithFilename(PyExc_OSError, path.c_str());
+            throw py::error_already_set();
+        }
+    }
+
+    if (!start.is_none())
+        throw std::invalid_argument("Start position is supported only for parsers reading a file path");
+
+    return std::make_unique<Parser>(source);
+}
+
+void Parser::close()
+{
+    if (m_ahead) {
+        py::gil_scoped_release release;
+        m_ahead->stop();
+    }
+}
+
 bool Parser::parse_next()
 {
-    // Start with resetting the storage (by resetting it's size pointer) and state
-    m_headers.clear();
-    m_data_size = 0;
-    m_curr_state = EXPECTING_ANYTHING;
-    m_clocks = false;
-    m_evals = false;
+    m_mainline_parsed = false;
+
+    // Filters and limit are applied by the background thread
+    if (m_ahead) {
+        if (!next_game())
+            return false;
 
-    while (true) {
-        int bt = m_stream.get();
+        m_matched++;
+        return true;
+    }
 
-        if (bt == std::char_traits<char>::eof())
+    while (m_matched + m_skipped < m_limit) {
+        if (!next_game())
             return false;
 
-        char c = static_cast<char>(bt);
+        if (m_filters.matches(m_game)) {
+            m_matched++;
+            return true;
+        }
+
+        m_skipped++;
+    }
+
+    return false;
+}
+
+py::dict Parser::parse_batch(std::size_t n, std::vector<std::string> fields)
+{
+    std::vector<Column> columns(fields.begin(), fields.end());
+    std::vector<bool> evals, clocks;
+    std::vector<uint64_t> offsets;
+    std::vector<uint32_t> lengths;
+
+    while (evals.size() < n && parse_next()) {
+        for (Column& column : columns)
+            column.append(m_game.header(column.tag()));
+
+        evals.push_back(m_game.evals);
+        clocks.push_back(m_game.clocks);
+
+        auto [begin, end] = m_game.stripped();
+        offsets.push_back(m_game.offset + begin);
+        lengths.push_back(static_cast<uint32_t>(end - begin));
+    }
+
+    py::dict batch;
+
+    for (const Column& column : columns)
+        batch[py::str(column.tag())] = column.to_python();
+
+    py::array_t<bool> evals_array(evals.size()), clocks_array(clocks.size());
+    std::copy(evals.begin(), evals.end(), evals_array.mutable_data());
+    std::copy(clocks.begin(), clocks.end(), clocks_array.mutable_data());
+
+    batch["has_evals"] = evals_array;
+    batch["has_clocks"] = clocks_array;
+    batch["offset"] = py::array_t<uint64_t>(offsets.size(), offsets.data());
+    batch["length"] = py::array_t<uint32_t>(lengths.size(), lengths.data());
+
+    return batch;
+}
+
+// Reads the next game into m_game, returns false at the end of data
+bool Parser::next_game()
+{
+    if (!m_ahead) {
+        m_game.number = m_matched + m_skipped;
+        if (!scan_game(*m_buffer, m_game))
+            return false;
+
+        m_game.end = {0, 0, m_buffer->position()};
+        return true;
+    }
+
+    if (!m_ahead->started())
+        m_ahead->start(m_filters, m_limit);
+
+    // The GIL is released only for waiting - the background thread never needs it
+    if (m_ahead->ready())
+        return m_ahead->pop(m_game);
+
+    py::gil_scoped_release release;
+    return m_ahead->pop(m_game);
+}
+
+py::tuple Parser::position() const
+{
+    if (m_matched == 0)
+        return py::make_tuple(m_start.frame_offset, m_start.frame_start, m_start.offset, 0);
+
+    return py::make_tuple(m_game.end.frame_offset, m_game.end.frame_start, m_game.end.offset, m_game.number + 1);
+}
+
+void Parser::check_not_started() const
+{
+    if (m_ahead && m_ahead->started())
+        throw std::logic_error("Filters and limit have to be set before the first game is parsed");
+}
+
+// Returns a read-only view of the game data without copying it
+// - The view shares the buffer (see GameView), so it stays valid after next games are parsed
+// - With strip, leading and trailing whitespace is skipped
+py::memoryview Parser::all_data_view(bool strip) const
+{
+    auto [begin, end] = strip ? m_game.stripped() : std::make_pair(std::size_t(0), m_game.data.size());
 
-        m_data[m_data_size++] = c;
+    return py::memoryview(py::cast(GameView{m_game.data.share(), begin, end - begin}));
+}
 
-        // React to the obtained character from PGN notation
-        if (m_curr_state == EXPECTING_ANYTHING && c == '[') {
-            m_curr_state = INSIDE_TAG_NAME;
-            m_tag_name = "";
+
+// -------------------
+// Main line tokenizer
+// -------------------
+
+py::list Parser::moves()
+{
+    parse_mainline();
+
+    py::list moves;
+    for (auto [offset, length] : m_moves)
+        moves.append(py::str(m_game.data.data() + offset, length));
+
+    return moves;
+}
+
+py::array_t<int32_t> Parser::clocks()
+{
+    parse_mainline();
+
+    py::array_t<int32_t> clocks(m_move_clocks.size());
+    std::copy(m_move_clocks.begin(), m_move_clocks.end(), clocks.mutable_data());
+
+    return clocks;
+}
+
+py::array_t<int32_t> Parser::evals()
+{
+    parse_mainline();
+
+    py::array_t<int32_t> evals(m_move_evals.size());
+    std::copy(m_move_evals.begin(), m_move_evals.end(), evals.mutable_data());
+
+    return evals;
+}
+
+Replay Parser::replay()
+{
+    parse_mainline();
+
+    std::vector<std::string_view> moves;
+    moves.reserve(m_moves.size());
+
+    for (auto [offset, length] : m_moves)
+        moves.emplace_back(m_game.data.data() + offset, length);
+
+    return Replay(moves, m_game.header("FEN"));
+}
+
+void Parser::parse_mainline()
+{
+    if (m_mainline_parsed)
+        return;
+
+    m_moves.clear();
+    m_move_clocks.clear();
+    m_move_evals.clear();
+    m_mainline_parsed = true;
+
+    const char* data = m_game.data.data();
+    std::size_t i = m_game.movetext_start;
+    int depth = 0;      // Variation depth, only depth 0 belongs to the main line
+
+    while (i < m_game.data.size()) {
+        char c = data[i];
+
+        if (c == '{') {
+            std::size_t end = i + 1;
+            while (end < m_game.data.size() && data[end] != '}') end++;
+
+            // Comments before the first move are game comments
+            if (depth == 0 && !m_moves.empty())
+                parse_comment(i + 1, end);
+
+            i = end + 1;
         }
-        else if (m_curr_state == INSIDE_TAG_NAME && c != ' ')
-            m_tag_name += c;
-        else if (m_curr_state == INSIDE_TAG_NAME && c == ' ') {
-            m_curr_state = INSIDE_TAG_VALUE;
-            m_tag_value = "";
+        else if (c == ';') {
+            while (i < m_game.data.size() && data[i] != '\n') i++;
         }
-        else if (m_curr_state == INSIDE_TAG_VALUE && c != '"' && c != ']')
-            m_tag_value += c;
-        else if (m_curr_state == INSIDE_TAG_VALUE && c == ']') {
-            m_headers[m_tag_name] = m_tag_value;
-            m_curr_state = EXPECTING_ANYTHING;
+        else if (c == '(' || c == ')') {
+            depth += c == '(' ? 1 : -1;
+            i++;
+        }
+        else if (std::isspace(static_cast<unsigned char>(c))) {
+            i++;
+        }
+        else {
+            std::size_t end = i;
+            while (end < m_game.data.size() && !std::isspace(static_cast<unsigned char>(data[end])) && !std::strchr("{}();", data[end])) end++;
+
+            // Stray closing brace (or NUL byte) is not a part of any token
+            if (end == i) {
+                i++;
+                continue;
+            }
+
+            // Skip move number (possibly glued to the move, like "1.e4")
+            std::size_t begin = i;
+            while (begin < end && std::isdigit(static_cast<unsigned char>(data[begin]))) begin++;
+
+            bool is_move = depth == 0;
+            if (begin > i) {
+                if (begin < end && data[begin] == '.')
+                    while (begin < end && data[begin] == '.') begin++;
+                else
+                    is_move = false;        // Game result (1-0, 0-1, 1/2-1/2)
+            }
+
+            // Skip NAGs, unknown results and move suffix annotations
+            std::size_t length = end - begin;
+            while (length > 0 && (data[begin + length - 1] == '!' || data[begin + length - 1] == '?')) length--;
+
+            if (is_move && length > 0 && data[begin] != '$' && data[begin] != '*') {
+                m_moves.emplace_back(static_cast<uint32_t>(begin), static_cast<uint32_t>(length));
+                m_move_clocks.push_back(MISSING_INT);
+                m_move_evals.push_back(MISSING_INT);
+            }
+
+            i = end;
         }
-        else if (m_curr_state == EXPECTING_ANYTHING && c == '{')
-            m_curr_state = INSIDE_COMMENT;
-        else if (m_curr_state == INSIDE_COMMENT && c == 'e')
-            m_evals = true;
-        else if (m_curr_state == INSIDE_COMMENT && c == 'c')
-            m_clocks = true;
-        else if (m_curr_state == INSIDE_COMMENT && c == '}')
-            m_curr_state = EXPECTING_ANYTHING;
-        else if (m_curr_state == EXPECTING_ANYTHING && c == '-' && m_data[m_data_size - 2] != 'O')
-            m_curr_state = m_data[m_data_size - 2] == '2' ? EXPECTING_END_SCORE_DRAW : EXPECTING_END_SCORE_WIN;
-        else if (m_curr_state == EXPECTING_END_SCORE_WIN)
-            break;
-        else if (m_curr_state == EXPECTING_END_SCORE_DRAW && c == '2')
-            break;
-        else if (m_curr_state == EXPECTING_ANYTHING && c == '*')        // Some weird correspondance game notation
-            break;
     }
+}
 
-    return true;
+// Reads %clk and %eval annotations (the first valid ones) of the last move from comment data[begin, end)
+void Parser::parse_comment(std::size_t begin, std::size_t end)
+{
+    std::string comment(m_game.data.data() + begin, end - begin);
+
+    int32_t& clock = m_move_clocks.back();
+    int32_t& eval = m_move_evals.back();
+
+    // [%clk h:mm:ss]
+    for (std::size_t pos = comment.find("[%clk "); clock == MISSING_INT && pos != std::string::npos; pos = comment.find("[%clk ", pos + 1)) {
+        int hours = 0, minutes = 0;
+        double seconds = 0;
+        int consumed = 0;
+
+        if (std::sscanf(comment.c_str() + pos + 6, "%d:%d:%lf]%n", &hours, &minutes, &seconds, &consumed) == 3 && consumed > 0)
+            clock = hours * 3600 + minutes * 60 + static_cast<int32_t>(seconds);
+    }
+
+    // [%eval x] or [%eval #n], optionally followed by ",depth"
+    for (std::size_t pos = comment.find("[%eval "); eval == MISSING_INT && pos != std::string::npos; pos = comment.find("[%eval ", pos + 1)) {
+        const char* value = comment.c_str() + pos + 7;
+        char* value_end = nullptr;
+
+        if (*value == '#') {
+            long mate = std::strtol(value + 1, &value_end, 10);
+            if (value_end == value + 1 || (*value_end != ']' && *value_end != ','))
+                continue;
+
+            if (mate > 0)
+                eval = MATE_SCORE - mate;
+            else if (mate < 0)
+                eval = -MATE_SCORE - mate;
+            else
+                eval = m_moves.size() % 2 == 1 ? MATE_SCORE : -MATE_SCORE;     // Mated is the player to move
+        }
+        else {
+            double pawns = std::strtod(value, &value_end);
+            if (value_end == value || (*value_end != ']' && *value_end != ','))
+                continue;
+
+            eval = static_cast<int32_t>(std::nearbyint(pawns * 100));
+        }
+    }
 }
\ No newline at end of file
@@ -1,8 +1,19 @@
 #pragma once
 
+#include "ahead.h"
+#include "batch.h"
 #include "buffer.h"
-#include "states.h"
-#include <unordered_map>
+#include "filter.h"
+#include "game.h"
+#include "replay.h"
+#include "scanner.h"
+#include "schema.h"
+#include <limits>
+#include <memory>
+#include <string>
+#include <string_view>
+#include <utility>
+#include <vector>
 
 
 // -----------------
@@ -10,7 +21,24 @@
 // -----------------
 
 constexpr int BUFFER_SIZE = 65536;
-constexpr int STORAGE_SIZE = 32768;
+constexpr int QUEUE_SIZE = 256;                // Default number of games parsed ahead by the background thread
+constexpr int STORAGE_SIZE = 32768;            // Initial capacity of game storage (it grows if needed)
+
+constexpr int32_t MATE_SCORE = 10000;       // Eval of mate in n moves is encoded as +-(MATE_SCORE - n)
+
+
+// ---------
+// Game view
+// ---------
+
+// Game data exported to Python through the buffer protocol (see Parser::all_data_view)
+// - It shares the buffer of game storage, so the data stays valid and unchanged for as long as the view exists
+struct GameView
+{
+    std::shared_ptr<const char[]> data;
+    std::size_t begin;
+    std::size_t size;
+};
 
 
 // ----------
@@ -19,34 +47,120 @@ constexpr int STORAGE_SIZE = 32768;
 
 // This is a lightweight PGN parsing class
 // - Parses PGN headers and stores all PGN data
-// - Cannot parse moves
+// - Scans whole chunks of data, jumping between structural bytes, instead of processing it character by character
+// - Tokenizes the main line (SAN moves, %clk and %eval comments) lazily, on the first request
+// - Can skip games that do not match registered filters, without returning to Python
+// - Reads either from a Python reader (in the calling thread), or from a file path, which is read, decompressed (.zst) and scanned
+//   ahead on a background thread with the GIL released
 class Parser
 {
 public:
-    Parser(py::object reader) : m_buffer(reader), m_stream(&m_buffer) {}
+    Parser(py::object reader) : m_buffer(std::make_unique<StreamBuffer<BUFFER_SIZE>>(reader)), m_game(STORAGE_SIZE) {}
+    Parser(const std::string& path, StreamPosition start, std::size_t queue_size)
+        : m_ahead(std::make_unique<ParseAhead>(path, start, queue_size, STORAGE_SIZE)), m_game(STORAGE_SIZE), m_start(start) {}
+
+    // Creates a parser reading from a file path (str or os.PathLike), or from any other Python reader
+    // - Reading of a file can start at given position (frame_offset, frame_start, offset), see position()
+    static std::unique_ptr<Parser> create(py::object source, std::size_t queue_size, py::object start);
 
+    // Parses next game matching all the filters, returns false at the end of data or after reaching the limit
     bool parse_next();
 
+    // Parses up to n next games, returning given headers as columns (see Column), has_evals/has_clocks flags
+    // and offset/length of game data (without surrounding whitespace) in the whole data read by the parser
+    // - Returned arrays are empty at the end of data
+    py::dict parse_batch(std::size_t n, std::vector<std::string> fields);
+
+    // Stops the background thread (if there is any), no more games are parsed after that
+    void close();
+
+    // Filters
+    // - With a background thread, they have to be registered before the first game is parsed
+    void filter_equals(std::string tag, std::string value, bool negate) { check_not_started(); m_filters.headers.push_back({FILTER_EQUALS, tag, value, 0, 0, negate}); }
+    void filter_prefix(std::string tag, std::string value, bool negate) { check_not_started(); m_filters.headers.push_back({FILTER_PREFIX, tag, value, 0, 0, negate}); }
+    void filter_contains(std::string tag, std::string value, bool negate, bool ignore_case) {
+        check_not_started();
+
+        if (ignore_case)
+            std::transform(value.begin(), value.end(), value.begin(), [](unsigned char c) { return static_cast<char>(std::tolower(c)); });
+
+        m_filters.headers.push_back({FILTER_CONTAINS, tag, value, 0, 0, negate, ignore_case});
+    }
+    void filter_range(std::string tag, long long min, long long max) { check_not_started(); m_filters.headers.push_back({FILTER_RANGE, tag, "", min, max, false}); }
+    void filter_has_evals() { check_not_started(); m_filters.require_evals = true; }
+    void filter_has_clocks() { check_not_started(); m_filters.require_clocks = true; }
+    void clear_filters() { check_not_started(); m_filters.clear(); }
+
+    // Limits the total number of games read (both matched and skipped)
+    void set_limit(std::size_t limit) { check_not_started(); m_limit = limit; }
+
+    // Typed header schema - list of (tag, type) pairs, see HeaderSchema
+    // - It can be changed at any time, it's not used by the background thread
+    void set_schema(const std::vector<std::pair<std::string, std::string>>& fields) {
+        m_schema.clear();
+        for (const auto& [tag, type] : fields)
+            m_schema.add(tag, type);
+    }
+
     // Getters
-    std::string header(std::string h_name) { return m_headers[h_name]; }
-    std::string all_data() { return std::string(m_data.begin(), m_data.begin() + m_data_size); }
-    bool has_clocks() const { return m_clocks;}
-    bool has_evals() const { return m_evals;}
+    std::string header(std::string h_name) const { return std::string(m_game.header(h_name)); }
+
+    // Returns typed values of all schema fields (in schema order) as a tuple, or None if there is no schema
+    py::object fields() { return m_schema.empty() ? py::object(py::none()) : py::object(m_schema.project(m_game)); }
+    std::string all_data() const { return std::string(m_game.data.data(), m_game.data.size()); }
+    py::memoryview all_data_view(bool strip) const;
+    bool has_clocks() const { return m_game.clocks;}
+    bool has_evals() const { return m_game.evals;}
+    uint64_t offset() const { return m_game.offset; }
+
+    // Returns (frame_offset, frame_start, offset, games) - a position right after the last parsed game, from which a parser
+    // of the same file can start, and the number of games read until then (both matched and skipped)
+    // - Position of Python readers is just the number of bytes read
+    py::tuple position() const;
+
+    // Main line getters
+    // - Clocks are in seconds, evals are in centipawns from White's point of view (MISSING_INT if absent)
+    py::list moves();
+    py::array_t<int32_t> clocks();
+    py::array_t<int32_t> evals();
+
+    // Replays the main line from the starting position of the game (FEN header, if there is one), see Replay
+    Replay replay();
+
+    std::size_t matched() const { return m_matched; }
+    std::size_t skipped() const { return m_ahead ? m_ahead->skipped() : m_skipped; }
+
+    // Number of bytes read from the input so far (compressed ones for .zst files), including the data read ahead
+    // - With a Python reader, it is the number of bytes consumed by the parser
+    uint64_t bytes_read() const { return m_ahead ? m_ahead->bytes_read() : m_buffer->position(); }
 
 private:
-    // Data connection - buffer & stream
-    StreamBuffer<BUFFER_SIZE> m_buffer;
-    std::istream m_stream;                                      // We get data from this one
+    bool next_game();
+    void check_not_started() const;
+    void parse_mainline();
+    void parse_comment(std::size_t begin, std::size_t end);
+
+
+    // Data connection - either we scan the data directly in the buffer, or we take games scanned by the background thread
+    std::unique_ptr<StreamBuffer<BUFFER_SIZE>> m_buffer;
+    std::unique_ptr<ParseAhead> m_ahead;
 
     // PGN data
-    std::unordered_map<std::string, std::string> m_headers;     // PGN headers mapping (name - value)
-    std::array<char, STORAGE_SIZE> m_data;                      // An entire PGN
-    std::size_t m_data_size = 0;
-    bool m_clocks = false;
-    bool m_evals = false;
-
-    // Parser state
-    State m_curr_state = EXPECTING_ANYTHING;
-    std::string m_tag_name = "";
-    std::string m_tag_value = "";
-};
\ No newline at end of file
+    GameRecord m_game;
+    StreamPosition m_start;
+
+    // Main line data
+    bool m_mainline_parsed = false;
+    std::vector<std::pair<uint32_t, uint32_t>> m_moves;         // SAN moves as (offset, length) in game data
+    std::vector<int32_t> m_move_clocks;
+    std::vector<int32_t> m_move_evals;
+
+    // Filters & selectivity counters
+    GameFilters m_filters;
+    std::size_t m_limit = std::numeric_limits<std::size_t>::max();
+    std::size_t m_matched = 0;
+    std::size_t m_skipped = 0;
+
+    // Typed header fields
+    HeaderSchema m_schema;
+};
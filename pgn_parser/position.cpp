@@ -0,0 +1,492 @@
+#include "position.h"
+#include "polyglot.h"
+#include <cctype>
+#include <cstring>
+#include <stdexcept>
+#include <string>
+
+
+// ------------
+// Attack masks
+// ------------
+
+constexpr Bitboard RANK_1 = 0xFFULL;
+constexpr Bitboard RANK_8 = RANK_1 << 56;
+constexpr Bitboard FILE_A = 0x0101010101010101ULL;
+
+constexpr int PIECE_VALUES[7] = {0, 1, 3, 3, 5, 9, 0};
+
+// Squares reached from a square by given (file, rank) steps, either once (leapers) or until the first blocker (sliders)
+static Bitboard step_attacks(int square, const int (*steps)[2], int n_steps, bool slide, Bitboard occupied)
+{
+    Bitboard attacks = 0;
+
+    for (int i = 0; i < n_steps; i++) {
+        int file = square_file(square) + steps[i][0], rank = square_rank(square) + steps[i][1];
+
+        while (file >= 0 && file < 8 && rank >= 0 && rank < 8) {
+            Bitboard target = square_bb(rank * 8 + file);
+            attacks |= target;
+
+            if (!slide || (occupied & target))
+                break;
+
+            file += steps[i][0];
+            rank += steps[i][1];
+        }
+    }
+
+    return attacks;
+}
+
+constexpr int KNIGHT_STEPS[8][2] = {{1, 2}, {2, 1}, {2, -1}, {1, -2}, {-1, -2}, {-2, -1}, {-2, 1}, {-1, 2}};
+constexpr int KING_STEPS[8][2] = {{1, 0}, {1, 1}, {0, 1}, {-1, 1}, {-1, 0}, {-1, -1}, {0, -1}, {1, -1}};
+constexpr int BISHOP_STEPS[4][2] = {{1, 1}, {-1, 1}, {-1, -1}, {1, -1}};
+constexpr int ROOK_STEPS[4][2] = {{1, 0}, {0, 1}, {-1, 0}, {0, -1}};
+
+using AttackTable = std::array<Bitboard, 64>;
+
+static AttackTable leaper_table(const int (*steps)[2], int n_steps)
+{
+    AttackTable table{};
+    for (int square = 0; square < 64; square++)
+        table[square] = step_attacks(square, steps, n_steps, false, 0);
+    return table;
+}
+
+static const AttackTable KNIGHT_ATTACKS = leaper_table(KNIGHT_STEPS, 8);
+static const AttackTable KING_ATTACKS = leaper_table(KING_STEPS, 8);
+
+// Squares attacked by a pawn of given color
+static const std::array<AttackTable, 2> PAWN_ATTACKS = [] {
+    constexpr int BLACK_STEPS[2][2] = {{-1, -1}, {1, -1}};
+    constexpr int WHITE_STEPS[2][2] = {{-1, 1}, {1, 1}};
+    return std::array<AttackTable, 2>{leaper_table(BLACK_STEPS, 2), leaper_table(WHITE_STEPS, 2)};
+}();
+
+static Bitboard bishop_attacks(int square, Bitboard occupied) { return step_attacks(square, BISHOP_STEPS, 4, true, occupied); }
+static Bitboard rook_attacks(int square, Bitboard occupied) { return step_attacks(square, ROOK_STEPS, 4, true, occupied); }
+
+static int lsb(Bitboard bb) { return __builtin_ctzll(bb); }
+
+static Color opponent(Color color) { return color == WHITE ? BLACK : WHITE; }
+
+static int parse_square(char file, char rank)
+{
+    return file >= 'a' && file <= 'h' && rank >= '1' && rank <= '8' ? (rank - '1') * 8 + (file - 'a') : NO_SQUARE;
+}
+
+static PieceType piece_type(char symbol)
+{
+    switch (std::tolower(static_cast<unsigned char>(symbol))) {
+        case 'p': return PAWN;
+        case 'n': return KNIGHT;
+        case 'b': return BISHOP;
+        case 'r': return ROOK;
+        case 'q': return QUEEN;
+        case 'k': return KING;
+        default: return NO_PIECE;
+    }
+}
+
+
+// --------
+// Position
+// --------
+
+Position::Position() : Position("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1") {}
+
+Position::Position(std::string_view fen)
+{
+    auto invalid = [&fen]() { return std::invalid_argument("Invalid FEN: " + std::string(fen)); };
+
+    // Fields are separated by whitespace, only the first four of them are used (move counters are not)
+    std::string_view parts[4] = {"", "w", "-", "-"};
+    std::size_t pos = 0;
+
+    for (int n_part = 0; n_part < 4; n_part++) {
+        while (pos < fen.size() && std::isspace(static_cast<unsigned char>(fen[pos]))) pos++;
+        std::size_t end = pos;
+        while (end < fen.size() && !std::isspace(static_cast<unsigned char>(fen[end]))) end++;
+
+        if (end > pos)
+            parts[n_part] = fen.substr(pos, end - pos);
+        else if (n_part == 0)
+            throw invalid();
+
+        pos = end;
+    }
+
+    // Piece placement, from the 8th rank down
+    int rank = 7, file = 0;
+    for (char c : parts[0]) {
+        if (c == '/') {
+            if (file != 8 || rank == 0) throw invalid();
+            rank--;
+            file = 0;
+        }
+        else if (c >= '1' && c <= '8') {
+            file += c - '0';
+            if (file > 8) throw invalid();
+        }
+        else {
+            PieceType piece = piece_type(c);
+            if (piece == NO_PIECE || file >= 8) throw invalid();
+
+            put(rank * 8 + file, piece, std::isupper(static_cast<unsigned char>(c)) ? WHITE : BLACK);
+            file++;
+        }
+    }
+
+    if (rank != 0 || file != 8)
+        throw invalid();
+
+    if (parts[1] != "w" && parts[1] != "b")
+        throw invalid();
+
+    m_turn = parts[1] == "w" ? WHITE : BLACK;
+
+    for (char c : parts[2]) {
+        if (c == 'K') m_castling |= WHITE_KINGSIDE;
+        else if (c == 'Q') m_castling |= WHITE_QUEENSIDE;
+        else if (c == 'k') m_castling |= BLACK_KINGSIDE;
+        else if (c == 'q') m_castling |= BLACK_QUEENSIDE;
+        else if (c != '-') throw invalid();
+    }
+
+    // Castling rights without the king or the rook on their original squares are dropped (like python-chess does)
+    auto has = [this](int square, PieceType piece, Color color) { return m_board[square] == piece && (m_colors[color] & square_bb(square)); };
+
+    if (!has(4, KING, WHITE)) m_castling &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE);
+    if (!has(60, KING, BLACK)) m_castling &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE);
+    if (!has(7, ROOK, WHITE)) m_castling &= ~WHITE_KINGSIDE;
+    if (!has(0, ROOK, WHITE)) m_castling &= ~WHITE_QUEENSIDE;
+    if (!has(63, ROOK, BLACK)) m_castling &= ~BLACK_KINGSIDE;
+    if (!has(56, ROOK, BLACK)) m_castling &= ~BLACK_QUEENSIDE;
+
+    if (parts[3] != "-") {
+        m_ep_square = parts[3].size() == 2 ? parse_square(parts[3][0], parts[3][1]) : NO_SQUARE;
+        if (m_ep_square == NO_SQUARE) throw invalid();
+    }
+
+    for (int i = 0; i < 4; i++)
+        if (m_castling & (1 << i)) m_zobrist ^= POLYGLOT_RANDOM[768 + i];
+
+    if (m_turn == WHITE)
+        m_zobrist ^= POLYGLOT_RANDOM[780];
+}
+
+void Position::put(int square, PieceType piece, Color color)
+{
+    m_pieces[piece] |= square_bb(square);
+    m_colors[color] |= square_bb(square);
+    m_board[square] = piece;
+
+    m_zobrist ^= POLYGLOT_RANDOM[64 * (2 * (piece - 1) + color) + square];
+    m_material[color] += PIECE_VALUES[piece];
+}
+
+void Position::remove(int square)
+{
+    PieceType piece = static_cast<PieceType>(m_board[square]);
+    if (piece == NO_PIECE)
+        return;
+
+    Color color = (m_colors[WHITE] & square_bb(square)) ? WHITE : BLACK;
+
+    m_pieces[piece] &= ~square_bb(square);
+    m_colors[color] &= ~square_bb(square);
+    m_board[square] = NO_PIECE;
+
+    m_zobrist ^= POLYGLOT_RANDOM[64 * (2 * (piece - 1) + color) + square];
+    m_material[color] -= PIECE_VALUES[piece];
+}
+
+// En passant file is a part of the hash only if a pawn of the side to move stands next to the pushed pawn
+uint64_t Position::zobrist() const
+{
+    if (m_ep_square == NO_SQUARE)
+        return m_zobrist;
+
+    int pushed = m_turn == WHITE ? m_ep_square - 8 : m_ep_square + 8;
+    if (pushed < 0 || pushed >= 64)
+        return m_zobrist;
+
+    Bitboard neighbours = 0;
+
+    if (square_file(pushed) > 0) neighbours |= square_bb(pushed - 1);
+    if (square_file(pushed) < 7) neighbours |= square_bb(pushed + 1);
+
+    return neighbours & m_pieces[PAWN] & m_colors[m_turn] ? m_zobrist ^ POLYGLOT_RANDOM[772 + square_file(m_ep_square)] : m_zobrist;
+}
+
+void Position::push(const Move& move)
+{
+    m_zobrist ^= POLYGLOT_RANDOM[780];
+
+    if (move.null()) {
+        m_ep_square = NO_SQUARE;
+        m_turn = opponent(m_turn);
+        return;
+    }
+
+    PieceType piece = static_cast<PieceType>(m_board[move.from_square]);
+    int ep_square = m_ep_square;
+    m_ep_square = NO_SQUARE;
+
+    for (int i = 0; i < 4; i++)
+        if (m_castling & (1 << i)) m_zobrist ^= POLYGLOT_RANDOM[768 + i];
+
+    // Castling rights are lost by moving the king, or by moving (or losing) the rook
+    if (piece == KING)
+        m_castling &= m_turn == WHITE ? ~(WHITE_KINGSIDE | WHITE_QUEENSIDE) : ~(BLACK_KINGSIDE | BLACK_QUEENSIDE);
+
+    for (int square : {move.from_square, move.to_square}) {
+        if (square == 7) m_castling &= ~WHITE_KINGSIDE;
+        else if (square == 0) m_castling &= ~WHITE_QUEENSIDE;
+        else if (square == 63) m_castling &= ~BLACK_KINGSIDE;
+        else if (square == 56) m_castling &= ~BLACK_QUEENSIDE;
+    }
+
+    for (int i = 0; i < 4; i++)
+        if (m_castling & (1 << i)) m_zobrist ^= POLYGLOT_RANDOM[768 + i];
+
+    if (piece == PAWN) {
+        int diff = move.to_square - move.from_square;
+
+        if (diff == 16 && square_rank(move.from_square) == 1)
+            m_ep_square = move.from_square + 8;
+        else if (diff == -16 && square_rank(move.from_square) == 6)
+            m_ep_square = move.from_square - 8;
+        else if (move.to_square == ep_square && m_board[move.to_square] == NO_PIECE && (diff % 8 != 0))
+            remove(m_turn == WHITE ? move.to_square - 8 : move.to_square + 8);
+    }
+    else if (piece == KING && (move.to_square - move.from_square == 2 || move.to_square - move.from_square == -2)) {
+        bool kingside = move.to_square > move.from_square;
+        int rank_start = move.from_square - square_file(move.from_square);
+
+        remove(rank_start + (kingside ? 7 : 0));
+        put(rank_start + (kingside ? 5 : 3), ROOK, m_turn);
+    }
+
+    remove(move.to_square);
+    remove(move.from_square);
+    put(move.to_square, move.promotion ? move.promotion : piece, m_turn);
+
+    m_turn = opponent(m_turn);
+}
+
+Bitboard Position::attackers(int square, Color color, Bitboard occupied) const
+{
+    Bitboard diagonal = m_pieces[BISHOP] | m_pieces[QUEEN];
+    Bitboard straight = m_pieces[ROOK] | m_pieces[QUEEN];
+
+    Bitboard attackers = (PAWN_ATTACKS[opponent(color)][square] & m_pieces[PAWN])
+                       | (KNIGHT_ATTACKS[square] & m_pieces[KNIGHT])
+                       | (KING_ATTACKS[square] & m_pieces[KING])
+                       | (bishop_attacks(square, occupied) & diagonal)
+                       | (rook_attacks(square, occupied) & straight);
+
+    return attackers & m_colors[color] & occupied;
+}
+
+bool Position::is_check() const
+{
+    Bitboard king = m_pieces[KING] & m_colors[m_turn];
+    return king && attackers(lsb(king), opponent(m_turn), m_colors[WHITE] | m_colors[BLACK]);
+}
+
+// A pseudo-legal move is legal if it does not leave the own king attacked
+bool Position::is_legal(const Move& move) const
+{
+    Position after = *this;
+    after.push(move);
+
+    Bitboard king = after.m_pieces[KING] & after.m_colors[m_turn];
+    return !king || !after.attackers(lsb(king), after.m_turn, after.m_colors[WHITE] | after.m_colors[BLACK]);
+}
+
+// Castling is given as the king's move by two squares (like e1g1)
+bool Position::is_castling_legal(const Move& move) const
+{
+    bool kingside = move.to_square > move.from_square;
+    int rank_start = m_turn == WHITE ? 0 : 56;
+    int right = m_turn == WHITE ? (kingside ? WHITE_KINGSIDE : WHITE_QUEENSIDE) : (kingside ? BLACK_KINGSIDE : BLACK_QUEENSIDE);
+
+    if (!(m_castling & right) || move.from_square != rank_start + 4 || move.to_square != rank_start + (kingside ? 6 : 2))
+        return false;
+
+    int rook = rank_start + (kingside ? 7 : 0);
+    int rook_to = rank_start + (kingside ? 5 : 3);
+    Bitboard king_bb = square_bb(move.from_square), rook_bb = square_bb(rook);
+    Bitboard occupied = m_colors[WHITE] | m_colors[BLACK];
+
+    // Squares between the king and the rook have to be empty, the king can not pass through (or stand on) an attacked square
+    Bitboard between = kingside ? square_bb(rank_start + 5) | square_bb(rank_start + 6)
+                                : square_bb(rank_start + 1) | square_bb(rank_start + 2) | square_bb(rank_start + 3);
+    if ((occupied ^ king_bb ^ rook_bb) & between)
+        return false;
+
+    Color them = opponent(m_turn);
+    int king_path = kingside ? rank_start + 5 : rank_start + 3;
+
+    return !attackers(move.from_square, them, occupied ^ king_bb) && !attackers(king_path, them, occupied ^ king_bb)
+        && !attackers(move.to_square, them, occupied ^ king_bb ^ rook_bb ^ square_bb(rook_to));
+}
+
+int Position::find_moves(Bitboard from_mask, Bitboard to_mask, PieceType promotion, Move& move) const
+{
+    Bitboard own = m_colors[m_turn], their = m_colors[opponent(m_turn)];
+    Bitboard occupied = own | their;
+    int found = 0;
+
+    for (Bitboard sources = from_mask & own; sources; sources &= sources - 1) {
+        int from = lsb(sources);
+        PieceType piece = static_cast<PieceType>(m_board[from]);
+        Bitboard targets;
+
+        if (piece == PAWN) {
+            int forward = m_turn == WHITE ? 8 : -8;
+            int start_rank = m_turn == WHITE ? 1 : 6;
+
+            targets = PAWN_ATTACKS[m_turn][from] & their;
+
+            if (m_ep_square != NO_SQUARE && !(occupied & square_bb(m_ep_square)) && square_rank(from) == start_rank + 3 * (forward > 0 ? 1 : -1))
+                targets |= PAWN_ATTACKS[m_turn][from] & square_bb(m_ep_square);
+
+            if (!(occupied & square_bb(from + forward))) {
+                targets |= square_bb(from + forward);
+
+                if (square_rank(from) == start_rank && !(occupied & square_bb(from + 2 * forward)))
+                    targets |= square_bb(from + 2 * forward);
+            }
+        }
+        else if (piece == KNIGHT)
+            targets = KNIGHT_ATTACKS[from];
+        else if (piece == BISHOP)
+            targets = bishop_attacks(from, occupied);
+        else if (piece == ROOK)
+            targets = rook_attacks(from, occupied);
+        else if (piece == QUEEN)
+            targets = bishop_attacks(from, occupied) | rook_attacks(from, occupied);
+        else
+            targets = KING_ATTACKS[from];
+
+        for (targets &= to_mask & ~own; targets; targets &= targets - 1) {
+            int to = lsb(targets);
+
+            // Pawns reaching the last rank have to promote (to a knight, bishop, rook or queen), no other moves can
+            bool promoting = piece == PAWN && (square_bb(to) & (RANK_1 | RANK_8));
+            if (promoting ? promotion < KNIGHT || promotion > QUEEN : promotion != NO_PIECE)
+                continue;
+
+            Move candidate{from, to, promotion};
+            if (is_legal(candidate)) {
+                move = candidate;
+                found++;
+            }
+        }
+    }
+
+    return found;
+}
+
+bool Position::has_legal_move() const
+{
+    Move move;
+    return find_moves(~Bitboard(0), ~Bitboard(0), NO_PIECE, move) > 0 || find_moves(m_pieces[PAWN], RANK_1 | RANK_8, QUEEN, move) > 0;
+}
+
+bool Position::parse_san(std::string_view san, Move& move) const
+{
+    int rank_start = m_turn == WHITE ? 0 : 56;
+
+    // Castling
+    for (std::string_view castling : {"O-O", "O-O+", "O-O#", "0-0", "0-0+", "0-0#", "O-O-O", "O-O-O+", "O-O-O#", "0-0-0", "0-0-0+", "0-0-0#"}) {
+        if (san == castling) {
+            bool kingside = san.size() < 5;
+            move = Move{rank_start + 4, rank_start + (kingside ? 6 : 2), NO_PIECE};
+            return (m_pieces[KING] & m_colors[m_turn] & square_bb(rank_start + 4)) && is_castling_legal(move);
+        }
+    }
+
+    // Null moves
+    if (san == "--" || san == "Z0" || san == "0000" || san == "@@@@") {
+        move = Move{};
+        return true;
+    }
+
+    // Matches ([NBKRQ])?([a-h])?([1-8])?[\-x]?([a-h][1-8])(=?[nbrqkNBRQK])?[\+#]? from the end
+    std::string_view s = san;
+    PieceType promotion = NO_PIECE;
+
+    if (!s.empty() && (s.back() == '+' || s.back() == '#'))
+        s.remove_suffix(1);
+
+    if (!s.empty() && std::strchr("nbrqkNBRQK", s.back()) && s.back() != '\0') {
+        promotion = piece_type(s.back());
+        s.remove_suffix(1);
+
+        if (!s.empty() && s.back() == '=')
+            s.remove_suffix(1);
+    }
+
+    if (s.size() < 2)
+        return false;
+
+    int to = parse_square(s[s.size() - 2], s[s.size() - 1]);
+    if (to == NO_SQUARE)
+        return false;
+
+    s.remove_suffix(2);
+    if (!s.empty() && (s.back() == '-' || s.back() == 'x'))
+        s.remove_suffix(1);
+
+    PieceType piece = NO_PIECE;
+    int from_file = -1, from_rank = -1;
+    std::size_t i = 0;
+
+    if (i < s.size() && std::strchr("NBKRQ", s[i]) && s[i] != '\0') piece = piece_type(s[i++]);
+    if (i < s.size() && s[i] >= 'a' && s[i] <= 'h') from_file = s[i++] - 'a';
+    if (i < s.size() && s[i] >= '1' && s[i] <= '8') from_rank = s[i++] - '1';
+
+    if (i != s.size())
+        return false;
+
+    // Own pieces can not be captured (which excludes castling given as the king taking its rook)
+    Bitboard to_mask = square_bb(to) & ~m_colors[m_turn];
+    Bitboard from_mask = ~Bitboard(0);
+
+    if (from_file >= 0) from_mask &= FILE_A << from_file;
+    if (from_rank >= 0) from_mask &= RANK_1 << (8 * from_rank);
+
+    if (piece != NO_PIECE)
+        from_mask &= m_pieces[piece];
+    else if (from_file >= 0 && from_rank >= 0) {
+        // Fully specified moves (like long algebraic notation) can be moves of any piece, including castling (even as e1h1)
+        int from = from_rank * 8 + from_file;
+
+        if (m_board[from] == PAWN && (square_bb(to) & (RANK_1 | RANK_8)) && promotion == NO_PIECE)
+            return false;
+
+        if (m_board[from] == KING && (from == 4 || from == 60)) {
+            if (to == from + 3) to = from + 2;
+            else if (to == from - 4) to = from - 2;
+
+            if (to == from + 2 || to == from - 2) {
+                move = Move{from, to, promotion};
+                return promotion == NO_PIECE && from == rank_start + 4 && (m_colors[m_turn] & square_bb(from)) && is_castling_legal(move);
+            }
+        }
+
+        return find_moves(square_bb(from), square_bb(to) & ~m_colors[m_turn], promotion, move) == 1;
+    }
+    else {
+        // Pawn captures have to specify the file
+        from_mask &= m_pieces[PAWN];
+        if (from_file < 0)
+            from_mask &= FILE_A << square_file(to);
+    }
+
+    return find_moves(from_mask, to_mask, promotion, move) == 1;
+}
@@ -0,0 +1,97 @@
+#pragma once
+
+#include <array>
+#include <cstdint>
+#include <string_view>
+
+
+// --------------
+// Chess position
+// --------------
+
+using Bitboard = uint64_t;
+
+// Colors and piece types are numbered just like in python-chess (and polyglot piece index is derived from them)
+enum Color { BLACK = 0, WHITE = 1 };
+enum PieceType { NO_PIECE = 0, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING };
+
+// Castling rights in polyglot order
+enum Castling { WHITE_KINGSIDE = 1, WHITE_QUEENSIDE = 2, BLACK_KINGSIDE = 4, BLACK_QUEENSIDE = 8 };
+
+constexpr int NO_SQUARE = -1;
+
+// Squares are numbered a1 = 0, b1 = 1, ..., h8 = 63
+constexpr Bitboard square_bb(int square) { return Bitboard(1) << square; }
+constexpr int square_file(int square) { return square & 7; }
+constexpr int square_rank(int square) { return square >> 3; }
+
+
+// A move of the main line, null move has from_square == to_square
+struct Move
+{
+    int from_square = 0;
+    int to_square = 0;
+    PieceType promotion = NO_PIECE;
+
+    bool null() const { return from_square == to_square; }
+
+    // Raw encoding in polyglot opening books (castling as the king's move, like python-chess gives it)
+    uint16_t raw() const { return static_cast<uint16_t>(to_square | from_square << 6 | (promotion ? promotion - 1 : 0) << 12); }
+};
+
+
+// A position, which can apply SAN moves
+// - Follows python-chess: SAN is parsed just like by chess.Board.parse_san (including long algebraic notation and null moves),
+//   so the same games are replayed up to the same moves
+// - Polyglot zobrist hash and material of both sides are updated incrementally by each move
+class Position
+{
+public:
+    // Starting position
+    Position();
+
+    // Position of given FEN, throws std::invalid_argument if it's malformed
+    explicit Position(std::string_view fen);
+
+    // Parses a move in SAN, returns false if it's invalid, illegal or ambiguous
+    bool parse_san(std::string_view san, Move& move) const;
+
+    // Applies a legal move (or a null move)
+    void push(const Move& move);
+
+    Color turn() const { return m_turn; }
+    uint64_t zobrist() const;
+
+    // Material of given side (pawn 1, knight and bishop 3, rook 5, queen 9)
+    int material(Color color) const { return m_material[color]; }
+
+    bool is_check() const;
+    bool is_checkmate() const { return is_check() && !has_legal_move(); }
+    bool is_stalemate() const { return !is_check() && !has_legal_move(); }
+
+    // Returns true if the king moves from given square (so the move may be castling)
+    bool is_king_move(const Move& move) const { return m_board[move.from_square] == KING; }
+
+private:
+    void put(int square, PieceType piece, Color color);
+    void remove(int square);
+
+    Bitboard attackers(int square, Color color, Bitboard occupied) const;
+    bool is_legal(const Move& move) const;
+    bool is_castling_legal(const Move& move) const;
+    bool has_legal_move() const;
+
+    // Legal moves of pieces from from_mask to to_mask with given promotion, returns their number (the last one is in move)
+    int find_moves(Bitboard from_mask, Bitboard to_mask, PieceType promotion, Move& move) const;
+
+    Bitboard m_pieces[7] = {};          // By piece type
+    Bitboard m_colors[2] = {};
+    std::array<uint8_t, 64> m_board{};  // Piece type on each square
+
+    Color m_turn = WHITE;
+    int m_castling = 0;
+    int m_ep_square = NO_SQUARE;
+
+    uint64_t m_zobrist = 0;             // Without the en passant part, which depends on pawns of the side to move
+    int m_material[2] = {};
+};
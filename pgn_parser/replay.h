@@ -0,0 +1,89 @@
+#pragma once
+
+#include "position.h"
+#include <algorithm>
+#include <cstdint>
+#include <string_view>
+#include <vector>
+
+#include <pybind11/numpy.h>
+#include <pybind11/pybind11.h>
+
+
+namespace py = pybind11;
+
+
+// ----------------
+// Main line replay
+// ----------------
+
+// Per-ply data of a main line, replayed from its starting position by Position
+// - Replay stops at the first invalid, illegal or ambiguous move (just like python-chess would fail to parse it), plies is the number
+//   of replayed moves
+// - Zobrist hashes and book moves are given for the position before each ply, material balance for the position after it
+class Replay
+{
+public:
+    // Replays given SAN moves from the starting position, or from given FEN (if it's not empty)
+    Replay(const std::vector<std::string_view>& moves, std::string_view fen) {
+        Position position = fen.empty() ? Position() : Position(fen);
+        m_turn = position.turn() == WHITE;
+
+        m_keys.reserve(moves.size());
+        m_book_moves.reserve(2 * moves.size());
+        m_material.reserve(moves.size());
+
+        for (std::string_view san : moves) {
+            Move move;
+            if (!position.parse_san(san, move))
+                break;
+
+            // Polyglot books store castling as the king taking its own rook, python-chess gives the king's move (both are looked up)
+            uint16_t raw = move.raw();
+            uint16_t castling = raw;
+
+            if (!move.null() && position.is_king_move(move) && (move.to_square - move.from_square == 2 || move.from_square - move.to_square == 2))
+                castling = Move{move.from_square, move.to_square > move.from_square ? move.from_square + 3 : move.from_square - 4}.raw();
+
+            m_keys.push_back(position.zobrist());
+            m_book_moves.push_back(raw);
+            m_book_moves.push_back(castling);
+
+            position.push(move);
+            m_material.push_back(position.material(WHITE) - position.material(BLACK));
+        }
+
+        m_checkmate = position.is_checkmate();
+        m_stalemate = position.is_stalemate();
+    }
+
+    std::size_t plies() const { return m_keys.size(); }
+    bool turn() const { return m_turn; }
+    bool checkmate() const { return m_checkmate; }
+    bool stalemate() const { return m_stalemate; }
+
+    // Polyglot zobrist hash of the position before each ply
+    py::array_t<uint64_t> keys() const { return to_array(m_keys, {m_keys.size()}); }
+
+    // Raw polyglot encodings of each move, as (move, castling alternative) pairs - the alternative is the same for other moves
+    py::array_t<uint16_t> book_moves() const { return to_array(m_book_moves, {m_keys.size(), std::size_t(2)}); }
+
+    // Material of White minus material of Black after each ply
+    py::array_t<int32_t> material() const { return to_array(m_material, {m_material.size()}); }
+
+private:
+    template <typename T>
+    static py::array_t<T> to_array(const std::vector<T>& values, std::vector<std::size_t> shape) {
+        py::array_t<T> array(shape);
+        std::copy(values.begin(), values.end(), array.mutable_data());
+        return array;
+    }
+
+    bool m_turn = true;             // Side to move in the starting position (true for White)
+    bool m_checkmate = false;       // Final position
+    bool m_stalemate = false;
+
+    std::vector<uint64_t> m_keys;
+    std::vector<uint16_t> m_book_moves;
+    std::vector<int32_t> m_material;
+};
@@ -0,0 +1,161 @@
+#pragma once
+
+#include "game.h"
+#include "states.h"
+#include <array>
+#include <cstring>
+#include <stdexcept>
+#include <string_view>
+
+
+// ----------------
+// Bulk PGN scanner
+// ----------------
+
+// Bytes which may change the state outside of tags and comments
+inline const std::array<bool, 256> STRUCTURAL = [] {
+    std::array<bool, 256> table{};
+    for (unsigned char c : std::string_view("[{-*"))
+        table[c] = true;
+    return table;
+}();
+
+
+// Removes quotes from header values - usually just by narrowing the view, as there are no quotes inside
+inline void finalize_headers(GameRecord& game)
+{
+    for (HeaderView& header : game.headers) {
+        const char* value = game.data.data() + header.value_offset;
+        std::size_t length = header.value_length;
+
+        if (length >= 2 && value[0] == '"' && value[length - 1] == '"' && !std::memchr(value + 1, '"', length - 2)) {
+            header.value_offset += 1;
+            header.value_length -= 2;
+        }
+        else if (std::memchr(value, '"', length)) {
+            header.value_offset = static_cast<uint32_t>(game.scratch.size());
+            header.value_in_scratch = true;
+
+            for (std::size_t i = 0; i < length; i++)
+                if (value[i] != '"') game.scratch += value[i];
+
+            header.value_length = static_cast<uint32_t>(game.scratch.size() - header.value_offset);
+        }
+    }
+}
+
+
+// Scans the next game from the source into given record, returns false at the end of data
+// - Source is anything with fill(), begin(), end(), consume(n) and position() window API (see StreamBuffer and FileSource)
+// - Whole chunks of data are scanned at once, jumping between structural bytes, instead of processing it character by character
+template <class Source>
+bool scan_game(Source& source, GameRecord& game)
+{
+    // Start with resetting the storage (by resetting it's size pointer) and state
+    game.clear();
+    game.offset = source.position();
+
+    State state = EXPECTING_ANYTHING;
+    std::size_t tag_name_start = 0;                     // Positions in game data of currently parsed tag
+    std::size_t tag_name_end = 0;
+    std::size_t tag_value_start = 0;
+
+    bool finished = false;
+
+    // Process the buffered data chunk by chunk, each chunk is stored at once after it's scanned
+    while (!finished) {
+        if (!source.fill())
+            return false;
+
+        const char* begin = source.begin();
+        const char* end = source.end();
+        const char* p = begin;
+
+        // Position of a pointer inside the chunk in game data
+        auto position = [&](const char* ptr) { return game.data.size() + static_cast<std::size_t>(ptr - begin); };
+
+        while (p < end && !finished) {
+            switch (state) {
+                case EXPECTING_ANYTHING: {
+                    while (p < end && !STRUCTURAL[static_cast<unsigned char>(*p)]) p++;
+                    if (p == end) break;
+
+                    char c = *p;
+                    char prev = p > begin ? p[-1] : (game.data.size() > 0 ? game.data[game.data.size() - 1] : '\0');
+                    p++;
+
+                    if (c == '[') {
+                        state = INSIDE_TAG_NAME;
+                        tag_name_start = position(p);
+                    }
+                    else if (c == '{')
+                        state = INSIDE_COMMENT;
+                    else if (c == '-' && prev != 'O')
+                        state = prev == '2' ? EXPECTING_END_SCORE_DRAW : EXPECTING_END_SCORE_WIN;
+                    else if (c == '*')          // Some weird correspondance game notation
+                        finished = true;
+                    break;
+                }
+                case INSIDE_TAG_NAME: {
+                    auto space = static_cast<const char*>(std::memchr(p, ' ', end - p));
+                    if (!space) { p = end; break; }
+
+                    tag_name_end = position(space);
+                    tag_value_start = position(space + 1);
+                    state = INSIDE_TAG_VALUE;
+                    p = space + 1;
+                    break;
+                }
+                case INSIDE_TAG_VALUE: {
+                    auto close = static_cast<const char*>(std::memchr(p, ']', end - p));
+                    if (!close) { p = end; break; }
+
+                    // Quotes are removed from the value later, once the whole game is stored
+                    game.headers.push_back({
+                        static_cast<uint32_t>(tag_name_start), static_cast<uint32_t>(tag_name_end - tag_name_start),
+                        static_cast<uint32_t>(tag_value_start), static_cast<uint32_t>(position(close) - tag_value_start)
+                    });
+
+                    state = EXPECTING_ANYTHING;
+                    p = close + 1;
+                    game.movetext_start = position(p);
+                    break;
+                }
+                case INSIDE_COMMENT: {
+                    auto close = static_cast<const char*>(std::memchr(p, '}', end - p));
+                    const char* comment_end = close ? close : end;
+
+                    if (!game.evals && std::memchr(p, 'e', comment_end - p))
+                        game.evals = true;
+                    if (!game.clocks && std::memchr(p, 'c', comment_end - p))
+                        game.clocks = true;
+
+                    if (close)
+                        state = EXPECTING_ANYTHING;
+
+                    p = close ? close + 1 : end;
+                    break;
+                }
+                case EXPECTING_END_SCORE_WIN:
+                    p++;
+                    finished = true;
+                    break;
+                case EXPECTING_END_SCORE_DRAW: {
+                    auto two = static_cast<const char*>(std::memchr(p, '2', end - p));
+                    p = two ? two + 1 : end;
+                    finished = two != nullptr;
+                    break;
+                }
+                default:
+                    throw std::logic_error("Invalid parser state");
+            }
+        }
+
+        game.data.append(begin, p - begin);
+        source.consume(p - begin);
+    }
+
+    finalize_headers(game);
+
+    return true;
+}
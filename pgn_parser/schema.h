@@ -0,0 +1,161 @@
+#pragma once
+
+#include "batch.h"
+#include "game.h"
+#include <algorithm>
+#include <cctype>
+#include <stdexcept>
+#include <string>
+#include <string_view>
+#include <unordered_map>
+#include <utility>
+#include <vector>
+
+#include <pybind11/pybind11.h>
+
+
+namespace py = pybind11;
+
+
+// -------------------
+// Typed header schema
+// -------------------
+
+// Types of schema fields
+enum FieldType {
+    FIELD_INT = 0,              // Integer (like ratings), None if missing or malformed
+    FIELD_TIME_CONTROL,         // "base+increment" as (base, increment) in seconds, None if missing or malformed (like "-")
+    FIELD_TEMPO,                // Tempo from the Event header - words between the first and the last one in lower case ("Rated Rapid game" -> "rapid")
+    FIELD_ENUM,                 // A string with a few distinct values (like Result or Termination)
+    FIELD_STRING                // Any other string
+};
+
+
+// A projection of game headers onto a fixed list of typed fields, which are converted to Python all at once (see Parser::fields)
+// - Tags are matched only against the headers of the schema, nothing is stored for the other ones
+// - Strings of tempo and enum fields are created once for each distinct value and then shared by all games
+// - Missing headers are treated as empty strings, just like Parser::header() does
+// - Malformed numbers and time controls are None, invalid UTF-8 of strings is replaced just like in batch columns (see decode_utf8)
+class HeaderSchema
+{
+public:
+    // Adds a field of given type ("int", "time_control", "tempo", "enum" or "str")
+    void add(std::string tag, std::string_view type) {
+        static const std::pair<std::string_view, FieldType> TYPES[] = {
+            {"int", FIELD_INT}, {"time_control", FIELD_TIME_CONTROL}, {"tempo", FIELD_TEMPO}, {"enum", FIELD_ENUM}, {"str", FIELD_STRING}
+        };
+
+        for (auto [name, field_type] : TYPES) {
+            if (name == type) {
+                m_fields.push_back({std::move(tag), field_type, {}});
+                m_values.resize(m_fields.size());
+                return;
+            }
+        }
+
+        throw std::invalid_argument("Unknown header field type: " + std::string(type));
+    }
+
+    void clear() {
+        m_fields.clear();
+        m_values.clear();
+    }
+
+    bool empty() const { return m_fields.empty(); }
+
+    // Returns typed values of all fields of given game
+    py::tuple project(const GameRecord& game) {
+        std::fill(m_values.begin(), m_values.end(), std::string_view());
+
+        // The last header wins, if there are more of them with the same name
+        for (const HeaderView& header : game.headers) {
+            std::string_view name = game.name(header);
+
+            for (std::size_t i = 0; i < m_fields.size(); i++) {
+                if (m_fields[i].tag.size() == name.size() && m_fields[i].tag == name) {
+                    m_values[i] = game.value(header);
+                    break;
+                }
+            }
+        }
+
+        py::tuple values(m_fields.size());
+        for (std::size_t i = 0; i < m_fields.size(); i++)
+            values[i] = convert(m_fields[i], m_values[i]);
+
+        return values;
+    }
+
+private:
+    struct Field
+    {
+        std::string tag;
+        FieldType type;
+        std::unordered_map<std::string, py::object> strings;       // Distinct values of tempo and enum fields
+    };
+
+    static py::object convert(Field& field, std::string_view value) {
+        switch (field.type) {
+            case FIELD_INT: {
+                auto [number, end] = parse_int(value, 0);
+                return number != MISSING_INT && end == value.size() ? py::object(py::int_(number)) : py::object(py::none());
+            }
+            case FIELD_TIME_CONTROL: {
+                auto [base, increment] = parse_time_control(value, true);
+                return base != MISSING_INT ? py::object(py::make_tuple(base, increment)) : py::object(py::none());
+            }
+            case FIELD_TEMPO:
+                return shared_string(field, tempo(value));
+            case FIELD_ENUM:
+                return shared_string(field, std::string(value));
+            default:
+                return decode_utf8(value);
+        }
+    }
+
+    static py::object shared_string(Field& field, std::string value) {
+        auto it = field.strings.find(value);
+
+        if (it == field.strings.end()) {
+            py::object string = decode_utf8(value);
+            it = field.strings.emplace(std::move(value), std::move(string)).first;
+        }
+
+        return it->second;
+    }
+
+    // Joins the words between the first and the last one, in lower case
+    static std::string tempo(std::string_view event) {
+        auto is_space = [](char c) { return std::isspace(static_cast<unsigned char>(c)) != 0; };
+
+        std::size_t begin = 0, end = event.size();
+        while (begin < end && is_space(event[begin])) begin++;
+        while (end > begin && is_space(event[end - 1])) end--;
+
+        // Skip the first and the last word
+        while (begin < end && !is_space(event[begin])) begin++;
+        while (end > begin && !is_space(event[end - 1])) end--;
+
+        std::string result;
+        bool separate = false;
+
+        for (std::size_t i = begin; i < end; i++) {
+            if (is_space(event[i])) {
+                separate = !result.empty();
+                continue;
+            }
+
+            if (separate) {
+                result += ' ';
+                separate = false;
+            }
+
+            result += static_cast<char>(std::tolower(static_cast<unsigned char>(event[i])));
+        }
+
+        return result;
+    }
+
+    std::vector<Field> m_fields;
+    std::vector<std::string_view> m_values;         // Values of the current game (reused)
+};
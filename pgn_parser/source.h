@@ -0,0 +1,180 @@
+#pragma once
+
+#include "game.h"
+#include <algorithm>
+#include <atomic>
+#include <cerrno>
+#include <cstdint>
+#include <cstdio>
+#include <cstring>
+#include <stdexcept>
+#include <string>
+#include <system_error>
+#include <vector>
+
+#include <zstd.h>
+
+#ifdef _WIN32
+#define fseek64 _fseeki64
+#else
+#define fseek64 fseeko
+#endif
+
+
+// ------------------
+// Native file source
+// ------------------
+
+// A file read directly from C++, without any calls to Python (so it can be read with the GIL released)
+// - Zstandard compressed files (recognized by the magic number, not the extension) are decompressed with libzstd, frame after frame
+// - Any other file is read as plain text
+// - Exposes the same window API as StreamBuffer, so scan_game() works with both of them
+// - Keeps track of the frame of the current window, so the position of any consumed data can be turned into a StreamPosition
+class FileSource
+{
+public:
+    FileSource(const std::string& path, StreamPosition start = {}, std::size_t chunk_size = 1 << 20) : m_output(chunk_size) {
+        m_file = std::fopen(path.c_str(), "rb");
+        if (!m_file)
+            throw std::system_error(errno, std::generic_category(), path);
+
+        // Recognize the format by the magic number
+        unsigned char header[4] = {};
+        if (std::fread(header, 1, 4, m_file) == 4) {
+            uint32_t magic = header[0] | header[1] << 8 | header[2] << 16 | static_cast<uint32_t>(header[3]) << 24;
+            m_compressed = magic == ZSTD_MAGICNUMBER || (magic & ZSTD_MAGIC_SKIPPABLE_MASK) == ZSTD_MAGIC_SKIPPABLE_START;
+        }
+
+        if (m_compressed) {
+            m_stream = ZSTD_createDStream();
+            if (!m_stream) {
+                std::fclose(m_file);
+                throw std::runtime_error("Could not create zstd decompression stream");
+            }
+
+            m_input.resize(ZSTD_DStreamInSize());
+            m_input_offset = m_frame_offset = start.frame_offset;
+            m_position = m_frame_start = start.frame_start;
+        }
+        else {
+            m_input_offset = m_position = start.offset;
+        }
+
+        if (fseek64(m_file, static_cast<int64_t>(m_input_offset), SEEK_SET) != 0) {
+            std::fclose(m_file);
+            if (m_stream) ZSTD_freeDStream(m_stream);
+            throw std::system_error(errno, std::generic_category(), path);
+        }
+        m_bytes_read.store(m_input_offset, std::memory_order_relaxed);
+
+        // Decompressed data before the start (inside it's frame) is skipped
+        try {
+            skip(start.offset - m_position);
+        }
+        catch (...) {
+            std::fclose(m_file);
+            if (m_stream) ZSTD_freeDStream(m_stream);
+            throw;
+        }
+    }
+
+    ~FileSource() {
+        if (m_stream) ZSTD_freeDStream(m_stream);
+        std::fclose(m_file);
+    }
+
+    FileSource(const FileSource&) = delete;
+    FileSource& operator=(const FileSource&) = delete;
+
+    // Direct access to buffered data (see StreamBuffer)
+    bool fill() { return m_begin < m_end || refill(); }
+    const char* begin() const { return m_output.data() + m_begin; }
+    const char* end() const { return m_output.data() + m_end; }
+    void consume(std::size_t n) { m_begin += n; m_position += n; }
+
+    // Number of (decompressed) bytes consumed so far
+    uint64_t position() const { return m_position; }
+
+    // Returns a position from which reading of the not consumed data can start
+    StreamPosition stream_position() const { return {m_frame_offset, m_frame_start, m_position}; }
+
+    // Number of bytes read from the file so far (compressed ones for .zst files), safe to call from any thread
+    uint64_t bytes_read() const { return m_bytes_read.load(std::memory_order_relaxed); }
+
+private:
+    bool refill() {
+        m_begin = m_end = 0;
+
+        if (!m_compressed) {
+            m_end = std::fread(m_output.data(), 1, m_output.size(), m_file);
+            check_error();
+
+            m_bytes_read.store(m_position + m_end, std::memory_order_relaxed);
+            return m_end > 0;
+        }
+
+        // Decompress until there is some output - a single input block might not be enough for that
+        while (true) {
+            if (m_in.pos == m_in.size) {
+                m_input_offset += m_in.size;
+                m_in = {m_input.data(), std::fread(m_input.data(), 1, m_input.size(), m_file), 0};
+                check_error();
+
+                m_bytes_read.store(m_input_offset + m_in.size, std::memory_order_relaxed);
+
+                if (m_in.size == 0) {
+                    if (m_frame_pending)
+                        throw std::runtime_error("Truncated zstd stream");
+                    return false;
+                }
+            }
+
+            // Remember where a new frame starts - all the output of a single call belongs to a single frame
+            if (!m_frame_pending) {
+                m_frame_offset = m_input_offset + m_in.pos;
+                m_frame_start = m_position;
+            }
+
+            ZSTD_outBuffer out = {m_output.data(), m_output.size(), 0};
+            std::size_t result = ZSTD_decompressStream(m_stream, &out, &m_in);
+            if (ZSTD_isError(result))
+                throw std::runtime_error(std::string("zstd decompression failed: ") + ZSTD_getErrorName(result));
+
+            m_frame_pending = result != 0;
+            m_end = out.pos;
+
+            if (m_end > 0)
+                return true;
+        }
+    }
+
+    void skip(uint64_t n) {
+        while (n > 0 && fill()) {
+            std::size_t size = static_cast<std::size_t>(std::min<uint64_t>(n, m_end - m_begin));
+            consume(size);
+            n -= size;
+        }
+    }
+
+    void check_error() {
+        if (std::ferror(m_file))
+            throw std::runtime_error(std::string("Could not read file: ") + std::strerror(errno));
+    }
+
+    std::FILE* m_file = nullptr;
+    bool m_compressed = false;
+    ZSTD_DStream* m_stream = nullptr;
+    bool m_frame_pending = false;               // Decoder is in the middle of a frame
+
+    std::vector<char> m_input;                  // Compressed data
+    ZSTD_inBuffer m_in{};
+    uint64_t m_input_offset = 0;                // Offset of m_input in the file
+    uint64_t m_frame_offset = 0;                // Compressed offset of the frame of current window
+    uint64_t m_frame_start = 0;                 // Decompressed offset of the frame of current window
+    std::atomic<uint64_t> m_bytes_read = 0;     // File offset after the last read (read by other threads)
+
+    std::vector<char> m_output;                 // Decompressed (or plain) data window [m_begin, m_end)
+    std::size_t m_begin = 0;
+    std::size_t m_end = 0;
+    uint64_t m_position = 0;
+};
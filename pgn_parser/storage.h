@@ -0,0 +1,63 @@
+#pragma once
+
+#include <algorithm>
+#include <atomic>
+#include <cstring>
+#include <memory>
+
+
+// ------------
+// Game storage
+// ------------
+
+// A growable storage for data of a single game
+// - Keeps it's capacity between games, so there are no allocations in a steady state
+// - Grows geometrically, so even extremely long games (with both clock and eval annotations) fit in
+// - The buffer can be shared with readers (see share()), which keep it alive - it's then left to them and the next game
+//   goes into a new one, so shared data is never overwritten (not even by the background thread, after the record is swapped)
+class GameStorage
+{
+public:
+    GameStorage(std::size_t capacity) : m_data(new char[capacity]), m_capacity(capacity) {}
+
+    const char* data() const { return m_data.get(); }
+    std::size_t size() const { return m_size; }
+    std::size_t capacity() const { return m_capacity; }
+    char operator[](std::size_t i) const { return m_data[i]; }
+
+    // Returns the buffer, it keeps its current content for as long as the returned pointer exists
+    std::shared_ptr<const char[]> share() const { return m_data; }
+
+    void clear() {
+        // Readers only ever release the buffer, so if it looks unshared, it is (the fence orders their reads before our writes)
+        if (m_data.use_count() > 1)
+            m_data.reset(new char[m_capacity]);
+        else
+            std::atomic_thread_fence(std::memory_order_acquire);
+
+        m_size = 0;
+    }
+
+    void append(const char* data, std::size_t size) {
+        if (m_size + size > m_capacity)
+            grow(m_size + size);
+
+        std::memcpy(m_data.get() + m_size, data, size);
+        m_size += size;
+    }
+
+private:
+    void grow(std::size_t required) {
+        std::size_t capacity = std::max(required, 2 * m_capacity);
+        std::shared_ptr<char[]> data(new char[capacity]);
+
+        std::memcpy(data.get(), m_data.get(), m_size);
+
+        m_data = std::move(data);
+        m_capacity = capacity;
+    }
+
+    std::shared_ptr<char[]> m_data;
+    std::size_t m_size = 0;
+    std::size_t m_capacity;
+};
@@ -1,15 +1,24 @@
 from . import final
+from . import index
+from . import instrument
 from . import pgn
+from . import profiler
 from . import reader
+from . import resume
 from . import search
+from . import sink
+from . import store
 from . import visual
 
 import pyparser
 
+import random
 import yaml
 import sys
 
 from collections import defaultdict
+from functools import partial
+from itertools import chain
 
 
 # ---------------
@@ -24,32 +33,132 @@ if __name__ == "__main__":
     # Maximum number of games processed from raw input data file
     max_games = int(sys.argv[1]) if sys.argv[1] != "all" else 90000000
 
+    # Number of worker processes (--workers=N)
+    # - Parallel reading of raw data requires a multi-frame .zst file (see reader.reframe)
+    workers = next((int(arg.split("=")[1]) for arg in sys.argv if arg.startswith("--workers=")), 1)
+
+    # Number of engine processes used by each worker in the final stage (--engines=N)
+    engines = next((int(arg.split("=")[1]) for arg in sys.argv if arg.startswith("--engines=")), 1)
+
+    # Minimal time between checkpoints of searching stages in seconds (--checkpoint-interval=S)
+    checkpoint_interval = next((float(arg.split("=")[1]) for arg in sys.argv if arg.startswith("--checkpoint-interval=")), 60.0)
+
+    # Seed of random selection of players (--seed=N), makes players and sample stages reproducible
+    seed = next((int(arg.split("=")[1]) for arg in sys.argv if arg.startswith("--seed=")), None)
+
+    if seed is not None:
+        random.seed(seed)
+
+    # Output of games and sample stages (--games-output=PATH), .zst output is compressed in frames of --frame-games=N games
+    # and it can be split into shards of --shard-games=N games (see sink.open_sink)
+    games_output = next((arg.split("=")[1] for arg in sys.argv if arg.startswith("--games-output=")), "games.pgn")
+    frame_games = next((int(arg.split("=")[1]) for arg in sys.argv if arg.startswith("--frame-games=")), sink.FRAME_GAMES)
+    shard_games = next((int(arg.split("=")[1]) for arg in sys.argv if arg.startswith("--shard-games=")), 0)
+
+    # Metrics of the stage (throughput, ETA, memory, time of each phase) written as JSON lines into --metrics=PATH,
+    # a record every --metrics-interval=S seconds (see instrument.Monitor)
+    metrics_output = next((arg.split("=")[1] for arg in sys.argv if arg.startswith("--metrics=")), None)
+    metrics_interval = next((float(arg.split("=")[1]) for arg in sys.argv if arg.startswith("--metrics-interval=")), 30.0)
+
+    # Aggregates of the profile stage (--profile-output=PATH), plots are redrawn from it by the plot stage
+    profile_output = next((arg.split("=")[1] for arg in sys.argv if arg.startswith("--profile-output=")), "profile.json")
+
     input_filepath = config["paths"]["data_raw"] if "final" not in sys.argv else config["paths"]["data_games"]
 
-    with (reader.ZstdQuickReader if "final" not in sys.argv else reader.StandardSlowReader)(input_filepath, max_games=max_games) as game_repo:
+    # Searching stages skip games that cannot meet the search criterion inside the C++ parser
+    # - Ingestion stage analyses all games of a monthly dump that meet it
+    filtered = "players" in sys.argv or "games" in sys.argv or "sample" in sys.argv or "ingest" in sys.argv
+    game_filter = search.STD_RAPID_10_MINUTES_WITH_EVAL_FILTER if filtered else None
+
+    # Minimum amount of players for rating ranges (rating_min, rating_max, no_players)
+    rating_buckets = [
+        (0, 1000, 1000),
+        (1000, 1300, 1000),
+        (1400, 1700, 1000),
+        (1800, 2100, 1000),
+        (2200, 2500, 500),
+        (2500, 3000, 10)
+    ]
+
+    # Indexing stage - a single pass over raw data, after which players and games stages read only the index and selected games
+    if "index" in sys.argv:
+        index.build_index(input_filepath, max_games=max_games)
+        sys.exit()
+
+    # Plotting stage - draws distributions of a saved dump profile, without reading the dump again
+    if "plot" in sys.argv:
+        visual.plot_profile(profiler.DumpProfile.load(profile_output))
+        sys.exit()
+
+    # Refreshing stage - the final dataset of all months ingested into the player store, without reading any dump
+    if "refresh" in sys.argv:
+        with store.PlayerStore(config["paths"]["player_store"], gpp=config["target_gpp"]) as player_store:
+            df = final.create_dataframe(player_store.dataset())
+
+        df.to_csv(config["paths"]["data_final"], index=False)
+        print(f"Saved dataset of {len(df)} players to {config["paths"]["data_final"]}")
+        sys.exit()
+
+    # Profiling and ingestion stages read the whole dump, in parallel with multiple workers
+    if "final" in sys.argv or "profile" in sys.argv or "ingest" in sys.argv:
+        if sink.shard_files(input_filepath):
+            game_reader = partial(reader.ShardedParallelReader, n_workers=workers)
+        elif index.is_compressed(input_filepath):
+            game_reader = partial(reader.ZstdParallelReader, n_workers=workers) if workers > 1 else reader.ZstdQuickReader
+        else:
+            game_reader = partial(reader.StandardParallelReader, n_workers=workers) if workers > 1 else reader.StandardQuickReader
+
+        game_reader = partial(game_reader, game_filter=game_filter)
+    elif game_filter and index.is_fresh(input_filepath):
+        print(f"[ Using index of {input_filepath} ]")
+        game_reader = index.GameIndex
+    elif workers > 1 and game_filter:
+        game_reader = partial(reader.ZstdParallelReader, n_workers=workers, game_filter=game_filter)
+    else:
+        game_reader = partial(reader.ZstdQuickReader, game_filter=game_filter)
+
+    # Sequential searching stages take periodic checkpoints (into <stage>.checkpoint), --resume continues from the last one
+    checkpoint = None
+
+    if ("players" in sys.argv or "games" in sys.argv) and isinstance(game_reader, partial) and game_reader.func is reader.ZstdQuickReader:
+        stage = "players" if "players" in sys.argv else "games"
+        output_key = (games_output, shard_games) if stage == "games" else ()
+        checkpoint = resume.Checkpoint(
+            f"{stage}.checkpoint", input_filepath, key=(stage, max_games, config["target_size"], config["target_gpp"], *output_key),
+            interval=checkpoint_interval, resume="--resume" in sys.argv
+        )
+        game_reader = partial(game_reader, start=checkpoint.position)
+    elif "--resume" in sys.argv:
+        print("[ WARNING: Only sequential players and games stages can be resumed, starting from the beginning ]")
+
+    stage = next((stage for stage in ["data", "profile", "ingest", "players", "games", "sample", "final"] if stage in sys.argv), None)
+    monitor = instrument.Monitor(stage, metrics_output, metrics_interval, verbose=True) if metrics_output else None
+
+    with game_reader(input_filepath, max_games=max_games) as game_repo:
+        if monitor is not None and not isinstance(game_repo, index.GameIndex):
+            monitor.attach(game_repo)
+
         if "data" in sys.argv:
             for id, game in enumerate(game_repo):
-                if "final" not in sys.argv:
-                    print(game.data.all_data())
-                else:
-                    print(game.data)
-        elif "players" in sys.argv:
-            rating_buckets = [
-                (0, 1000, 1000),
-                (1000, 1300, 1000),
-                (1400, 1700, 1000),
-                (1800, 2100, 1000),
-                (2200, 2500, 500),
-                (2500, 3000, 10)
-            ]
+                print(game.data.all_data())
+        elif "profile" in sys.argv:
+            dump_profile = profiler.profile_dump(game_repo, monitor=monitor)
+            dump_profile.save(profile_output)
 
+            print(f"Profiled {dump_profile.games} games of {dump_profile.no_players()} players")
+            print(f"Saved profile to {profile_output}")
+        elif "players" in sys.argv:
             players = search.find_players(
                 game_repo, 
                 game_criterion=search.is_std_rapid_10_minutes_with_eval,
+                batch_criterion=search.is_std_rapid_10_minutes_with_eval_batch,
+                index_criterion=search.is_std_rapid_10_minutes_with_eval_index,
                 k_players=config["target_size"],
                 rating_buckets=rating_buckets,
                 min_games=config["target_gpp"],
-                verbose=True
+                verbose=True,
+                checkpoint=checkpoint,
+                monitor=monitor
             )
 
             players.sort()
@@ -59,6 +168,9 @@ if __name__ == "__main__":
             with open("players.txt", "w", encoding="utf-8") as f:
                 for player_name in players:
                     f.write(player_name + "\n")
+
+            if checkpoint is not None:
+                checkpoint.clear()
         elif "games" in sys.argv:
             # First, let's get all the players we want to find games for
             players = {}         # Player-game counters (But this time with fixed number of keys)
@@ -74,19 +186,34 @@ if __name__ == "__main__":
 
             # Number of players with complete set of games found
             found = 0
-            games_saved = 0
+
+            # Search restored from a checkpoint continues with the output cut to the position it had at that time
+            restored = checkpoint.state if checkpoint is not None else None
+
+            if restored is not None:
+                players, found = restored["players"], restored["found"]
 
             # Now start reading games and simultaneously saving them into an output file
-            with open("games.pgn", "w") as output:
+            # Games are written as raw bytes, straight from the parser storage
+            with sink.open_sink(games_output, frame_games, shard_games, start=restored["output"] if restored is not None else None) as output:
                 print(f"[ Searching for games started ]")
+
+                # Games of selected players, in file order
+                if isinstance(game_repo, index.GameIndex):
+                    candidates = search.iter_indexed_games(game_repo, search.is_std_rapid_10_minutes_with_eval_index, set(players.keys()))
+                elif workers > 1:
+                    candidates = chain.from_iterable(game_repo.map(partial(
+                        search.collect_games, game_criterion=search.is_std_rapid_10_minutes_with_eval, player_names=set(players.keys())
+                    )))
+                else:
+                    candidates = search.iter_games(game_repo, search.is_std_rapid_10_minutes_with_eval, players.keys())
                 
-                for game in game_repo:
-                    if not search.is_std_rapid_10_minutes_with_eval(game):
-                        continue
+                write = instrument.phase(monitor, "write")
 
+                for game_players, game_data in candidates:
                     saved = False
 
-                    for player in game.players():
+                    for player in game_players:
                         if player.name in players.keys():
                             players[player.name] += 1
 
@@ -94,16 +221,71 @@ if __name__ == "__main__":
                                 found += 1
 
                             if not saved and players[player.name] <= config["target_gpp"]:
-                                output.write(game.data.all_data().strip() + "\n\n")
+                                with write:
+                                    output.write(game_data)
                                 saved = True
-                                games_saved += 1
+
+                    if monitor is not None:
+                        monitor.tick()
                     
                     if found == len(players.keys()):
                         break
+
+                    if checkpoint is not None and checkpoint.due():
+                        with instrument.phase(monitor, "checkpoint"):
+                            checkpoint.save(game_repo.position(), {"players": players, "found": found, "output": output.position()})
                     
                 print(f"[ Searching for games finished ]")
+
+            if checkpoint is not None:
+                checkpoint.clear()
             
-            print(f"Saved {games_saved} games to games.pgn")
+            print(f"Saved {output.games} games to {games_output}")
+        elif "sample" in sys.argv:
+            # Players and games stages in a single pass - selects players and writes their games at once
+            with sink.open_sink(games_output, frame_games, shard_games) as output:
+                players, games_saved = search.sample_games(
+                    game_repo,
+                    output,
+                    game_criterion=search.is_std_rapid_10_minutes_with_eval,
+                    index_criterion=search.is_std_rapid_10_minutes_with_eval_index,
+                    k_players=config["target_size"],
+                    rating_buckets=rating_buckets,
+                    min_games=config["target_gpp"],
+                    verbose=True,
+                    monitor=monitor
+                )
+
+            players.sort()
+
+            with open("players.txt", "w", encoding="utf-8") as f:
+                for player_name in players:
+                    f.write(player_name + "\n")
+
+            print(f"Found {len(players)}!")
+            print(f"Saved {games_saved} games to {games_output}")
+        elif "ingest" in sys.argv:
+            # Only games of the new month are analysed, aggregates of earlier months are merged from the store
+            with store.PlayerStore(config["paths"]["player_store"], gpp=config["target_gpp"]) as player_store:
+                if player_store.contains(input_filepath):
+                    print(f"[ {input_filepath} has already been ingested into {config["paths"]["player_store"]} ]")
+                else:
+                    players = final.analyse_dump(
+                        game_repo,
+                        engine_filepath=None,
+                        book_filepath=config["paths"]["opening_book"],
+                        engine_max_depth=10,
+                        gpp=config["target_gpp"],
+                        cache_filepath=config["paths"]["engine_cache"],
+                        n_engines=engines,
+                        verbose=True,
+                        logging_frequency=100000,
+                        monitor=monitor,
+                        game_criterion=search.is_std_rapid_10_minutes_with_eval
+                    )
+
+                    if players is not None:
+                        player_store.ingest(players, input_filepath)
         elif "final" in sys.argv:
             dataset_raw = final.create_dataset(
                 game_repo,
@@ -111,8 +293,11 @@ if __name__ == "__main__":
                 book_filepath=config["paths"]["opening_book"],
                 engine_max_depth=10,
                 gpp=config["target_gpp"],
+                cache_filepath=config["paths"]["engine_cache"],
+                n_engines=engines,
                 verbose=True,
-                logging_frequency=1000
+                logging_frequency=1000,
+                monitor=monitor
             )
 
             df = final.create_dataframe(dataset_raw)
@@ -120,4 +305,8 @@ if __name__ == "__main__":
             print(df.head(5))
 
             df.to_csv(config["paths"]["data_final"], index=False)
-            print(f"Saved dataset to {config["paths"]["data_final"]}")
\ No newline at end of file
+            print(f"Saved dataset to {config["paths"]["data_final"]}")
+
+        # Final record is taken while the reader is still open
+        if monitor is not None:
+            monitor.close()
@@ -0,0 +1,129 @@
+import chess
+import chess.polyglot
+import numpy as np
+
+from collections import OrderedDict
+
+
+# --------------
+# Helper defines
+# --------------
+
+# Layout of a single polyglot book entry (big-endian)
+POLYGLOT_ENTRY = np.dtype([("key", ">u8"), ("move", ">u2"), ("weight", ">u2"), ("learn", ">u4")])
+
+# Castling moves are stored in polyglot books as "king takes own rook"
+POLYGLOT_CASTLING = {
+    chess.Move(chess.E1, chess.G1): chess.Move(chess.E1, chess.H1),
+    chess.Move(chess.E1, chess.C1): chess.Move(chess.E1, chess.A1),
+    chess.Move(chess.E8, chess.G8): chess.Move(chess.E8, chess.H8),
+    chess.Move(chess.E8, chess.C8): chess.Move(chess.E8, chess.A8),
+}
+
+
+# ----------------
+# Helper functions
+# ----------------
+
+# Returns a cheap key, which identifies the position at least as precisely as its polyglot zobrist hash
+def position_key(board: chess.Board) -> tuple:
+    return (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+            board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK], board.turn, board.castling_rights, board.ep_square)
+
+
+# Returns the raw polyglot encoding of a move
+def raw_move(move: chess.Move) -> int:
+    promotion = move.promotion - 1 if move.promotion else 0
+    return move.to_square | move.from_square << 6 | promotion << 12
+
+
+# Returns all raw polyglot encodings, which python-chess would read as given (legal) move in given position
+def raw_moves(board: chess.Board, move: chess.Move) -> tuple[int, ...]:
+    castling = POLYGLOT_CASTLING.get(move)
+
+    if castling is not None and board.kings & chess.BB_SQUARES[move.from_square]:
+        return raw_move(move), raw_move(castling)
+
+    return raw_move(move),
+
+
+# ------------------
+# Opening book index
+# ------------------
+
+# An in-memory index of polyglot opening book
+# - The whole book is loaded into sorted NumPy arrays, so a lookup does not touch the file anymore
+# - Book moves of recently seen positions are kept in a bounded LRU cache, as opening positions repeat a lot
+#   (it's keyed by position bitboards, so zobrist hash is calculated only on cache misses, or by zobrist hashes given by the caller)
+# - Gives exactly the same answers as searching the book with chess.polyglot reader (entries with weight 0 are skipped)
+class OpeningBook:
+    def __init__(self, book_filepath: str, cache_size: int = 1 << 16):
+        entries = np.fromfile(book_filepath, dtype=POLYGLOT_ENTRY)
+        entries = entries[entries["weight"] > 0]
+        order = np.argsort(entries["key"], kind="stable")
+
+        self.keys = entries["key"][order].astype(np.uint64)
+        self.moves = entries["move"][order].astype(np.uint16)
+
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+
+        # Cache statistics
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    # Returns raw encodings of all book moves from given position
+    def book_moves(self, board: chess.Board) -> frozenset[int]:
+        key = position_key(board)
+        moves = self.__cached(key)
+
+        return moves if moves is not None else self.__lookup(key, chess.polyglot.zobrist_hash(board))
+
+    # Returns raw encodings of all book moves from a position with given polyglot zobrist hash (see pyparser.Replay)
+    def book_moves_by_hash(self, zobrist: int) -> frozenset[int]:
+        moves = self.__cached(zobrist)
+
+        return moves if moves is not None else self.__lookup(zobrist, zobrist)
+
+    # Checks whether a (legal) move from given position is in the book
+    def contains(self, board: chess.Board, move: chess.Move) -> bool:
+        moves = self.book_moves(board)
+        return bool(moves) and any(raw in moves for raw in raw_moves(board, move))
+
+    # Checks whether a move is in the book, given the zobrist hash of the position and raw encodings of the move (see pyparser.Replay)
+    def contains_hash(self, zobrist: int, raws: list[int]) -> bool:
+        moves = self.book_moves_by_hash(zobrist)
+        return bool(moves) and any(raw in moves for raw in raws)
+
+    # Returns cached book moves of given cache key, or None on a cache miss
+    def __cached(self, key) -> frozenset[int] | None:
+        moves = self.cache.get(key)
+
+        if moves is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+
+        return moves
+
+    # Looks up book moves of given zobrist hash in the index and caches them under given cache key
+    def __lookup(self, key, zobrist: int) -> frozenset[int]:
+        self.misses += 1
+
+        zobrist = np.uint64(zobrist)
+        lo = np.searchsorted(self.keys, zobrist, side="left")
+        hi = np.searchsorted(self.keys, zobrist, side="right")
+        moves = frozenset(self.moves[lo:hi].tolist())
+
+        self.cache[key] = moves
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return moves
+
+    # Returns a fraction of lookups answered by the cache
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,91 @@
+import chess
+import sqlite3
+
+
+# ---------------------------
+# Persistent evaluation cache
+# ---------------------------
+
+# An on-disk cache of engine evaluations, keyed by (position, depth, engine id)
+# - Position is identified by its EPD (FEN without move counters)
+# - Stored in SQLite database in WAL mode, so it can be shared by many worker processes (each with its own connection)
+# - New evaluations are buffered and written in batches, to keep the lock contention low
+# - Evaluations are stored relative to the side to move [cp], mate in n moves as +-(MATE_SCORE - n)
+class EvalCache:
+    def __init__(self, cache_filepath: str, engine_id: str, depth: int, flush_frequency: int = 1000, timeout: float = 60.0):
+        self.cache_filepath = cache_filepath
+        self.engine_id = engine_id
+        self.depth = depth
+        self.flush_frequency = flush_frequency
+
+        self.connection = sqlite3.connect(cache_filepath, timeout=timeout)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS evals ("
+            "position TEXT NOT NULL, depth INTEGER NOT NULL, engine TEXT NOT NULL, score INTEGER NOT NULL, "
+            "PRIMARY KEY (position, depth, engine)) WITHOUT ROWID"
+        )
+        self.connection.commit()
+
+        self.pending = {}       # Evaluations not written to the database yet (position - score)
+
+        # Cache statistics
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # Returns cached evaluation of given position, or None if it was not evaluated yet
+    def get(self, board: chess.Board) -> int | None:
+        position = board.epd()
+        score = self.pending.get(position)
+
+        if score is None:
+            row = self.connection.execute(
+                "SELECT score FROM evals WHERE position = ? AND depth = ? AND engine = ?", (position, self.depth, self.engine_id)
+            ).fetchone()
+            score = row[0] if row else None
+
+        if score is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return score
+
+    # Stores evaluation of given position
+    def put(self, board: chess.Board, score: int):
+        self.pending[board.epd()] = score
+
+        if len(self.pending) >= self.flush_frequency:
+            self.flush()
+
+    # Writes all buffered evaluations to the database
+    # - If other process has evaluated the same position in the meantime, it's evaluation is kept
+    def flush(self):
+        if not self.pending:
+            return
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO evals (position, depth, engine, score) VALUES (?, ?, ?, ?)",
+                [(position, self.depth, self.engine_id, score) for position, score in self.pending.items()]
+            )
+
+        self.pending.clear()
+
+    def close(self):
+        if self.connection:
+            self.flush()
+            self.connection.close()
+            self.connection = None
+
+    # Returns a fraction of lookups answered by the cache
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,146 @@
+from . import pgn
+
+import asyncio
+import chess
+import chess.engine
+
+from typing import Awaitable, Callable
+
+
+# ------------------
+# Engine worker pool
+# ------------------
+
+# A pool of UCI engine processes, driven by chess.engine asyncio API
+# - Positions are put into a queue, from which each engine takes a new one as soon as it's done with the previous one
+# - Scores are gathered back in the order of given positions
+# - Engines that crash are restarted and the position is analysed again (up to max_retries times, in case the position itself crashes the engine)
+# - An engine which crashes max_crashes times in a row (without any successful analysis) is considered broken and is not restarted anymore
+# - Evaluations are relative to the side to move [cp], mate in n moves as +-(MATE_SCORE - n), None if analysis failed
+class EnginePool:
+    def __init__(self, engine_command: str | list[str], n_engines: int = 1, depth: int = 10, max_retries: int = 2,
+                 max_crashes: int = 10):
+        self.engine_command = engine_command
+        self.n_engines = n_engines
+        self.limit = chess.engine.Limit(depth=depth)
+        self.max_retries = max_retries
+        self.max_crashes = max_crashes
+
+        self.loop = asyncio.new_event_loop()
+        self.engines = [None] * n_engines       # (transport, protocol) of each engine, None if it's not running
+        self.crashes = [0] * n_engines          # Number of crashes in a row of each engine
+
+        # Pool statistics
+        self.analysed = 0
+        self.failed = 0
+        self.restarts = 0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # Returns the name of the engine (from UCI 'id name' command)
+    def engine_id(self) -> str:
+        _, protocol = next(engine for engine in self.engines if engine is not None)
+        return protocol.id.get("name", str(self.engine_command))
+
+    # Starts all engine processes
+    def start(self) -> "EnginePool":
+        self.loop.run_until_complete(self.__for_each_engine(self.__open))
+        return self
+
+    # Analyses all given positions and returns their evaluations (in the same order)
+    def analyse(self, boards: list[chess.Board]) -> list[int | None]:
+        return self.loop.run_until_complete(self.__analyse_all(boards))
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+
+        self.loop.run_until_complete(self.__for_each_engine(self.__quit))
+        self.loop.close()
+
+    # Runs given coroutine concurrently for all engines
+    async def __for_each_engine(self, coroutine: Callable[[int], Awaitable[None]]):
+        await asyncio.gather(*(coroutine(i) for i in range(self.n_engines)))
+
+    async def __open(self, i: int):
+        self.engines[i] = await chess.engine.popen_uci(self.engine_command)
+
+    async def __quit(self, i: int):
+        if self.engines[i] is None:
+            return
+
+        transport, protocol = self.engines[i]
+        self.engines[i] = None
+
+        try:
+            await asyncio.wait_for(protocol.quit(), timeout=5)
+        except Exception:
+            transport.close()
+
+    # Restarts i-th engine, returns False if it's not possible anymore
+    async def __restart(self, i: int) -> bool:
+        transport, _ = self.engines[i]
+        self.engines[i] = None
+        transport.close()
+
+        self.crashes[i] += 1
+
+        if self.crashes[i] >= self.max_crashes:
+            print(f"[ ERROR: Engine {i} crashed {self.crashes[i]} times in a row, it will not be restarted ]")
+            return False
+
+        self.restarts += 1
+        print(f"[ WARNING: Engine {i} crashed, restarting... ]")
+
+        try:
+            await self.__open(i)
+        except Exception as e:
+            print(f"[ ERROR: Could not restart engine {i}: {e} ]")
+            return False
+
+        return True
+
+    async def __analyse_all(self, boards: list[chess.Board]) -> list[int | None]:
+        queue = asyncio.Queue()
+        for item in enumerate(boards):
+            queue.put_nowait(item)
+
+        scores = [None] * len(boards)
+
+        # A position put back by an engine which could not be restarted may come after the other workers found the queue empty,
+        # so workers are run again until the queue is drained (or no engine is alive)
+        while not queue.empty() and any(engine is not None for engine in self.engines):
+            await asyncio.gather(*(self.__worker(i, queue, scores) for i in range(self.n_engines)))
+
+        self.analysed += len(boards)
+        self.failed += scores.count(None)
+
+        return scores
+
+    # Takes positions from the queue until it's empty (or the engine is dead)
+    async def __worker(self, i: int, queue: asyncio.Queue, scores: list[int | None]):
+        while self.engines[i] is not None and not queue.empty():
+            idx, board = queue.get_nowait()
+
+            for _ in range(self.max_retries + 1):
+                try:
+                    _, protocol = self.engines[i]
+                    analysis = await protocol.analyse(board, self.limit, info=chess.engine.INFO_SCORE)
+                    scores[idx] = analysis["score"].pov(board.turn).score(mate_score=pgn.MATE_SCORE)
+                    self.crashes[i] = 0
+                    break
+                except chess.engine.EngineTerminatedError:
+                    # The position is analysed again by the restarted engine
+                    if not await self.__restart(i):
+                        queue.put_nowait((idx, board))      # Let other engines take care of it
+                        break
+                except (chess.engine.EngineError, KeyError) as e:
+                    # Positions without evaluation are skipped from the move classification
+                    print(f"Engine analysis error: {e}")
+                    break
+            else:
+                print(f"Engine analysis error: position {board.fen()} crashed the engine {self.max_retries + 1} times")
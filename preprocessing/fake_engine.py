@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import chess
+import sys
+import time
+
+
+# ----------------
+# Fake UCI engine
+# ----------------
+
+# A minimal UCI engine, which can stand in for Stockfish when checking the engine pool
+# - Evaluation is a deterministic function of the position (material and mobility), so results can be compared between runs
+# - Usage: python fake_engine.py [--delay=<ms>] [--crash-every=<n>]
+#   - delay: time spent on each search, to emulate engine throughput
+#   - crash-every: the process exits without a word in the middle of every n-th search, to check restarting of crashed engines
+
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 300, chess.BISHOP: 300, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+
+
+# Returns the evaluation relative to the side to move [cp]
+def evaluate(board: chess.Board) -> int:
+    material = sum(PIECE_VALUES[piece.piece_type] * (1 if piece.color == board.turn else -1) for piece in board.piece_map().values())
+    mobility = board.legal_moves.count()
+
+    return material + mobility - 20
+
+
+# Parses "position [startpos | fen <fen>] [moves <move1> ... <moveN>]" command
+def parse_position(args: list[str]) -> chess.Board:
+    moves_idx = args.index("moves") if "moves" in args else len(args)
+    board = chess.Board() if args[0] == "startpos" else chess.Board(" ".join(args[1:moves_idx]))
+
+    for move in args[moves_idx + 1:]:
+        board.push_uci(move)
+
+    return board
+
+
+def main():
+    options = dict(arg[2:].split("=") for arg in sys.argv[1:] if arg.startswith("--"))
+    delay_s = int(options.get("delay", 0)) / 1000
+    crash_every = int(options.get("crash-every", 0))
+
+    board = chess.Board()
+    searches = 0
+
+    for line in sys.stdin:
+        command, *args = line.split() or [""]
+
+        if command == "uci":
+            print("id name FakeEngine 1.0", "id author Statistiken", "uciok", sep="\n", flush=True)
+        elif command == "isready":
+            print("readyok", flush=True)
+        elif command == "position":
+            board = parse_position(args)
+        elif command == "go":
+            searches += 1
+            time.sleep(delay_s)
+
+            if crash_every and searches % crash_every == 0:
+                sys.exit(1)
+
+            if board.is_checkmate():
+                print("info depth 1 score mate 0", "bestmove (none)", sep="\n", flush=True)
+            else:
+                best_move = next(iter(board.legal_moves), None)
+                print(f"info depth 1 score cp {evaluate(board)}", f"bestmove {best_move.uci() if best_move else '(none)'}", sep="\n", flush=True)
+        elif command == "quit":
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,22 @@
+from . import book
+from . import cache
+from . import engine
+from . import instrument
 from . import pgn
 from . import reader
 
-import chess
-import chess.polyglot
-import chess.engine
+import numpy as np
 import pandas as pd
 
 from collections import defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
+from functools import partial
 from math import exp
-from typing import Dict
+from typing import Callable, Dict
 
 
 # Some constants
-MATE_SCORE = 10000
+MATE_SCORE = pgn.MATE_SCORE
 MAX_CP = 1000
 
 
@@ -47,6 +50,22 @@ class PlayerData:
     material_imbalance: int = 0
     no_book_moves: int = 0
 
+    ratings: list[int] = field(default_factory=list)    # Ratings from the first gpp games, in file order
+
+    # Merges statistics of the same player calculated on two consecutive parts of the input file
+    # - self has to come from the earlier part, so elo is still taken at the gpp-th game of the whole file
+    # - Merging is associative, partial results can be reduced in any grouping (but in file order)
+    def merge(self, other: "PlayerData", gpp: int) -> "PlayerData":
+        merged = PlayerData(name=self.name or other.name, ratings=(self.ratings + other.ratings)[:gpp])
+
+        for f in fields(PlayerData):
+            if f.type is int and f.name != "elo":
+                setattr(merged, f.name, getattr(self, f.name) + getattr(other, f.name))
+
+        merged.elo = merged.ratings[gpp - 1] if len(merged.ratings) >= gpp else 0
+
+        return merged
+
 
 # ----------------
 # Helper functions
@@ -58,17 +77,104 @@ def logistic(score: int) -> float:
     
     return 1.0 / (1.0 + exp(-scaled))
 
-# Helper function to get heuristic material value for a side
-def get_material_value(board: chess.Board, color: chess.Color) -> int:
-    value = 0
+# A lookup table of logistic() for all evaluations in [-LOGISTIC_RANGE, LOGISTIC_RANGE]
+# - Built with math.exp, so it gives exactly the same values as the function itself
+LOGISTIC_RANGE = 1 << 14
+LOGISTIC_TABLE = np.array([logistic(score) for score in range(-LOGISTIC_RANGE, LOGISTIC_RANGE + 1)])
+
+# Vectorized version of logistic()
+def logistic_array(scores: np.ndarray) -> np.ndarray:
+    inside = np.abs(scores) <= LOGISTIC_RANGE
+
+    if inside.all():
+        return LOGISTIC_TABLE[scores + LOGISTIC_RANGE]
+    
+    return np.array([logistic(score) for score in scores.tolist()])
+
+# Yields python-chess boards after given moves (sorted indices) of the main line of a game
+# - Boards keep their move stacks, so the engine knows the history of the position
+def boards_after(game: pgn.Game, plies: list[int]):
+    board = game.board()
+    moves = game.moves()
+    n_move = 0
+
+    for ply in plies:
+        while n_move <= ply:
+            move = moves[n_move]
+            board.push(board.parse_san(move) if isinstance(move, str) else move)
+            n_move += 1
+
+        yield board.copy()
+
+
+# -----------------------
+# Per-game feature kernel
+# -----------------------
+
+# PlayerData fields calculated by game_features()
+KERNEL_FIELDS = [
+    "no_moves", "cp_loss", "no_innacuracies", "no_mistakes", "no_blunders",
+    "time_usage_win", "time_usage_loss", "time_usage_good_move", "time_usage_innacuracy_mistake", "time_usage_blunder"
+]
+
+# Returns index of the last element with mask set before each element (-1 if there is none)
+def previous_index(mask: np.ndarray) -> np.ndarray:
+    last_idx = np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+    return np.concatenate(([-1], last_idx))[:-1]
+
+# Calculates contributions of a single game to KERNEL_FIELDS of both players, with a handful of array operations
+# - evals: evaluation after each move relative to side to move [cp], MISSING for moves excluded from classification
+# - clocks: remaining time of the player after each move [s], MISSING if unknown
+# - Returns an array of shape (2, len(KERNEL_FIELDS)), first row for White
+# - NOTE: assumes that White makes the first move
+def game_features(evals: np.ndarray, clocks: np.ndarray, initial_time_s: int, increment_s: int, result: int) -> np.ndarray:
+    evals = evals.astype(np.int64)
+    clocks = clocks.astype(np.int64)
+
+    # Eval before each move - the last known eval, relative to player on move
+    has_eval = evals != pgn.MISSING
+    prev_idx = previous_index(has_eval)
+    last_evals = np.where(prev_idx >= 0, evals[prev_idx], 20)
+    current_evals = np.where(has_eval, evals, 0)
 
-    value += len(board.pieces(chess.PAWN, color)) * 1
-    value += len(board.pieces(chess.KNIGHT, color)) * 3
-    value += len(board.pieces(chess.BISHOP, color)) * 3
-    value += len(board.pieces(chess.ROOK, color)) * 5
-    value += len(board.pieces(chess.QUEEN, color)) * 9
+    cp_loss = np.where(has_eval, np.clip(current_evals + last_evals, 0, MAX_CP), 0)     # current_eval - (-last_eval)
+    norm_diff = np.maximum(0, logistic_array(current_evals) - logistic_array(-last_evals))
 
-    return value
+    # Classify the moves based on CPL and probability change
+    blunder = has_eval & (norm_diff > 0.45) & (cp_loss > 100)
+    mistake = has_eval & ~blunder & ((norm_diff > 0.3) | (cp_loss > 400))
+    innacuracy = has_eval & ~blunder & ~mistake & ((norm_diff > 0.2) | (cp_loss > 200))
+    good = has_eval & ~blunder & ~mistake & ~innacuracy
+
+    # Time spent on each move - the difference from the previous clock of the same player
+    time_spent = np.zeros(len(evals), dtype=np.int64)
+
+    for side in (0, 1):
+        side_clocks = clocks[side::2]
+        has_clock = side_clocks != pgn.MISSING
+
+        prev_idx = previous_index(has_clock)
+        time_before_move = np.where(prev_idx >= 0, side_clocks[prev_idx], initial_time_s)
+
+        time_spent[side::2] = np.where(has_clock, time_before_move + increment_s - side_clocks, 0)
+
+    # Per-move contributions, summed up for each player
+    per_move = np.stack([
+        np.ones(len(evals), dtype=np.int64), cp_loss, innacuracy, mistake, blunder,
+        time_spent, time_spent,
+        time_spent * good, time_spent * (innacuracy | mistake), time_spent * blunder
+    ], axis=1)
+
+    features = np.stack([per_move[0::2].sum(axis=0), per_move[1::2].sum(axis=0)])
+
+    # Time usage is counted either as win or loss time (and not at all for draws)
+    winner = 0 if result == 1 else 1
+    win, loss = KERNEL_FIELDS.index("time_usage_win"), KERNEL_FIELDS.index("time_usage_loss")
+
+    features[:, win] *= [result != 0 and side == winner for side in (0, 1)]
+    features[:, loss] *= [result != 0 and side != winner for side in (0, 1)]
+
+    return features
 
 
 # ----------------------
@@ -76,33 +182,58 @@ def get_material_value(board: chess.Board, color: chess.Color) -> int:
 # ----------------------
 
 # Calculates all fields of PlayerData structure for each player, based on given games
-def create_dataset(game_repo: reader.StandardSlowReader,
-                   engine_filepath: str,
-                   book_filepath: str,      # .epd format
-                   engine_max_depth: int = 10,
-                   gpp: int = 10,
-                   verbose: bool = False,
-                   logging_frequency: int = 1000) -> dict[str, PlayerData]:
+# - Returns data of all players (regardless of number of games), usable as a mapper of parallel reader
+# - With a game criterion, games that do not meet it are skipped (a pushdown game filter of the reader is just a superset of it)
+# - With a monitor, games are counted, book lookups, cache lookups, engine analysis and game features are timed in their phases
+#   and hit rates of the book and the cache are tracked
+def analyse_games(game_repo: reader.GameReader,
+                  engine_filepath: str,
+                  book_filepath: str,       # polyglot .bin format
+                  engine_max_depth: int = 10,
+                  gpp: int = 10,
+                  cache_filepath: str | None = None,
+                  n_engines: int = 1,
+                  verbose: bool = False,
+                  logging_frequency: int = 1000,
+                  monitor: instrument.Monitor | None = None,
+                  game_criterion: Callable[[pgn.Game], bool] | None = None) -> dict[str, PlayerData] | None:
     # We store all the calculated properties here (player_name - PlayerData)
     players = defaultdict(PlayerData)
 
-    # Initialize required components - engine & opening book
-    engine = None
-    book = set()
+    # Initialize required components - engine pool (with evaluation cache) & opening book
+    engine_pool = None
+    eval_cache = None
+    opening_book = None
 
     if engine_filepath:
         try:
-            engine = chess.engine.SimpleEngine.popen_uci(engine_filepath)
+            engine_pool = engine.EnginePool(engine_filepath, n_engines, engine_max_depth).start()
         except Exception as e:
             print(f"[ ERROR: Could not initialize chess engine: {e} ]")
             return
+
+        if cache_filepath:
+            eval_cache = cache.EvalCache(cache_filepath, engine_pool.engine_id(), engine_max_depth)
     
     if book_filepath:
-        book = chess.polyglot.open_reader(book_filepath)
-        print(f"[ Succesfully loaded opening book from {book_filepath} ]")
+        opening_book = book.OpeningBook(book_filepath)
+
+        if verbose:
+            print(f"[ Succesfully loaded opening book from {book_filepath} ({len(opening_book)} entries) ]")
+
+    if monitor is not None:
+        for name, watched, counters in [("book", opening_book, ["hits", "misses"]), ("cache", eval_cache, ["hits", "misses"]),
+                                        ("engine", engine_pool, ["analysed", "failed", "restarts"])]:
+            if watched is not None:
+                monitor.watch(name, watched, counters)
 
-    # Iterate over all games
-    for id, game in enumerate(game_repo):
+    book_lookup, cache_lookup = instrument.phase(monitor, "book"), instrument.phase(monitor, "cache")
+    analysis, features_calculation = instrument.phase(monitor, "engine"), instrument.phase(monitor, "features")
+
+    # Iterate over all games (that meet the criterion)
+    games = game_repo if game_criterion is None else filter(game_criterion, game_repo)
+
+    for id, game in enumerate(games):
         try:
             p1, p2 = game.players()
         except AttributeError as e:
@@ -111,9 +242,12 @@ def create_dataset(game_repo: reader.StandardSlowReader,
         # Step 1- update game counter, player name and elo (but only at the last analyzed game for most recent results!)
         for player in [p1, p2]:
             players[player.name].no_games += 1
+            players[player.name].name = player.name
+
+            if players[player.name].no_games <= gpp:
+                players[player.name].ratings.append(player.rating)
 
             if players[player.name].no_games == gpp:
-                players[player.name].name = player.name
                 players[player.name].elo = player.rating
         
         # Step 2 -update game result counters
@@ -125,137 +259,161 @@ def create_dataset(game_repo: reader.StandardSlowReader,
             players[p1.name].no_loss += 1
             players[p2.name].no_wins += 1
 
-        # Step 3 - initialize helper variables to keep track of changing position and clock situation
-        board = game.data.board()       # Position
-
+        # Step 3 - replay the main line natively (it stops at the first illegal move)
+        # - python-chess boards are created only for positions analysed by the engine
+        replay = game.replay()
+        n_moves = replay.plies
         initial_time_s, increment_s = game.time_control()[0] * 60, game.time_control()[1]
-        player_clocks = {chess.WHITE: initial_time_s, chess.BLACK: initial_time_s}          # Clock states
 
-        still_in_book = True if book else False
-
-        # A starting evaluation, assuming we always begin in starting chess position
+        # Side which made each move, evals from the PGN relative to the side to move after each move
         # - NOTE: all engine evals are relative!
-        last_eval = 20   # [cp]
-
-        # Iterate over all moves from game main line
-        for n_move, node in enumerate(game.data.mainline()):
-            # Special case - starting position
-            # - We can skip starting position from move-specyfic analysis
-            if node.parent is None:
-                continue
-
-            move = node.move
-            assert move is not None, "Node in mainline should have a move"
-
-            mp = p1 if board.turn == chess.WHITE else p2
-
-            # Step 4 - update move counter
-            players[mp.name].no_moves += 1
-
-            # Step 5 - calculate time spent on the move
-            node_clock_s = node.clock()     # Time remaining for player who just moved (after this move)
-            time_spent_on_move = 0
-
-            if node_clock_s is not None:
-                time_before_move = player_clocks[board.turn]
-                time_spent_on_move = time_before_move + increment_s - node_clock_s
-
-                # Update time counters from players dict
-                if result == 1 and board.turn == chess.WHITE:
-                    players[p1.name].time_usage_win += time_spent_on_move
-                elif result == 1:
-                    players[p2.name].time_usage_loss += time_spent_on_move
-                elif result == -1 and board.turn == chess.BLACK:
-                    players[p2.name].time_usage_win += time_spent_on_move
-                elif result == -1:
-                    players[p1.name].time_usage_loss += time_spent_on_move
-                
-                player_clocks[board.turn] = node_clock_s
-            
-            # Step 6 - opening book checkout
-            if n_move <= 30:
-                entries = list(book.find_all(board))
-                if move in [entry.move for entry in entries]:
-                    players[mp.name].no_book_moves += 1
-            
-            # Step 7 - engine analysis for ACL and move classification
-            move_classification = "good"
-            try:
-                current_eval = node.eval()
-
-                if current_eval is not None:
-                    current_eval = current_eval.relative.score(mate_score=MATE_SCORE)
-                    board.push(move)
-                else:
-                    # If we don't have eval in PGN notation, we need to run engine to obtain one
-                    board.push(move)
-
-                    if engine_filepath is None:
-                        current_eval = last_eval
-                    else:
-                        analysis_after = engine.analyse(board, chess.engine.Limit(depth=engine_max_depth), info=chess.engine.INFO_SCORE)
-                        current_eval = analysis_after['score'].pov(board.turn).score(mate_score=MATE_SCORE)
-                
-                cp_loss = min(MAX_CP, max(0, current_eval + last_eval))      # current_eval - (-last_eval)
-                norm_diff = max(0, logistic(current_eval) - logistic(-last_eval))
-
-                # Classify the move based on CPL and probability change
-                if norm_diff > 0.45 and cp_loss > 100:
-                    move_classification = "blunder"
-                elif norm_diff > 0.3 or cp_loss > 400:
-                    move_classification = "mistake"
-                elif norm_diff > 0.2 or cp_loss > 200:
-                    move_classification = "innacuracy"
-
-                # Now, update the game quality fields for player on move
-                players[mp.name].cp_loss += cp_loss
-                if move_classification == "blunder":
-                    players[mp.name].no_blunders += 1
-                    players[mp.name].time_usage_blunder += time_spent_on_move
-                elif move_classification == "mistake":
-                    players[mp.name].no_mistakes += 1
-                    players[mp.name].time_usage_innacuracy_mistake += time_spent_on_move
-                elif move_classification == "innacuracy":
-                    players[mp.name].no_innacuracies += 1
-                    players[mp.name].time_usage_innacuracy_mistake += time_spent_on_move
+        white_moves = (np.arange(n_moves) % 2 == 0) == replay.turn
+        node_evals = game.evals()[:n_moves].astype(np.int64)
+        has_eval = node_evals != pgn.MISSING
+        evals = np.where(has_eval, np.where(white_moves, -node_evals, node_evals), pgn.MISSING)
+
+        to_analyse = []     # Positions (after the move) to be analysed by the engine
+
+        # Step 4 - opening book checkout
+        if opening_book is not None:
+            with book_lookup:
+                keys, book_moves = replay.keys[:31].tolist(), replay.book_moves[:31].tolist()
+
+                for n_move, (key, raws) in enumerate(zip(keys, book_moves)):
+                    if opening_book.contains_hash(key, raws):
+                        players[(p1 if white_moves[n_move] else p2).name].no_book_moves += 1
+
+        # Step 5 - obtain evaluations of moves without one in the PGN
+        if engine_pool is None:
+            # If we don't have eval in PGN notation nor engine, we assume the eval has not changed
+            # (the last known one, starting with 20 cp of the starting position)
+            last_idx = np.maximum.accumulate(np.where(has_eval, np.arange(n_moves), -1))
+            evals = np.where(last_idx >= 0, evals[last_idx], 20)
+        else:
+            # Engine is called only for positions which have not been evaluated yet (in any run)
+            # - All such positions from the game are analysed at once by the engine pool (Step 7)
+            missing = np.flatnonzero(~has_eval).tolist()
+
+            for n_move, board in zip(missing, boards_after(game, missing)):
+                with cache_lookup:
+                    score = eval_cache.get(board) if eval_cache else None
+
+                if score is None:
+                    to_analyse.append((n_move, board))
                 else:
-                    players[mp.name].time_usage_good_move += time_spent_on_move
-                
-                # Update dynamic eval variable
-                last_eval = current_eval
-
-            except (chess.engine.EngineError, chess.engine.EngineTerminatedError, AttributeError) as e:
-                print(f"Engine analysis error in game: {e}")
-                # Ensure board is advanced if error occurs mid-analysis
-                if board.peek() != move: # If move wasn't pushed due to error path
-                    board.push(move)
-            except Exception as e: # Catch any other analysis error
-                print(f"Unexpected error during engine analysis: {e}")
-                if board.peek() != move:
-                    board.push(move)
-            
-            # NOTE: After above section, it is guaranteed that board is "after" last move
-
-            # Step 8 - calculate remaining properties which require board to be in "after" state
-            # - Some properties like material imbalance apply to both players
-            material_imbalance = abs(get_material_value(board, chess.WHITE) - get_material_value(board, chess.BLACK))
-            players[p1.name].material_imbalance += material_imbalance
-            players[p2.name].material_imbalance += material_imbalance
+                    evals[n_move] = score
+
+        # Step 6 - material imbalance after each move, which applies to both players
+        material_imbalance = int(np.abs(replay.material).sum())
+        players[p1.name].material_imbalance += material_imbalance
+        players[p2.name].material_imbalance += material_imbalance
+
+        # Step 7 - engine analysis of positions without evaluation
+        # - Moves without evaluation (analysis failed) are skipped from the move classification
+        if to_analyse:
+            with analysis:
+                scores = engine_pool.analyse([position for _, position in to_analyse])
+
+            with cache_lookup:
+                for (n_move, position), score in zip(to_analyse, scores):
+                    if score is not None:
+                        evals[n_move] = score
+
+                        if eval_cache:
+                            eval_cache.put(position, score)
+
+        # Step 8 - time usage, ACL and move classification for both players
+        with features_calculation:
+            features = game_features(evals[:n_moves], game.clocks()[:n_moves], initial_time_s, increment_s, result)
+
+            for player, row in zip([p1, p2], features.tolist()):
+                for field, value in zip(KERNEL_FIELDS, row):
+                    setattr(players[player.name], field, getattr(players[player.name], field) + value)
 
         # After processing all the moves, determine the game result
         # - NOTE: there are no games ended up by time forfeit in the dataset
-        if not board.is_checkmate() and not board.is_stalemate():
+        if not replay.checkmate and not replay.stalemate:
             players[p1.name].no_nonterminal_results += 1
             players[p2.name].no_nonterminal_results += 1
         
-        if (id + 1) % logging_frequency == 0:
+        if verbose and (id + 1) % logging_frequency == 0:
             print(f"[ Processed {id + 1} games... ]")
 
-    if engine:
-        engine.quit()
+        if monitor is not None:
+            monitor.tick()
+
+    if engine_pool:
+        engine_pool.close()
+
+        if verbose:
+            print(f"[ Engine analysis: {engine_pool.analysed} positions, {engine_pool.failed} failed, {engine_pool.restarts} engine restarts ]")
+
+    if eval_cache:
+        eval_cache.close()
+
+        if verbose:
+            print(f"[ Evaluation cache lookups: {eval_cache.hits} hits, {eval_cache.misses} misses ({eval_cache.hit_rate():.1%} hit rate) ]")
+
+    if verbose and opening_book is not None:
+        print(f"[ Opening book lookups: {opening_book.hits} hits, {opening_book.misses} misses ({opening_book.hit_rate():.1%} hit rate) ]")
+
+    return dict(players)
+
+
+# Merges player data calculated on two consecutive parts of the input file
+def merge_datasets(left: dict[str, PlayerData] | None, right: dict[str, PlayerData] | None, gpp: int = 10) -> dict[str, PlayerData] | None:
+    if left is None or right is None:
+        return None
+
+    merged = dict(left)
+
+    for name, data in right.items():
+        merged[name] = merged[name].merge(data, gpp) if name in merged else data
+
+    return merged
+
+
+# Calculates all fields of PlayerData structure for all players of given games (regardless of number of games)
+# - With parallel reader, each worker analyses its own part of the file (with its own engine and book)
+#   and partial results are merged in file order, which gives exactly the same result as sequential processing
+# - Monitor is used only by sequential processing (workers are not monitored, progress of parallel reader is still tracked)
+def analyse_dump(game_repo: reader.GameReader | reader.ParallelReader,
+                 engine_filepath: str,
+                 book_filepath: str,        # polyglot .bin format
+                 engine_max_depth: int = 10,
+                 gpp: int = 10,
+                 cache_filepath: str | None = None,
+                 n_engines: int = 1,
+                 verbose: bool = False,
+                 logging_frequency: int = 1000,
+                 monitor: instrument.Monitor | None = None,
+                 game_criterion: Callable[[pgn.Game], bool] | None = None) -> dict[str, PlayerData] | None:
+    if isinstance(game_repo, reader.ParallelReader):
+        mapper = partial(analyse_games, engine_filepath=engine_filepath, book_filepath=book_filepath,
+                         engine_max_depth=engine_max_depth, gpp=gpp, cache_filepath=cache_filepath, n_engines=n_engines,
+                         game_criterion=game_criterion)
+        return game_repo.map_reduce(mapper, partial(merge_datasets, gpp=gpp))
+
+    return analyse_games(game_repo, engine_filepath, book_filepath, engine_max_depth, gpp, cache_filepath, n_engines, verbose,
+                         logging_frequency, monitor, game_criterion)
+
+
+# Calculates all fields of PlayerData structure for players with at least gpp games (see analyse_dump)
+def create_dataset(game_repo: reader.GameReader | reader.ParallelReader,
+                   engine_filepath: str,
+                   book_filepath: str,      # polyglot .bin format
+                   engine_max_depth: int = 10,
+                   gpp: int = 10,
+                   cache_filepath: str | None = None,
+                   n_engines: int = 1,
+                   verbose: bool = False,
+                   logging_frequency: int = 1000,
+                   monitor: instrument.Monitor | None = None) -> dict[str, PlayerData] | None:
+    players = analyse_dump(game_repo, engine_filepath, book_filepath, engine_max_depth, gpp, cache_filepath, n_engines, verbose,
+                           logging_frequency, monitor)
 
-    if book:
-        book.close()
+    if players is None:
+        return
 
     # Select only players with >= gpp games
     return {name: data for name, data in players.items() if data.no_games >= gpp}
@@ -0,0 +1,317 @@
+from . import pgn
+from . import reader
+
+import json
+import numpy as np
+import os
+import sys
+import zstandard as zstd
+
+from typing import Iterator
+
+
+# --------------
+# Helper defines
+# --------------
+
+# Columns of the index, each one is stored in a separate binary file and memory-mapped on load
+INDEX_COLUMNS = {
+    "frame": np.uint32,         # Zstd frame where the game starts (row of the frame table)
+    "offset": np.uint64,        # Offset of the game in decompressed frame data
+    "length": np.uint32,        # Length of the game data (without surrounding whitespace)
+    "white": np.uint32,         # Player IDs (line numbers in players.txt)
+    "black": np.uint32,
+    "white_elo": np.int16,
+    "black_elo": np.int16,
+    "base": np.int16,           # Time control [s]
+    "increment": np.int16,
+    "tempo": np.uint8,          # Position in TEMPOS, OTHER_TEMPO for anything else
+    "flags": np.uint8,          # FLAG_* bits
+}
+
+# Value of missing (or out of range) ratings and time controls
+INDEX_MISSING = np.iinfo(np.int16).min
+
+# Tempo codes - tempo of the game is the same as pgn.tempo() of its Event header
+TEMPOS = ["ultrabullet", "bullet", "blitz", "rapid", "classical", "correspondence"]
+OTHER_TEMPO = 255
+
+FLAG_EVALS = 1
+FLAG_CLOCKS = 2
+FLAG_FORFEIT = 4                # Termination header contains "forfeit"
+FLAG_RATED = 8
+
+# Header fields read while indexing
+INDEX_FIELDS = ["Event", "TimeControl", "Termination", "White", "Black", "WhiteElo", "BlackElo"]
+
+INDEX_VERSION = 1
+
+
+# ----------------
+# Helper functions
+# ----------------
+
+# Returns the default index directory of given file (a sidecar next to it)
+def default_index_dir(input_file: str) -> str:
+    return input_file + ".idx"
+
+
+# Returns True if given file is zstd compressed
+def is_compressed(input_file: str) -> bool:
+    with open(input_file, "rb") as file:
+        magic = int.from_bytes(file.read(4), "little")
+
+    return magic == reader.ZSTD_FRAME_MAGIC or magic & 0xFFFFFFF0 == reader.ZSTD_SKIPPABLE_MAGIC
+
+
+# Identifies the version of a file, the index is valid only for the same version
+def source_stamp(input_file: str) -> dict:
+    stat = os.stat(input_file)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+# Returns True if there is a complete index of the current version of given file
+def is_fresh(input_file: str, index_dir: str | None = None) -> bool:
+    meta_filepath = os.path.join(index_dir or default_index_dir(input_file), "meta.json")
+
+    if not os.path.exists(meta_filepath):
+        return False
+
+    with open(meta_filepath, "r") as file:
+        meta = json.load(file)
+
+    return meta["version"] == INDEX_VERSION and meta["source"] == source_stamp(input_file)
+
+
+# Returns (compressed offset, decompressed offset) of each frame
+# - Decompressed sizes are taken from frame headers, frames without it have to be decompressed once
+# - Plain text file is a single "frame"
+def frame_table(input_file: str) -> np.ndarray:
+    if not is_compressed(input_file):
+        return np.zeros((1, 2), dtype=np.uint64)
+
+    frames = reader.scan_frames(input_file)
+    table = np.zeros((len(frames), 2), dtype=np.uint64)
+    dctx = zstd.ZstdDecompressor()
+    start = 0
+
+    with open(input_file, "rb") as file:
+        for i, (offset, size) in enumerate(frames):
+            table[i] = offset, start
+
+            file.seek(offset)
+            content_size = zstd.frame_content_size(file.read(18))      # 18 bytes is the maximal frame header size
+
+            if content_size < 0 and i < len(frames) - 1:
+                content_size = sum(len(chunk) for chunk in dctx.read_to_iter(reader.FileSlice(file, offset, offset + size)))
+
+            start += max(content_size, 0)
+
+    return table
+
+
+# Encodes a batch of headers (see reader.Batch) into index columns
+# - Player IDs are assigned in order of first appearance
+def encode_batch(batch: reader.Batch, frames: np.ndarray, player_ids: dict[str, int]) -> dict[str, np.ndarray]:
+    events, event_values = batch["Event"]
+    terminations, termination_values = batch["Termination"]
+
+    tempos = np.array([TEMPOS.index(tempo) if (tempo := pgn.tempo(event)) in TEMPOS else OTHER_TEMPO for event in event_values], dtype=np.uint8)
+    is_rated = np.array([event.startswith("Rated") for event in event_values], dtype=bool)
+    is_forfeit = np.array(["forfeit" in termination for termination in termination_values], dtype=bool)
+
+    flags = (batch["has_evals"] * FLAG_EVALS) | (batch["has_clocks"] * FLAG_CLOCKS) | (is_forfeit[terminations] * FLAG_FORFEIT) | (is_rated[events] * FLAG_RATED)
+
+    frame = np.searchsorted(frames[:, 1], batch["offset"], side="right") - 1
+
+    def players(column: str) -> np.ndarray:
+        codes, names = batch[column]
+        ids = np.array([player_ids.setdefault(name, len(player_ids)) for name in names], dtype=np.uint32)
+        return ids[codes]
+
+    def small_int(values: np.ndarray) -> np.ndarray:
+        return np.where((values > INDEX_MISSING) & (values <= np.iinfo(np.int16).max), values, INDEX_MISSING)
+
+    return {
+        "frame": frame,
+        "offset": batch["offset"] - frames[frame, 1],
+        "length": batch["length"],
+        "white": players("White"),
+        "black": players("Black"),
+        "white_elo": small_int(batch["WhiteElo"]),
+        "black_elo": small_int(batch["BlackElo"]),
+        "base": small_int(batch["TimeControl"][:, 0]),
+        "increment": small_int(batch["TimeControl"][:, 1]),
+        "tempo": tempos[events],
+        "flags": flags,
+    }
+
+
+# ----------------
+# Index generation
+# ----------------
+
+# Indexes all games of given PGN file (either .zst or plain text) in a single pass
+# - Metadata is written last, so an interrupted indexing never leaves an index that looks complete
+def build_index(input_file: str, index_dir: str | None = None, max_games: int = sys.maxsize, batch_size: int = 1 << 16) -> "GameIndex":
+    index_dir = index_dir or default_index_dir(input_file)
+    os.makedirs(index_dir, exist_ok=True)
+
+    meta_filepath = os.path.join(index_dir, "meta.json")
+    if os.path.exists(meta_filepath):
+        os.remove(meta_filepath)
+
+    source = source_stamp(input_file)
+    compressed = is_compressed(input_file)
+    frames = frame_table(input_file)
+    player_ids = {}
+    no_games = 0
+
+    game_reader = reader.ZstdQuickReader if compressed else reader.StandardQuickReader
+
+    print(f"[ Indexing {input_file} started ]")
+
+    columns = {name: open(os.path.join(index_dir, f"{name}.bin"), "wb") for name in INDEX_COLUMNS}
+
+    try:
+        with game_reader(input_file, max_games=max_games) as game_repo:
+            for batch in game_repo.batches(INDEX_FIELDS, batch_size):
+                for name, values in encode_batch(batch, frames, player_ids).items():
+                    values.astype(INDEX_COLUMNS[name]).tofile(columns[name])
+
+                no_games += len(batch["has_evals"])
+    finally:
+        for file in columns.values():
+            file.close()
+
+    np.save(os.path.join(index_dir, "frames.npy"), frames)
+
+    with open(os.path.join(index_dir, "players.txt"), "w", encoding="utf-8") as file:
+        for name in player_ids:
+            file.write(name + "\n")
+
+    with open(meta_filepath, "w") as file:
+        json.dump({"version": INDEX_VERSION, "source": source, "compressed": compressed, "no_games": no_games, "no_players": len(player_ids)}, file)
+
+    print(f"[ Indexing {input_file} finished: {no_games} games, {len(player_ids)} players ]")
+
+    return GameIndex(input_file, index_dir)
+
+
+# ----------
+# Game index
+# ----------
+
+# A column-wise, memory-mapped index of all games of a PGN file (see build_index)
+# - Columns (see INDEX_COLUMNS) are NumPy arrays, so whole-dump selections are plain vectorized expressions, for example:
+#   (index["tempo"] == TEMPOS.index("rapid")) & (index["base"] == 600) & (index["flags"] & FLAG_EVALS != 0) & index.played_by(names)
+# - Selected games are read back decompressing only the frames they are in (the whole file is a single frame in original Lichess dumps,
+#   so to really skip the data, it should be split into frames first, see reader.reframe)
+# - Can be used as a context manager, just like game readers
+class GameIndex:
+    def __init__(self, input_file: str, index_dir: str | None = None, max_games: int | None = None):
+        self.input_file = input_file
+        self.index_dir = index_dir or default_index_dir(input_file)
+
+        if not is_fresh(input_file, self.index_dir):
+            raise ValueError(f"{self.index_dir} is not a complete index of the current version of {input_file}, build it with build_index()")
+
+        with open(os.path.join(self.index_dir, "meta.json"), "r") as file:
+            self.meta = json.load(file)
+
+        self.no_games = self.meta["no_games"] if max_games is None else min(self.meta["no_games"], max_games)
+        self.frames = np.load(os.path.join(self.index_dir, "frames.npy"))
+        self.columns = {name: self.__load_column(name, dtype) for name, dtype in INDEX_COLUMNS.items()}
+
+        self.names = None       # Player names (by ID), loaded on first use
+        self.ids = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def __len__(self) -> int:
+        return self.no_games
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    # Returns names of all players, indexed by their IDs
+    def players(self) -> list[str]:
+        if self.names is None:
+            with open(os.path.join(self.index_dir, "players.txt"), "r", encoding="utf-8") as file:
+                self.names = file.read().split("\n")[:-1]
+
+            self.ids = {name: i for i, name in enumerate(self.names)}
+
+        return self.names
+
+    # Returns a mask of games played by any of given players
+    def played_by(self, player_names: set[str] | list[str]) -> np.ndarray:
+        self.players()
+        ids = np.array([self.ids[name] for name in player_names if name in self.ids], dtype=np.uint32)
+
+        return np.isin(self["white"], ids) | np.isin(self["black"], ids)
+
+    # Yields players of selected games (given by a mask or game numbers), in file order
+    def iter_players(self, games: np.ndarray) -> Iterator[list[pgn.Player]]:
+        names = self.players()
+        games = self.__game_numbers(games)
+
+        whites, blacks = self["white"][games].tolist(), self["black"][games].tolist()
+        white_elos, black_elos = self["white_elo"][games].tolist(), self["black_elo"][games].tolist()
+
+        for white, black, white_elo, black_elo in zip(whites, blacks, white_elos, black_elos):
+            yield [pgn.Player(names[white], white_elo), pgn.Player(names[black], black_elo)]
+
+    # Yields PGN data (without surrounding whitespace) of selected games, in file order
+    def read_games(self, games: np.ndarray) -> Iterator[bytes]:
+        games = self.__game_numbers(games)
+        frames, offsets, lengths = self["frame"][games].tolist(), self["offset"][games].tolist(), self["length"][games].tolist()
+
+        with open(self.input_file, "rb") as file:
+            if not self.meta["compressed"]:
+                for offset, length in zip(offsets, lengths):
+                    file.seek(offset)
+                    yield file.read(length)
+                return
+
+            dctx = zstd.ZstdDecompressor()
+            stream = None
+            position = 0        # Position of the stream in the whole decompressed data
+
+            for frame, offset, length in zip(frames, offsets, lengths):
+                frame_start = int(self.frames[frame, 1])
+
+                # Start decompressing at the frame of the game, unless the stream has already got there
+                if stream is None or frame_start > position:
+                    stream = dctx.stream_reader(reader.FileSlice(file, int(self.frames[frame, 0])), read_across_frames=True)
+                    position = frame_start
+
+                skip = frame_start + offset - position
+                while skip > 0:
+                    skip -= len(stream.read(min(skip, 1 << 20)))
+
+                data = bytearray()
+                while len(data) < length and (chunk := stream.read(length - len(data))):
+                    data += chunk
+
+                position = frame_start + offset + len(data)
+                yield bytes(data)
+
+    # Yields players and PGN data of selected games, in file order
+    def iter_games(self, games: np.ndarray) -> Iterator[tuple[list[pgn.Player], bytes]]:
+        yield from zip(self.iter_players(games), self.read_games(games))
+
+    def __load_column(self, name: str, dtype: type) -> np.ndarray:
+        if self.no_games == 0:
+            return np.zeros(0, dtype=dtype)
+
+        return np.memmap(os.path.join(self.index_dir, f"{name}.bin"), dtype=dtype, mode="r", shape=(self.meta["no_games"],))[:self.no_games]
+
+    # Converts a game selection (mask or game numbers) into sorted game numbers
+    def __game_numbers(self, games: np.ndarray) -> np.ndarray:
+        games = np.asarray(games)
+        return np.flatnonzero(games) if games.dtype == bool else np.sort(games)
@@ -0,0 +1,254 @@
+from . import reader
+
+import json
+import os
+import sys
+import time
+
+from contextlib import nullcontext
+from typing import Any, ContextManager
+
+try:
+    import resource         # Not available on Windows, peak RSS is not reported there
+except ImportError:
+    resource = None
+
+
+# -------------
+# Memory probes
+# -------------
+
+# Returns current resident set size of this process in bytes, or None where it can not be read cheaply (outside of Linux)
+def current_rss() -> int | None:
+    try:
+        with open("/proc/self/statm", "rb") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Returns peak resident set size of this process in bytes, or None if it's not available
+def peak_rss() -> int | None:
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024       # Bytes on macOS, kilobytes elsewhere
+
+
+# ------
+# Phases
+# ------
+
+# Cumulative wall time of a named part of processing (reading, book lookups, engine analysis...), measured by 'with' blocks
+# - Phases are not reentrant, and they should not be nested (their shares of the elapsed time would not add up)
+class Phase:
+    __slots__ = ("seconds", "calls", "start")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.seconds += time.perf_counter() - self.start
+        self.calls += 1
+
+
+# Returns given phase of the monitor, or a no-op context manager without a monitor
+def phase(monitor: "Monitor | None", name: str) -> ContextManager:
+    return monitor.phase(name) if monitor is not None else nullcontext()
+
+
+# ----------------
+# Pipeline monitor
+# ----------------
+
+# Collects metrics of a running stage and writes them as JSON lines - a record every interval seconds and a final one on close()
+# - Each record holds games processed by the stage and their rate, input progress of the attached reader (bytes read from the input
+#   file and PGN data bytes, their rates and ETA), RSS, time spent in each phase and counters of watched objects (cache hits etc.)
+# - Rates are given both for the whole run and since the previous record, a run resumed from a checkpoint counts only its own work
+# - Stage calls tick() once per game - that's just a counter increment, the clock is read only once per check_every games
+# - Readers time their reading (decompression and parsing, or waiting for the parser thread) in the "read" phase by themselves
+# - With verbose, each record is also printed as a single line summary
+class Monitor:
+    def __init__(self, stage: str, output_file: str | None = None, interval: float = 30.0, verbose: bool = False, check_every: int = 64):
+        self.stage = stage
+        self.interval = interval
+        self.verbose = verbose
+        self.check_every = check_every
+
+        self.output = open(output_file, "a", encoding="utf-8") if output_file else None
+        self.closed = False
+
+        self.phases: dict[str, Phase] = {}
+        self.watched: dict[str, tuple[Any, list[str]]] = {}     # Name - (object, names of its counters)
+        self.game_repo = None
+
+        self.games = 0
+        self.next_check = check_every
+
+        # Values at the start and at the previous record - (time, games, reader progress)
+        self.first = self.last = (time.perf_counter(), 0, None)
+
+    # Context manager interface - the final record is written at the end
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # Starts tracking input progress of a reader (which also starts timing its "read" phase)
+    def attach(self, game_repo: reader.GameReader | reader.ParallelReader):
+        self.game_repo = game_repo
+        game_repo.monitor = self
+
+        progress = game_repo.progress()
+        self.first = self.last = (self.first[0], self.first[1], progress)
+
+    # Adds counters of an object (read at every record), hits and misses give a hit rate as well
+    def watch(self, name: str, watched: Any, counters: list[str]):
+        self.watched[name] = (watched, counters)
+
+    def phase(self, name: str) -> Phase:
+        if name not in self.phases:
+            self.phases[name] = Phase()
+
+        return self.phases[name]
+
+    # Counts processed games, writes a record if it's time for it
+    def tick(self, games: int = 1):
+        self.games += games
+
+        if self.games >= self.next_check:
+            self.next_check = self.games + self.check_every
+
+            if time.perf_counter() - self.last[0] >= self.interval:
+                self.record()
+
+    # Writes a record of the current state, returns it
+    def record(self, final: bool = False) -> dict:
+        now = time.perf_counter()
+        progress = self.game_repo.progress() if self.game_repo is not None else None
+
+        # A closed reader keeps its last known progress
+        if progress is None:
+            progress = self.last[2]
+
+        start_time, start_games, start_progress = self.first
+        last_time, last_games, last_progress = self.last
+
+        elapsed = max(now - start_time, 1e-9)
+        recent = max(now - last_time, 1e-9)
+
+        record = {
+            "stage": self.stage,
+            "time": time.time(),
+            "final": final,
+            "elapsed_s": elapsed,
+            "games": self.games,
+            "games_per_s": (self.games - start_games) / elapsed,
+            "recent_games_per_s": (self.games - last_games) / recent,
+        }
+
+        if progress is not None:
+            record.update(self.__progress_metrics(progress, start_progress, last_progress, elapsed, recent))
+
+        # Peak RSS is updated by the system lazily, so it can lag behind the current one
+        rss, peak = current_rss(), peak_rss()
+        peak = max(peak, rss or 0) if peak is not None else None
+
+        record["rss_mb"] = rss / 2**20 if rss is not None else None
+        record["peak_rss_mb"] = peak / 2**20 if peak is not None else None
+
+        # Time outside of all phases (that is the stage itself, for example replaying moves in the final stage)
+        record["phases"] = {
+            name: {"seconds": p.seconds, "calls": p.calls, "share": p.seconds / elapsed} for name, p in self.phases.items() if p.calls > 0
+        }
+        record["other_share"] = max(1.0 - sum(p.seconds for p in self.phases.values()) / elapsed, 0.0)
+        record["counters"] = {name: self.__counters(watched, counters) for name, (watched, counters) in self.watched.items()}
+
+        if self.output is not None:
+            self.output.write(json.dumps(record) + "\n")
+            self.output.flush()
+
+        if self.verbose:
+            print(summary(record))
+
+        self.last = (now, self.games, progress)
+        return record
+
+    def close(self):
+        if self.closed:
+            return
+
+        self.record(final=True)
+        self.closed = True
+
+        if self.output is not None:
+            self.output.close()
+
+    # Rates of input and PGN data bytes and ETA (which is based on the input position, so it takes skipped games into account)
+    def __progress_metrics(self, progress: reader.ReaderProgress, start: reader.ReaderProgress, last: reader.ReaderProgress,
+                           elapsed: float, recent: float) -> dict:
+        metrics = {
+            "input_bytes": progress.input_bytes,
+            "input_mb_per_s": (progress.input_bytes - start.input_bytes) / elapsed / 1e6,
+            "recent_input_mb_per_s": (progress.input_bytes - last.input_bytes) / recent / 1e6,
+        }
+
+        if progress.data_bytes is not None:
+            metrics["data_bytes"] = progress.data_bytes
+            metrics["data_mb_per_s"] = (progress.data_bytes - start.data_bytes) / elapsed / 1e6
+            metrics["recent_data_mb_per_s"] = (progress.data_bytes - last.data_bytes) / recent / 1e6
+
+        if progress.games is not None:
+            metrics["games_read"] = progress.games
+
+        input_size = self.game_repo.input_size()
+        done = progress.input_bytes - start.input_bytes
+
+        metrics["input_fraction"] = min(progress.input_bytes / input_size, 1.0) if input_size else None
+        metrics["eta_s"] = max(input_size - progress.input_bytes, 0) * elapsed / done if done > 0 else None
+
+        return metrics
+
+    @staticmethod
+    def __counters(watched: Any, counters: list[str]) -> dict:
+        values = {counter: getattr(watched, counter) for counter in counters}
+
+        if "hits" in values and "misses" in values:
+            lookups = values["hits"] + values["misses"]
+            values["hit_rate"] = values["hits"] / lookups if lookups else None
+
+        return values
+
+
+# Formats a record as a single line summary
+def summary(record: dict) -> str:
+    parts = [f"{record['games']} games", f"{record['recent_games_per_s']:.0f} games/s"]
+
+    if "input_bytes" in record:
+        parts.append(f"input {record['recent_input_mb_per_s']:.1f} MB/s")
+
+    if "data_bytes" in record:
+        parts.append(f"data {record['recent_data_mb_per_s']:.1f} MB/s")
+
+    if record.get("input_fraction") is not None:
+        parts.append(f"{record['input_fraction']:.1%} read")
+
+    if record.get("eta_s") is not None:
+        eta = int(record["eta_s"])
+        parts.append(f"ETA {eta // 3600}:{eta // 60 % 60:02d}:{eta % 60:02d}")
+
+    if record["rss_mb"] is not None:
+        parts.append(f"RSS {record['rss_mb']:.0f} MiB")
+
+    phases = sorted(record["phases"].items(), key=lambda item: -item[1]["seconds"])
+    if phases:
+        parts.append("time " + ", ".join(f"{name} {p['share']:.0%}" for name, p in phases) + f", other {record['other_share']:.0%}")
+
+    return f"[ {record['stage']}: {', '.join(parts)} ]"
@@ -1,6 +1,8 @@
 import pyparser
 
+import chess
 import chess.pgn
+import numpy as np
 import re
 
 from collections import namedtuple
@@ -19,23 +21,156 @@ Player = namedtuple("Player", ["name", "rating"])
 TimeControl = namedtuple("TimeControl", ["base_m", "increment_s"])
 Opening = namedtuple("Opening", ["name", "eco"])
 
+# Move related defines
+# - move: chess.Move (python-chess games) or SAN string (custom parser games)
+# - clock: remaining time of the player who made the move [s], or None
+# - eval: evaluation after the move from White's point of view [cp], or None
+MainlineMove = namedtuple("MainlineMove", ["move", "clock", "eval"])
+
+# Evaluation of mate in n moves is encoded as +-(MATE_SCORE - n)
+MATE_SCORE = pyparser.MATE_SCORE
+
+# Marks missing values in clock and eval arrays
+MISSING = pyparser.MISSING
+
+# Typed header fields of custom parser games (see pyparser.Parser.set_schema), they are converted to Python objects all at once
+# - Malformed values (like '?' ratings) are None, accessors then fall back to the raw header
+HEADER_SCHEMA = [
+    ("White", "str"), ("WhiteElo", "int"), ("Black", "str"), ("BlackElo", "int"),
+    ("TimeControl", "time_control"), ("Event", "tempo"), ("Result", "enum"), ("Termination", "enum")
+]
+FIELD_WHITE, FIELD_WHITE_ELO, FIELD_BLACK, FIELD_BLACK_ELO, FIELD_TIME_CONTROL, FIELD_TEMPO, FIELD_RESULT, FIELD_TERMINATION = range(len(HEADER_SCHEMA))
+
+
+# ----------------
+# Helper functions
+# ----------------
+
+# Returns the tempo encoded in Event header, for example 'rapid' for 'Rated Rapid game'
+def tempo(event: str) -> str:
+    parts = event.split()
+    return " ".join(parts[1:-1]).lower()
+
+
+# -------------
+# Game snapshot
+# -------------
+
+# A header line of PGN data, like [White "DrNykterstein"]
+HEADER_PATTERN = re.compile(r'^\[(\w+)\s+(.*)\][ \t\r]*$', re.MULTILINE)
+
+
+# A copy of the current game of a parser, which stays valid after the parser moves on (see Game.snapshot)
+# - Provides the same interface as the parser, so Game works with it just like with the parser itself
+# - Only the PGN data is copied, headers are parsed from it in Python right away
+# - Main line is parsed on the first request, by a temporary parser of the copied data
+class GameSnapshot:
+    __slots__ = ("pgn_data", "headers", "evals_flag", "clocks_flag", "mainline")
+
+    def __init__(self, parser: pyparser.Parser):
+        self.pgn_data = bytes(parser.all_data_view())
+        self.evals_flag = parser.has_evals()
+        self.clocks_flag = parser.has_clocks()
+        self.mainline = None
+
+        # Headers end with the first empty line (data may start with whitespace left after the previous game)
+        data = self.pgn_data.lstrip()
+        header_end = data.find(b"\n\n")
+        header_text = data[:header_end if header_end >= 0 else len(data)].decode("utf-8", errors="replace")
+
+        # Just like in the parser, quotes are removed from values and the last header wins if there are more of them with the same name
+        self.headers = {name: value.replace('"', "") for name, value in HEADER_PATTERN.findall(header_text)}
+
+    # Parser interface
+    def header(self, h_name: str) -> str:
+        return self.headers.get(h_name, "")
+
+    def all_data(self) -> str:
+        return self.pgn_data.decode("utf-8", errors="replace")
+
+    def all_data_view(self, strip: bool = False) -> memoryview:
+        return memoryview(self.pgn_data.strip() if strip else self.pgn_data)
+
+    def has_evals(self) -> bool:
+        return self.evals_flag
+
+    def has_clocks(self) -> bool:
+        return self.clocks_flag
+
+    # Typed fields are not projected, Game copies the ones it has already got from the parser
+    def fields(self) -> None:
+        return None
+
+    def moves(self) -> list[str]:
+        return list(self.__mainline()[0])
+
+    def clocks(self) -> np.ndarray:
+        return self.__mainline()[1].copy()
+
+    def evals(self) -> np.ndarray:
+        return self.__mainline()[2].copy()
+
+    def replay(self) -> pyparser.Replay:
+        return pyparser.replay(self.moves(), self.header("FEN"))
+
+    def __mainline(self) -> tuple[list[str], np.ndarray, np.ndarray]:
+        if self.mainline is None:
+            parser = pyparser.Parser(self.pgn_data)
+            parser.parse_next()
+
+            self.mainline = (parser.moves(), parser.clocks(), parser.evals())
+
+        return self.mainline
+
 
 # ----------
 # Game class
 # ----------
 
+# Lichess game URL, from which the game ID is taken
+SITE_PATTERN = re.compile(r"https://lichess\.org/([a-zA-Z0-9]+)")
+
 # An adapter class Parser class
 # - Customized specifically for processing lichess games
 # - Works with either custom implementation of PGN parser or python-chess objects
+# - The backend is picked once, each header is fetched at most once and derived values (players, time control, result) are cached,
+#   so calling accessors several times per game costs just a lookup
+# - With a header schema set on the parser (see HEADER_SCHEMA), players, time control, tempo, result and termination come from
+#   its typed fields, fetched by a single call
+# - Games of the custom parser are views of the parser's current game - use snapshot() to keep a game after the reader moves on
 class Game():
+    __slots__ = ("data", "__python", "__header_value", "__headers", "__fields", "__players", "__time_control", "__result")
 
-    def __init__(self, game_data: pyparser.Parser | chess.pgn.Game):
+    def __init__(self, game_data: pyparser.Parser | chess.pgn.Game | GameSnapshot):
         self.data = game_data
 
+        self.__python = isinstance(game_data, chess.pgn.Game)
+        self.__header_value = game_data.headers.__getitem__ if self.__python else game_data.header
+        self.__headers = {}
+        self.__fields = None
+
+        self.__players = None
+        self.__time_control = None
+        self.__result = None
+
+    # Returns a copy of the game which does not depend on the parser anymore (python-chess games are returned as they are)
+    # - Already derived values are copied as well
+    def snapshot(self) -> "Game":
+        if self.__python or isinstance(self.data, GameSnapshot):
+            return self
+
+        game = Game(GameSnapshot(self.data))
+        game.__fields = self.__fields
+        game.__players = self.__players
+        game.__time_control = self.__time_control
+        game.__result = self.__result
+
+        return game
+
     # Returns an unique game ID from lichess site
     # - Allows to use lichess API to get more details about the game
     def id(self) -> str:
-        match = re.search(r"https://lichess\.org/([a-zA-Z0-9]+)", self.__header("Site"))
+        match = SITE_PATTERN.search(self.__header("Site"))
         return match.group(1)
     
     def timestamp(self) -> datetime:
@@ -46,16 +181,27 @@ class Game():
 
     # Returns the tempo of the game, that is 'bullet', 'blitz', 'rapid', etc.
     def tempo(self) -> str:
-        parts = self.__header("Event").split()
-        return " ".join(parts[1:-1]).lower()
+        value = self.__field(FIELD_TEMPO)
+
+        # Only ASCII is lowercased by the parser
+        return value if value is not None and value.isascii() else tempo(self.__header("Event"))
     
     # Returns exact time control of the game
     def time_control(self) -> TimeControl:
-        parts = self.__header("TimeControl").split('+')
-        return TimeControl(int(parts[0]) // 60, int(parts[1]))
+        if self.__time_control is None:
+            value = self.__field(FIELD_TIME_CONTROL)
+
+            if value is not None:
+                self.__time_control = TimeControl(value[0] // 60, value[1])
+            else:
+                parts = self.__header("TimeControl").split('+')
+                self.__time_control = TimeControl(int(parts[0]) // 60, int(parts[1]))
+
+        return self.__time_control
 
     def termination(self) -> str:
-        return self.__header("Termination")
+        value = self.__field(FIELD_TERMINATION)
+        return value if value is not None else self.__header("Termination")
     
     # Returns an encoded opening variation (for example: 'B32' for Sicilian Defense: Accelerated Dragon)
     def opening(self) -> str:
@@ -63,26 +209,98 @@ class Game():
     
     # Returns 1 for a white win, -1 for a black win, and 0 for a draw
     def result(self) -> int:
-        if self.__header("Result") == "1-0":
-            return 1
-        elif self.__header("Result") == "0-1":
-            return -1
-        else:
-            return 0
+        if self.__result is None:
+            result = self.__field(FIELD_RESULT)
+            if result is None:
+                result = self.__header("Result")
+
+            self.__result = 1 if result == "1-0" else -1 if result == "0-1" else 0
+
+        return self.__result
     
     # Returns data for player playing with given side
     def player(self, white: bool = True) -> Player:
-        player_nickname = self.__header("White") if white else self.__header("Black")
-        player_rating = int(self.__header("WhiteElo")) if white else int(self.__header("BlackElo"))
-        return Player(player_nickname, player_rating)
+        return self.__both_players()[0 if white else 1]
     
     # Returns a list of both players participating in a game
     def players(self) -> list[Player]:
-        return [self.player(white=True), self.player(white=False)]
+        return list(self.__both_players())
+
+    # Returns the starting position of the game
+    def board(self) -> chess.Board:
+        if self.__python:
+            return self.data.board()
+        
+        fen = self.__header("FEN")
+        return chess.Board(fen) if fen else chess.Board()
+
+    # Returns all moves from the main line
+    # - chess.Move objects for python-chess games, SAN strings for custom parser games
+    def moves(self) -> list[chess.Move | str]:
+        if self.__python:
+            return list(self.data.mainline_moves())
+        
+        return self.data.moves()
+    
+    # Returns remaining time of the player after each move [s], MISSING if there is no annotation
+    def clocks(self) -> np.ndarray:
+        if self.__python:
+            clocks = [node.clock() for node in self.data.mainline()]
+            return np.array([MISSING if clock is None else int(clock) for clock in clocks], dtype=np.int32)
+        
+        return self.data.clocks()
     
-    # A helper function to unify both cases of underlying game_data
+    # Returns evaluation after each move from White's point of view [cp], MISSING if there is no annotation
+    def evals(self) -> np.ndarray:
+        if self.__python:
+            evals = [node.eval() for node in self.data.mainline()]
+            return np.array([MISSING if eval is None else eval.white().score(mate_score=MATE_SCORE) for eval in evals], dtype=np.int32)
+        
+        return self.data.evals()
+
+    # Replays the main line natively, giving zobrist hashes, book moves and material balance of each ply (see pyparser.Replay)
+    # - python-chess moves are replayed in UCI notation
+    def replay(self) -> pyparser.Replay:
+        if self.__python:
+            board = self.data.board()
+            return pyparser.replay([move.uci() for move in self.data.mainline_moves()], board.fen())
+
+        return self.data.replay()
+
+    # Returns all moves from the main line, together with clock and eval annotations
+    def mainline(self) -> list[MainlineMove]:
+        clocks = [None if clock == MISSING else clock for clock in self.clocks().tolist()]
+        evals = [None if eval == MISSING else eval for eval in self.evals().tolist()]
+
+        return list(map(MainlineMove, self.moves(), clocks, evals))
+
+    # Both players (white, black), with ratings converted once
+    def __both_players(self) -> tuple[Player, Player]:
+        if self.__players is None:
+            self.__players = (self.__player(FIELD_WHITE, FIELD_WHITE_ELO, "White"), self.__player(FIELD_BLACK, FIELD_BLACK_ELO, "Black"))
+
+        return self.__players
+
+    def __player(self, name_field: int, rating_field: int, side: str) -> Player:
+        name, rating = self.__field(name_field), self.__field(rating_field)
+
+        return Player(
+            name if name is not None else self.__header(side),
+            rating if rating is not None else int(self.__header(side + "Elo"))
+        )
+
+    # Returns a typed field of the parser schema, or None if it's not available (then the value is derived from the header)
+    def __field(self, index: int) -> Any:
+        if self.__fields is None:
+            self.__fields = (not self.__python and self.data.fields()) or ()
+
+        return self.__fields[index] if self.__fields else None
+    
+    # A helper function to unify both cases of underlying game_data, each header is fetched only once
     def __header(self, key: str) -> Any:
-        if isinstance(self.data, chess.pgn.Game):
-            return self.data.headers[key]
-        else:
-            return self.data.header(key)
\ No newline at end of file
+        value = self.__headers.get(key)
+
+        if value is None:
+            value = self.__headers[key] = self.__header_value(key)
+
+        return value
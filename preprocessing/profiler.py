@@ -0,0 +1,215 @@
+from . import index
+from . import instrument
+from . import pgn
+from . import reader
+from . import search
+
+import json
+import numpy as np
+
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import partial
+
+
+# --------------
+# Helper defines
+# --------------
+
+# Header fields read by the profiler
+PROFILE_FIELDS = ["Event", "TimeControl", "WhiteElo", "BlackElo", "Termination", "White", "Black"]
+
+# Rating histograms have bins of RATING_BIN points from 0 to RATING_BIN * RATING_BINS (higher ratings fall into the last one),
+# games without a rating are counted in an extra bin at the end
+RATING_BIN = 50
+RATING_BINS = 80
+
+# Tempo names by index.TEMPOS codes, "other" for anything else
+TEMPO_NAMES = index.TEMPOS + ["other"]
+
+# Player counts of recent batches are summed up once they hold at least this many entries (or as many as all players so far)
+PENDING_PLAYERS = 1 << 20
+
+PROFILE_VERSION = 1
+
+
+# Sums counts of equal keys, returns sorted distinct keys and their counts
+def sum_counts(keys: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    keys, inverse = np.unique(keys, return_inverse=True)
+    return keys, np.bincount(inverse, weights=counts, minlength=len(keys)).astype(np.int64)
+
+
+# ------------
+# Dump profile
+# ------------
+
+# Aggregates of a whole dump, used to choose selection criteria (time controls, rating ranges...) without reading the dump again
+# - Categorical counters are keyed by plain values, time controls and coverage by (tempo, ...) tuples
+# - Time control of games without one (like correspondence games) is (None, None)
+# - Profiles of consecutive parts of a dump are merged by merge(), games per player are known only after finish()
+# - Players are counted by 64-bit keys of their names (see search.player_key) in NumPy arrays, so no names are kept
+#   and only integers are sent back by workers of parallel reader
+@dataclass
+class DumpProfile:
+    games: int = 0
+
+    time_controls: Counter = field(default_factory=Counter)     # (tempo, base [s], increment [s]) - games
+    ratings: np.ndarray = field(default_factory=lambda: np.zeros((2, RATING_BINS + 1), dtype=np.int64))     # White's and Black's histogram
+    terminations: Counter = field(default_factory=Counter)      # Termination header - games
+    coverage: Counter = field(default_factory=Counter)          # (tempo, has evals, has clocks) - games
+
+    player_keys: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.uint64))     # Sorted keys of players, until finish()
+    player_counts: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))    # Games of each of them
+    pending_players: list = field(default_factory=list)         # (keys, counts) of recent batches, not summed yet
+    games_per_player: Counter = field(default_factory=Counter)  # Number of games - number of players, after finish()
+
+    # Adds all games of a batch of PROFILE_FIELDS headers (see reader.Batch)
+    # - Every aggregate is counted over integer codes with NumPy, only distinct keys of the batch are touched in Python
+    def add_batch(self, batch: reader.Batch, count_players: bool = True):
+        events, event_values = batch["Event"]
+        terminations, termination_values = batch["Termination"]
+
+        tempo_codes = np.array([index.TEMPOS.index(tempo) if (tempo := pgn.tempo(event)) in index.TEMPOS else len(index.TEMPOS)
+                                for event in event_values], dtype=np.int64)
+        tempos = tempo_codes[events]
+
+        self.games += len(tempos)
+
+        # Time control x tempo
+        keys, counts = np.unique(np.stack([tempos, batch["TimeControl"][:, 0], batch["TimeControl"][:, 1]], axis=1), axis=0, return_counts=True)
+        for (tempo, base, increment), count in zip(keys.tolist(), counts.tolist()):
+            self.time_controls[(TEMPO_NAMES[tempo], *((None, None) if base == pgn.MISSING else (base, increment)))] += count
+
+        # Rating histograms
+        for side, column in enumerate(["WhiteElo", "BlackElo"]):
+            ratings = batch[column]
+            bins = np.where(ratings == pgn.MISSING, RATING_BINS, np.clip(ratings // RATING_BIN, 0, RATING_BINS - 1))
+            self.ratings[side] += np.bincount(bins, minlength=RATING_BINS + 1)
+
+        # Terminations
+        for termination, count in zip(termination_values, np.bincount(terminations, minlength=len(termination_values)).tolist()):
+            if count > 0:
+                self.terminations[termination] += count
+
+        # Eval and clock coverage by tempo
+        codes = tempos * 4 + batch["has_evals"].astype(np.int64) * 2 + batch["has_clocks"].astype(np.int64)
+        for code, count in enumerate(np.bincount(codes, minlength=4 * len(TEMPO_NAMES)).tolist()):
+            if count > 0:
+                self.coverage[(TEMPO_NAMES[code // 4], bool(code & 2), bool(code & 1))] += count
+
+        # Games of each player
+        if count_players:
+            for column in ["White", "Black"]:
+                codes, names = batch[column]
+                keys = np.fromiter((search.player_key(name) for name in names), dtype=np.uint64, count=len(names))
+                self.pending_players.append((keys, np.bincount(codes, minlength=len(names))))
+
+            if sum(len(keys) for keys, _ in self.pending_players) >= max(len(self.player_keys), PENDING_PLAYERS):
+                self.compact()
+
+    # Sums up games of players counted by recent batches
+    def compact(self):
+        if self.pending_players:
+            keys, counts = zip(*self.pending_players)
+            self.player_keys, self.player_counts = sum_counts(np.concatenate([self.player_keys, *keys]),
+                                                              np.concatenate([self.player_counts, *counts]))
+            self.pending_players = []
+
+    # Merges profiles of two parts of a dump (in any order, it's commutative)
+    def merge(self, other: "DumpProfile") -> "DumpProfile":
+        self.compact()
+        other.compact()
+
+        player_keys, player_counts = sum_counts(np.concatenate([self.player_keys, other.player_keys]),
+                                                np.concatenate([self.player_counts, other.player_counts]))
+
+        return DumpProfile(
+            games=self.games + other.games,
+            time_controls=self.time_controls + other.time_controls,
+            ratings=self.ratings + other.ratings,
+            terminations=self.terminations + other.terminations,
+            coverage=self.coverage + other.coverage,
+            player_keys=player_keys,
+            player_counts=player_counts,
+            games_per_player=self.games_per_player + other.games_per_player
+        )
+
+    # Turns games of each player into the distribution of games per player, once the whole dump is profiled
+    def finish(self) -> "DumpProfile":
+        self.compact()
+
+        games, players = np.unique(self.player_counts, return_counts=True)
+        self.games_per_player = Counter(dict(zip(games.tolist(), players.tolist())))
+        self.player_keys, self.player_counts = self.player_keys[:0], self.player_counts[:0]
+
+        return self
+
+    # Saves the profile as JSON (games of each player are not saved, only their distribution)
+    def save(self, output_file: str):
+        data = {
+            "version": PROFILE_VERSION,
+            "games": self.games,
+            "time_controls": [[*key, count] for key, count in self.time_controls.most_common()],
+            "ratings": {"bin": RATING_BIN, "white": self.ratings[0].tolist(), "black": self.ratings[1].tolist()},
+            "terminations": dict(self.terminations.most_common()),
+            "coverage": [[*key, count] for key, count in sorted(self.coverage.items())],
+            "games_per_player": {str(games): players for games, players in sorted(self.games_per_player.items())},
+        }
+
+        with open(output_file, "w", encoding="utf-8") as file:
+            json.dump(data, file, indent=1)
+
+    @staticmethod
+    def load(input_file: str) -> "DumpProfile":
+        with open(input_file, "r", encoding="utf-8") as file:
+            data = json.load(file)
+
+        if data["version"] != PROFILE_VERSION or data["ratings"]["bin"] != RATING_BIN:
+            raise ValueError(f"{input_file} is a profile of another version, profile the dump again")
+
+        return DumpProfile(
+            games=data["games"],
+            time_controls=Counter({tuple(row[:-1]): row[-1] for row in data["time_controls"]}),
+            ratings=np.array([data["ratings"]["white"], data["ratings"]["black"]], dtype=np.int64),
+            terminations=Counter(data["terminations"]),
+            coverage=Counter({tuple(row[:-1]): row[-1] for row in data["coverage"]}),
+            games_per_player=Counter({int(games): players for games, players in data["games_per_player"].items()})
+        )
+
+    # Number of distinct players (after finish())
+    def no_players(self) -> int:
+        return sum(self.games_per_player.values())
+
+
+# ---------
+# Profiling
+# ---------
+
+# Profiles games of a reader with the batch interface, usable as a mapper of parallel reader
+# - With a monitor, games are counted by batches
+def profile_games(game_repo: reader.GameReader, count_players: bool = True, batch_size: int = 1 << 14,
+                  monitor: instrument.Monitor | None = None) -> DumpProfile:
+    profile = DumpProfile()
+
+    for batch in game_repo.batches(PROFILE_FIELDS, batch_size):
+        profile.add_batch(batch, count_players)
+
+        if monitor is not None:
+            monitor.tick(len(batch["has_evals"]))
+
+    profile.compact()
+
+    return profile
+
+
+# Profiles a whole dump in a single pass
+# - With parallel reader, work units are profiled by workers and their profiles are merged
+# - Monitor is used only by sequential processing (progress of parallel reader is still tracked)
+def profile_dump(game_repo: reader.GameReader | reader.ParallelReader, count_players: bool = True,
+                 monitor: instrument.Monitor | None = None) -> DumpProfile:
+    if isinstance(game_repo, reader.ParallelReader):
+        profile = game_repo.map_reduce(partial(profile_games, count_players=count_players), DumpProfile.merge)
+    else:
+        profile = profile_games(game_repo, count_players, monitor=monitor)
+
+    return profile.finish()
@@ -1,13 +1,53 @@
 from . import pgn
+from . import sink
 
 import pyparser
 
 import io
+import os
 import chess.pgn
 import zstandard as zstd
 
 from abc import ABC, abstractmethod
-from typing import Any, override
+from collections import namedtuple
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from typing import Any, Callable, Iterator, TypeVar, override
+
+
+# --------------
+# Helper defines
+# --------------
+
+# Zstd format magic numbers
+ZSTD_FRAME_MAGIC = 0xFD2FB528
+ZSTD_SKIPPABLE_MAGIC = 0x184D2A50       # Lower 4 bits can be anything
+
+# Every Lichess game starts with this tag
+GAME_START = b"[Event "
+
+# A contiguous range of compressed bytes [start, end) made of complete zstd frames
+WorkUnit = namedtuple("WorkUnit", ["index", "start", "end"])
+
+# A position of a quick reader right after the last game it returned, from which reading can be resumed
+# - (frame_offset, frame_start, offset) is the stream position (see Parser.position), games and matched count all games read and returned until then
+ReaderPosition = namedtuple("ReaderPosition", ["frame_offset", "frame_start", "offset", "games", "matched"])
+START_POSITION = ReaderPosition(0, 0, 0, 0, 0)
+
+# Progress of a reader - bytes read from the input file (compressed ones for .zst files, including data read ahead), bytes of PGN data
+# and number of games read until the last returned game (None if the reader does not know them)
+ReaderProgress = namedtuple("ReaderProgress", ["input_bytes", "data_bytes", "games"])
+
+# Header batch - columns returned by Parser.parse_batch() (NumPy arrays or (codes, values) pairs)
+Batch = dict[str, Any]
+
+# A declarative game filter pushed down into the C++ parser - games that do not match never reach Python
+# - Each entry (name, *args) registers Parser.filter_<name>(*args), for example:
+#   [("contains", "Event", "rapid", False, True), ("range", "TimeControl", 600, 659), ("has_evals",)]
+GameFilter = list[tuple]
+
+T = TypeVar("T")
 
 
 # ---------------------
@@ -17,6 +57,10 @@ from typing import Any, override
 # Game reader provides a generator-like interface for reading and parsing games from PGN notation
 # - Abstract base class for other readers
 class GameReader(ABC):
+    verbose = True      # Log start and end of reading
+    monitor = None      # Times reading of games, if set (see instrument.Monitor.attach)
+    snapshots = False   # Yield games detached from the parser, which can be kept after reading on (see pgn.Game.snapshot)
+
     def __init__(self, input_file: str, max_games: int = 10):
         self.input_file = input_file
         self.max_games = max_games
@@ -27,23 +71,37 @@ class GameReader(ABC):
         # Initialize key variables
         self._initialize()
 
-        print(f"Reading {self.input_file} started...")
+        if self.verbose:
+            print(f"Reading {self.input_file} started...")
 
         return self
 
     # Generator interface - yielding next game (as pgn.Game adapter class)
     def __iter__(self):
+        read = self.monitor.phase("read") if self.monitor is not None else nullcontext()
+
         for _ in range(self.max_games):
-            game = self._next_game()
+            with read:
+                game = self._next_game()
 
             # Indicates end of file or some critical error
             # - In both cases, we want to end the reading
             if game is None:
-                print(f"Reading {self.input_file} finished...")
+                if self.verbose:
+                    print(f"Reading {self.input_file} finished...")
                 break
 
             # WARNING - This is very dangerous to allow all games have shared memory in form of Parser object
-            yield game
+            # - Such game is valid only until the next one is read, unless snapshots are turned on
+            yield game.snapshot() if self.snapshots else game
+
+    # Returns progress of reading, or None if the reader does not track it
+    def progress(self) -> ReaderProgress | None:
+        return None
+
+    # Returns the size of the input, in the same units as input_bytes of progress()
+    def input_size(self) -> int:
+        return os.path.getsize(self.input_file)
 
     # Abstract method 1 - initializing reader components
     @abstractmethod
@@ -75,6 +133,16 @@ class StandardReader(GameReader):
         if self.file:
             self.file.close()
 
+    # Position of the text file includes data read ahead by its buffer
+    @override
+    def progress(self):
+        if self.file is None or self.file.closed:
+            return None
+
+        position = self.file.buffer.tell()
+
+        return ReaderProgress(position, position, None)
+
 
 # --------------------------
 # Zstd game reader interface
@@ -110,28 +178,622 @@ class ZstdReader(GameReader):
 class StandardSlowReader(StandardReader):
     @override
     def _next_game(self):
-        return pgn.Game(chess.pgn.read_game(self.file))
+        game = chess.pgn.read_game(self.file)
+
+        return pgn.Game(game) if game is not None else None
 
 
 # -----------------
 # Zstd quick reader
 # -----------------
 
+# Creates the C++ parser with given filter
+# - Reader is either a file path (parsed on a background thread) or any object the parser can read from
+# - max_games limits the number of all games read from the input, including the skipped ones (and the ones before start)
+# - Reading of a file path can start at given position
+def create_parser(reader: Any, max_games: int, game_filter: GameFilter | None = None, start: ReaderPosition | None = None) -> pyparser.Parser:
+    start = start or START_POSITION
+
+    parser = pyparser.Parser(reader, start=start[:3] if start != START_POSITION else None)
+    parser.set_limit(max(max_games - start.games, 0))
+    parser.set_schema(pgn.HEADER_SCHEMA)
+
+    for name, *args in game_filter or []:
+        getattr(parser, f"filter_{name}")(*args)
+
+    return parser
+
+
+# Returns the position of a parser created by create_parser() with given start
+def parser_position(parser: pyparser.Parser, start: ReaderPosition | None = None) -> ReaderPosition:
+    start = start or START_POSITION
+    frame_offset, frame_start, offset, games = parser.position()
+
+    return ReaderPosition(frame_offset, frame_start, offset, start.games + games, start.matched + parser.matched())
+
+
+# Returns the progress of a parser created by create_parser() with given start
+def parser_progress(parser: pyparser.Parser, start: ReaderPosition | None = None) -> ReaderProgress:
+    position = parser_position(parser, start)
+
+    return ReaderProgress(parser.bytes_read(), position.offset, position.games)
+
+
+# Yields columnar batches of headers, until the end of data or reaching parser's limit
+# - Parsing of batches is timed in the "read" phase of given monitor
+def iter_batches(parser: pyparser.Parser, batch_size: int, fields: list[str], monitor: Any = None) -> Iterator[Batch]:
+    read = monitor.phase("read") if monitor is not None else nullcontext()
+
+    while True:
+        with read:
+            batch = parser.parse_batch(batch_size, fields)
+
+        if len(batch["has_evals"]) == 0:
+            break
+
+        yield batch
+
+
 # zstd-based reader, using efficient custom PGN parser written in C++
+# - Besides the game-by-game interface, it allows to read headers in columnar batches
+# - The file is decompressed and parsed natively, ahead of the Python loop, on a background thread of the parser
+# - Reading can start at a position returned by position() of another reader of the same file (see resume.Checkpoint)
 class ZstdQuickReader(ZstdReader):
-    def __init__(self, input_file, max_games = 10):
+    def __init__(self, input_file, max_games = 10, game_filter: GameFilter | None = None, start: ReaderPosition | None = None):
         super().__init__(input_file, max_games)
 
+        self.game_filter = game_filter
+        self.start = start
         self.parser = None
     
     @override
     def _initialize(self):
-        super()._initialize()
+        self.parser = create_parser(self.input_file, self.max_games, self.game_filter, self.start)
 
-        self.parser = pyparser.Parser(self.reader)
+    # Returns the position right after the last returned game (in batch mode, the last game of the last batch)
+    def position(self) -> ReaderPosition:
+        return parser_position(self.parser, self.start)
+
+    @override
+    def progress(self):
+        return parser_progress(self.parser, self.start)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.parser:
+            self.parser.close()
     
     @override
     def _next_game(self):
         success = self.parser.parse_next()
 
         return pgn.Game(self.parser) if success else None
+
+    # Batch interface - yielding header columns of next (up to) batch_size games
+    def batches(self, fields: list[str], batch_size: int = 4096) -> Iterator[Batch]:
+        yield from iter_batches(self.parser, batch_size, fields, self.monitor)
+
+        if self.verbose:
+            print(f"Reading {self.input_file} finished...")
+
+
+
+# ---------------------
+# Standard quick reader
+# ---------------------
+
+# Standard reader, using efficient custom PGN parser written in C++
+# - Can be limited to a single work unit (a byte range starting at game boundary)
+# - A whole file is read and parsed ahead of the Python loop, on a background thread of the parser
+#   (and it can start at a position returned by position() of another reader of the same file)
+class StandardQuickReader(StandardReader):
+    def __init__(self, input_file: str, max_games: int = 10, game_filter: GameFilter | None = None, unit: WorkUnit | None = None,
+                 start: ReaderPosition | None = None):
+        super().__init__(input_file, max_games)
+
+        if unit is not None and start is not None:
+            raise ValueError("Work unit reader can not start at a position")
+
+        self.game_filter = game_filter
+        self.unit = unit
+        self.start = start
+        self.parser = None
+
+        # Work unit readers are used by worker processes, so they do not log anything
+        if unit is not None:
+            self.verbose = False
+
+    @override
+    def _initialize(self):
+        if self.unit is None:
+            self.parser = create_parser(self.input_file, self.max_games, self.game_filter, self.start)
+            return
+
+        self.file = open(self.input_file, "rb")     # Parser works on raw bytes
+        self.parser = create_parser(FileSlice(self.file, self.unit.start, self.unit.end), self.max_games, self.game_filter)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.parser:
+            self.parser.close()
+
+        super().__exit__(exc_type, exc_val, exc_tb)
+
+    @override
+    def _next_game(self):
+        success = self.parser.parse_next()
+
+        return pgn.Game(self.parser) if success else None
+
+    def batches(self, fields: list[str], batch_size: int = 4096) -> Iterator[Batch]:
+        return iter_batches(self.parser, batch_size, fields, self.monitor)
+
+    # Returns the position right after the last returned game (in batch mode, the last game of the last batch)
+    def position(self) -> ReaderPosition:
+        return parser_position(self.parser, self.start)
+
+    # Whole file readers only, a work unit reader reads a slice of the file through Python
+    @override
+    def progress(self):
+        return parser_progress(self.parser, self.start) if self.unit is None else None
+
+
+# -------------------
+# Zstd frame scanning
+# -------------------
+
+# Lists all frames of a .zst file as (offset, size) pairs in compressed bytes
+# - Only frame and block headers are read, so this takes seconds even for a whole monthly dump
+# - Skippable frames (e.g. seek tables) are skipped
+def scan_frames(input_file: str) -> list[tuple[int, int]]:
+    frames = []
+
+    with open(input_file, "rb") as file:
+        file_size = os.fstat(file.fileno()).st_size
+        offset = 0
+
+        while offset < file_size:
+            file.seek(offset)
+            magic = int.from_bytes(file.read(4), "little")
+
+            if magic & 0xFFFFFFF0 == ZSTD_SKIPPABLE_MAGIC:
+                offset += 8 + int.from_bytes(file.read(4), "little")
+                continue
+            if magic != ZSTD_FRAME_MAGIC:
+                raise ValueError(f"{input_file}: invalid zstd frame at byte {offset}")
+
+            # Frame header - its size depends on the descriptor flags
+            descriptor = file.read(1)[0]
+            fcs_flag = descriptor >> 6
+            single_segment = (descriptor >> 5) & 1
+            has_checksum = (descriptor >> 2) & 1
+            dict_id_size = [0, 1, 2, 4][descriptor & 3]
+            fcs_size = [single_segment, 2, 4, 8][fcs_flag]
+
+            position = offset + 5 + (1 - single_segment) + dict_id_size + fcs_size
+
+            # Blocks - each one starts with 3-byte header (last block flag, block type, block size)
+            while True:
+                file.seek(position)
+                block_header = int.from_bytes(file.read(3), "little")
+                block_type = (block_header >> 1) & 3
+                block_size = block_header >> 3
+
+                position += 3 + (1 if block_type == 1 else block_size)     # RLE blocks store a single byte
+
+                if block_header & 1:
+                    break
+
+            position += 4 * has_checksum
+            frames.append((offset, position - offset))
+            offset = position
+
+    return frames
+
+
+# Groups consecutive frames into work units of (at least) given compressed size
+# - A single-frame file (like the original Lichess dumps) results in a single work unit, use reframe() first
+def split_work_units(input_file: str, unit_size: int = 1 << 28) -> list[WorkUnit]:
+    units = []
+    start = None
+
+    for offset, size in scan_frames(input_file):
+        if start is None:
+            start = offset
+
+        if offset + size - start >= unit_size:
+            units.append(WorkUnit(len(units), start, offset + size))
+            start = None
+
+    if start is not None:
+        units.append(WorkUnit(len(units), start, offset + size))
+
+    return units
+
+
+# Rewrites a .zst file as a sequence of independent frames, each one ending at a game boundary
+# - One sequential pass, after which the file can be processed by ZstdParallelReader
+def reframe(input_file: str, output_file: str, frame_size: int = 1 << 26) -> int:
+    cctx = zstd.ZstdCompressor()
+    no_frames = 0
+    pending = bytearray()
+
+    with open(input_file, "rb") as file, open(output_file, "wb") as output:
+        reader = zstd.ZstdDecompressor().stream_reader(file, read_across_frames=True)
+
+        while chunk := reader.read(1 << 20):
+            pending += chunk
+
+            if len(pending) < frame_size:
+                continue
+
+            # Cut at the last game start, leaving the unfinished game for the next frame
+            cut = pending.rfind(b"\n" + GAME_START) + 1
+            if cut > 0:
+                output.write(cctx.compress(pending[:cut]))
+                del pending[:cut]
+                no_frames += 1
+
+        if pending:
+            output.write(cctx.compress(pending))
+            no_frames += 1
+
+    return no_frames
+
+
+# Splits a standard PGN file into shards of (approximately) equal size, each one starting at a game boundary
+def split_text_shards(input_file: str, n_shards: int) -> list[WorkUnit]:
+    boundaries = [0]
+
+    with open(input_file, "rb") as file:
+        file_size = os.fstat(file.fileno()).st_size
+
+        for k in range(1, n_shards):
+            # Find the first game start after the approximate boundary
+            # - Windows overlap by one byte less than the marker, so a marker across their border is still found
+            position = max(k * file_size // n_shards, boundaries[-1])
+            file.seek(position)
+            data = file.read(1 << 16)
+
+            while (idx := data.find(b"\n" + GAME_START)) == -1 and len(data) == 1 << 16:
+                position += len(data) - (len(b"\n" + GAME_START) - 1)
+                file.seek(position)
+                data = file.read(1 << 16)
+
+            # No game starts after the boundary (it's inside the last game)
+            if idx == -1:
+                break
+
+            boundaries.append(position + idx + 1)
+
+        boundaries.append(file_size)
+
+    boundaries = sorted(set(boundaries))
+
+    return [WorkUnit(i, start, end) for i, (start, end) in enumerate(zip(boundaries, boundaries[1:]))]
+
+
+# ---------------------
+# Work unit data stream
+# ---------------------
+
+# A limited view of a binary file, used as a zstd source for a range of frames
+class FileSlice(io.RawIOBase):
+    def __init__(self, file: io.BufferedReader, start: int, end: int | None = None):
+        self.file = file
+        self.position = start
+        self.end = end
+
+    @override
+    def readable(self) -> bool:
+        return True
+
+    @override
+    def readinto(self, buffer) -> int:
+        size = len(buffer) if self.end is None else min(len(buffer), self.end - self.position)
+        if size <= 0:
+            return 0
+
+        self.file.seek(self.position)
+        n = self.file.readinto(memoryview(buffer)[:size])
+        self.position += n
+
+        return n
+
+
+# A file-like object serving decompressed data of all games owned by a single work unit
+# - A game starts with [Event tag placed at the beginning of a line or at the work unit boundary
+# - A work unit owns every game which starts inside it's decompressed data
+# - Data starts at the first game start (skipping the remainder of the game owned by the previous unit)
+# - Data ends at the first game start after the unit, which may require decompressing some of the next frames
+class ZstdChunkStream:
+    def __init__(self, input_file: str, unit: WorkUnit):
+        self.file = open(input_file, "rb")
+        self.unit = unit
+
+        self.dctx = zstd.ZstdDecompressor()
+        self.reader = self.dctx.stream_reader(FileSlice(self.file, unit.start, unit.end), read_across_frames=True)
+        self.own_size = None        # Decompressed size of the unit, known once all it's frames are read
+
+        # Positions are relative to the beginning of decompressed unit data
+        self.window = b""           # Already decompressed data which still has to be searched for game starts
+        self.window_start = 0
+        self.before = b""           # A byte preceding the window (if any)
+
+        self.pending = b""          # Data ready to be served
+        self.in_head = True
+        self.finished = False
+
+    def read(self, size: int = -1) -> bytes:
+        size = size if size >= 0 else 1 << 20
+
+        while len(self.pending) < size and not self.finished:
+            if self.in_head:
+                self.__read_head(size)
+            else:
+                self.__read_body(size)
+
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    def close(self) -> None:
+        self.reader.close()
+        self.file.close()
+
+    # Reads next piece of decompressed data, continuing with the frames after the unit once it's exhausted
+    def __fetch(self, size: int) -> bytes:
+        chunk = self.reader.read(size)
+
+        if not chunk and self.own_size is None:
+            self.own_size = self.window_start + len(self.window)
+
+            self.reader.close()
+            self.reader = self.dctx.stream_reader(FileSlice(self.file, self.unit.end), read_across_frames=True)
+            chunk = self.reader.read(size)
+
+        return chunk
+
+    # Finds the first game start at position >= lo, which can be fully seen inside the window
+    def __find_start(self, lo: int) -> int | None:
+        data = self.before + self.window
+        offset = self.window_start - len(self.before)
+        starts = []
+
+        # Work unit boundaries
+        for boundary in (0, self.own_size):
+            if boundary is not None and boundary >= max(lo, self.window_start):
+                i = boundary - offset
+                if data[i:i + len(GAME_START)] == GAME_START:
+                    starts.append(boundary)
+
+        # Line starts
+        i = data.find(b"\n" + GAME_START, max(0, lo - 1 - offset))
+        if i != -1:
+            starts.append(offset + i + 1)
+
+        return min(starts, default=None)
+
+    # Moves the beginning of the window to given position
+    def __advance_window(self, position: int) -> None:
+        cut = position - self.window_start
+        if cut <= 0:
+            return
+
+        self.before = self.window[cut - 1:cut]
+        self.window = self.window[cut:]
+        self.window_start = position
+
+    # Skips everything before the first game start inside the unit
+    def __read_head(self, size: int) -> None:
+        chunk = self.__fetch(size)
+        self.window += chunk
+
+        start = self.__find_start(0)
+
+        if start is not None:
+            if self.own_size is not None and start >= self.own_size:
+                # No game starts inside this unit - it's all owned by previous one
+                self.finished = True
+            else:
+                self.__advance_window(start)
+                self.in_head = False
+        elif not chunk or (self.own_size is not None and self.window_start + len(self.window) >= self.own_size + len(GAME_START)):
+            self.finished = True
+        else:
+            # Keep a few bytes in case the game start is split between reads
+            self.__advance_window(self.window_start + len(self.window) - len(GAME_START))
+
+    # Serves the data up to the first game start after the unit
+    def __read_body(self, size: int) -> None:
+        chunk = self.__fetch(size)
+        self.window += chunk
+
+        if self.own_size is None:
+            # Still inside the unit - everything belongs to us
+            self.pending += self.window
+            self.__advance_window(self.window_start + len(self.window))
+            return
+
+        end = self.__find_start(self.own_size)
+
+        if end is not None:
+            self.pending += self.window[:end - self.window_start]
+            self.finished = True
+        elif not chunk:
+            # End of file - the last game belongs to us entirely
+            self.pending += self.window
+            self.finished = True
+        else:
+            keep_from = max(self.window_start, self.window_start + len(self.window) - len(GAME_START))
+            self.pending += self.window[:keep_from - self.window_start]
+            self.__advance_window(keep_from)
+
+
+# ---------------------
+# Zstd work unit reader
+# ---------------------
+
+# zstd-based reader of a single work unit, using the custom PGN parser
+# - Used by worker processes, so it does not log anything
+class ZstdChunkReader(GameReader):
+    verbose = False
+
+    def __init__(self, input_file: str, unit: WorkUnit, max_games: int = 10, game_filter: GameFilter | None = None):
+        super().__init__(input_file, max_games)
+
+        self.unit = unit
+        self.game_filter = game_filter
+        self.stream = None
+        self.parser = None
+
+    @override
+    def _initialize(self):
+        self.stream = ZstdChunkStream(self.input_file, self.unit)
+        self.parser = create_parser(self.stream, self.max_games, self.game_filter)
+
+    @override
+    def _next_game(self):
+        success = self.parser.parse_next()
+
+        return pgn.Game(self.parser) if success else None
+
+    def batches(self, fields: list[str], batch_size: int = 4096) -> Iterator[Batch]:
+        return iter_batches(self.parser, batch_size, fields)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.stream:
+            self.stream.close()
+
+
+# ---------------
+# Parallel reader
+# ---------------
+
+# Runs a mapper over a single work unit - executed in a worker process
+def _map_unit(args: tuple[GameReader, Callable]) -> Any:
+    unit_reader, mapper = args
+
+    with unit_reader as game_repo:
+        return mapper(game_repo)
+
+
+# Parallel reader interface - splits the input file into work units and processes them in a process pool
+# - Each worker runs its own C++ parser over it's unit and returns a partial result
+# - Partial results are returned in file order, so even order-sensitive merging stays deterministic
+# - NOTE: max_games limit is applied to each work unit separately
+class ParallelReader(ABC):
+    def __init__(self, input_file: str, max_games: int = 10, n_workers: int | None = None, game_filter: GameFilter | None = None):
+        self.input_file = input_file
+        self.max_games = max_games
+        self.game_filter = game_filter
+        self.n_workers = n_workers or os.cpu_count()
+
+        self.units = []
+        self.executor = None
+
+        self.done_bytes = 0     # Input bytes of work units with returned results (workers themselves are not monitored)
+
+    def __enter__(self):
+        self.units = self._split()
+        self.executor = ProcessPoolExecutor(max_workers=self.n_workers)
+
+        print(f"Reading {self.input_file} started ({len(self.units)} units, {self.n_workers} workers)...")
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.executor:
+            self.executor.shutdown(cancel_futures=True)
+
+    # Applies the mapper (which takes a GameReader) to every work unit, yielding partial results in file order
+    # - Mapper has to be picklable, that is a module-level function or a functools.partial of one
+    def map(self, mapper: Callable[[GameReader], T]) -> Iterator[T]:
+        results = self.executor.map(_map_unit, [(self._unit_reader(unit), mapper) for unit in self.units])
+
+        for unit, result in zip(self.units, results):
+            self.done_bytes += unit.end - unit.start
+            yield result
+
+        print(f"Reading {self.input_file} finished...")
+
+    # Applies the mapper to every work unit and merges partial results (in file order) with the reducer
+    def map_reduce(self, mapper: Callable[[GameReader], T], reducer: Callable[[T, T], T]) -> T:
+        return reduce(reducer, self.map(mapper))
+
+    # Progress is counted in whole work units, as their results come back
+    def progress(self) -> ReaderProgress:
+        return ReaderProgress(self.done_bytes, None, None)
+
+    def input_size(self) -> int:
+        return sum(unit.end - unit.start for unit in self.units)
+
+    # Abstract method 1 - splitting the input file into work units
+    @abstractmethod
+    def _split(self) -> list[WorkUnit]:
+        pass
+
+    # Abstract method 2 - creating (not yet opened) reader of a single work unit
+    @abstractmethod
+    def _unit_reader(self, unit: WorkUnit) -> GameReader:
+        pass
+
+
+# Parallel reader of multi-frame .zst files
+class ZstdParallelReader(ParallelReader):
+    def __init__(self, input_file: str, max_games: int = 10, n_workers: int | None = None, unit_size: int = 1 << 28,
+                 game_filter: GameFilter | None = None):
+        super().__init__(input_file, max_games, n_workers, game_filter)
+
+        self.unit_size = unit_size
+
+    @override
+    def _split(self):
+        units = split_work_units(self.input_file, self.unit_size)
+
+        if len(units) == 1:
+            print(f"[ WARNING: {self.input_file} has a single work unit, use reader.reframe() to process it in parallel ]")
+
+        return units
+
+    @override
+    def _unit_reader(self, unit):
+        return ZstdChunkReader(self.input_file, unit, max_games=self.max_games, game_filter=self.game_filter)
+
+
+# Parallel reader of standard PGN files, split into (approximately) equal shards at game boundaries
+class StandardParallelReader(ParallelReader):
+    def __init__(self, input_file: str, max_games: int = 10, n_workers: int | None = None, n_shards: int | None = None,
+                 game_filter: GameFilter | None = None):
+        super().__init__(input_file, max_games, n_workers, game_filter)
+
+        self.n_shards = n_shards or self.n_workers
+
+    @override
+    def _split(self):
+        return split_text_shards(self.input_file, self.n_shards)
+
+    @override
+    def _unit_reader(self, unit):
+        return StandardQuickReader(self.input_file, max_games=self.max_games, game_filter=self.game_filter, unit=unit)
+
+
+# Parallel reader of an output split into shards (see sink.ShardedSink), each shard is a single work unit
+# - Shards can be either standard PGN files or .zst files
+class ShardedParallelReader(ParallelReader):
+    def __init__(self, input_file: str, max_games: int = 10, n_workers: int | None = None, game_filter: GameFilter | None = None):
+        super().__init__(input_file, max_games, n_workers, game_filter)
+
+        self.shards = sink.shard_files(input_file)
+
+    @override
+    def _split(self):
+        return [WorkUnit(i, 0, os.path.getsize(shard)) for i, shard in enumerate(self.shards)]
+
+    @override
+    def _unit_reader(self, unit):
+        shard = self.shards[unit.index]
+        unit_reader = ZstdQuickReader if shard.endswith(".zst") else StandardQuickReader
+
+        # Shard readers are used by worker processes, so they do not log anything
+        game_repo = unit_reader(shard, max_games=self.max_games, game_filter=self.game_filter)
+        game_repo.verbose = False
+
+        return game_repo
@@ -0,0 +1,74 @@
+from . import index
+from . import reader
+
+import os
+import pickle
+import time
+
+from typing import Any
+
+
+# ----------
+# Checkpoint
+# ----------
+
+# Periodic snapshots of a long scan, from which it can be resumed after a crash or an interruption
+# - A snapshot holds the reader position (see reader.ReaderPosition) and the state of the caller (anything picklable)
+# - It's written into a temporary file, which then replaces the previous snapshot, so a crash while saving keeps the previous one
+# - Snapshots are taken at most once per interval - checking that costs a single clock read, so the overhead stays negligible
+# - A snapshot is bound to the version of the input file and to a key of the task (for example stage name and its parameters),
+#   it's ignored if any of them changes
+class Checkpoint:
+    def __init__(self, checkpoint_filepath: str, input_file: str, key: Any, interval: float = 60.0, resume: bool = False):
+        self.checkpoint_filepath = checkpoint_filepath
+        self.source = (input_file, index.source_stamp(input_file), key)
+        self.interval = interval
+
+        # Restored snapshot (if any)
+        self.position: reader.ReaderPosition | None = None
+        self.state: Any = None
+
+        if resume:
+            self.__load()
+
+        self.last_save = time.monotonic()
+        self.saves = 0
+
+    # Returns True if it's time for the next snapshot
+    def due(self) -> bool:
+        return time.monotonic() - self.last_save >= self.interval
+
+    def save(self, position: reader.ReaderPosition, state: Any):
+        temporary_filepath = self.checkpoint_filepath + ".tmp"
+
+        with open(temporary_filepath, "wb") as file:
+            pickle.dump((self.source, tuple(position), state), file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temporary_filepath, self.checkpoint_filepath)
+
+        self.last_save = time.monotonic()
+        self.saves += 1
+
+    # Removes the snapshot, once the task is finished
+    def clear(self):
+        if os.path.exists(self.checkpoint_filepath):
+            os.remove(self.checkpoint_filepath)
+
+    def __load(self):
+        if not os.path.exists(self.checkpoint_filepath):
+            print(f"[ No checkpoint found in {self.checkpoint_filepath}, starting from the beginning ]")
+            return
+
+        with open(self.checkpoint_filepath, "rb") as file:
+            source, position, state = pickle.load(file)
+
+        if source != self.source:
+            print(f"[ WARNING: Checkpoint {self.checkpoint_filepath} belongs to a different input or task, starting from the beginning ]")
+            return
+
+        self.position = reader.ReaderPosition(*position)
+        self.state = state
+
+        print(f"[ Resuming from {self.checkpoint_filepath}: {self.position.games} games already read ]")
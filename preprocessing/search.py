@@ -1,10 +1,19 @@
+from . import index
+from . import instrument
 from . import pgn
 from . import reader
+from . import resume
+from . import sink
 
+import array
+import hashlib
+import numpy as np
 import random
+import tempfile
 
-from collections import defaultdict
-from typing import Callable, List, Tuple
+from functools import partial
+from itertools import chain
+from typing import Callable, Iterator, List, Tuple
 
 
 # -----------------------------------------
@@ -15,82 +24,511 @@ def is_std_rapid_10_minutes_with_eval(game: pgn.Game) -> bool:
     return game.tempo() == "rapid" and game.time_control().base_m == 10 and "forfeit" not in game.termination() and game.data.has_evals()
 
 
+# ---------------------------------------------
+# Helper functions - batch search game criteria
+# ---------------------------------------------
+
+# Header fields read by batch criteria and batch player search
+BATCH_FIELDS = ["Event", "TimeControl", "Termination", "White", "Black", "WhiteElo", "BlackElo"]
+
+
+# Vectorized version of is_std_rapid_10_minutes_with_eval, working on a batch of headers
+# - Dictionary-encoded columns are tested once per distinct value
+def is_std_rapid_10_minutes_with_eval_batch(batch: reader.Batch) -> np.ndarray:
+    events, event_values = batch["Event"]
+    terminations, termination_values = batch["Termination"]
+
+    is_rapid = np.array([pgn.tempo(event) == "rapid" for event in event_values], dtype=bool)
+    is_forfeit = np.array(["forfeit" in termination for termination in termination_values], dtype=bool)
+
+    return is_rapid[events] & (batch["TimeControl"][:, 0] // 60 == 10) & ~is_forfeit[terminations] & batch["has_evals"]
+
+
+# Index version of is_std_rapid_10_minutes_with_eval, selecting games of the whole dump at once
+def is_std_rapid_10_minutes_with_eval_index(game_index: index.GameIndex) -> np.ndarray:
+    flags = game_index["flags"]
+
+    return (
+        (game_index["tempo"] == index.TEMPOS.index("rapid")) & (game_index["base"] // 60 == 10) &
+        (flags & index.FLAG_FORFEIT == 0) & (flags & index.FLAG_EVALS != 0)
+    )
+
+
+# ------------------------------
+# Search game filters (pushdown)
+# ------------------------------
+
+# Parser-side equivalent of is_std_rapid_10_minutes_with_eval
+# - It's a superset of the predicate (Event only has to contain "rapid" in any case, not as its tempo), so the predicate
+#   should still be applied in Python
+STD_RAPID_10_MINUTES_WITH_EVAL_FILTER: reader.GameFilter = [
+    ("contains", "Event", "rapid", False, True),
+    ("range", "TimeControl", 600, 659),         # base_m == 10
+    ("contains", "Termination", "forfeit", True),
+    ("has_evals",),
+]
+
+
+# -----------------------
+# Parallel search mappers
+# -----------------------
+
+# Yields players of each game, or None if the game does not meet given criterion
+# - With batch criterion (and a reader supporting batches), games are read and tested in columnar batches
+def iter_matches(game_repo: reader.GameReader,
+                 game_criterion: Callable[[pgn.Game], bool],
+                 batch_criterion: Callable[[reader.Batch], np.ndarray] | None = None) -> Iterator[list[pgn.Player] | None]:
+    if batch_criterion is None or not hasattr(game_repo, "batches"):
+        for game in game_repo:
+            yield game.players() if game_criterion(game) else None
+        return
+
+    for batch in game_repo.batches(BATCH_FIELDS):
+        whites, white_names = batch["White"]
+        blacks, black_names = batch["Black"]
+        white_codes, black_codes = whites.tolist(), blacks.tolist()
+        white_ratings, black_ratings = batch["WhiteElo"].tolist(), batch["BlackElo"].tolist()
+
+        for i, match in enumerate(batch_criterion(batch).tolist()):
+            if match:
+                yield [pgn.Player(white_names[white_codes[i]], white_ratings[i]), pgn.Player(black_names[black_codes[i]], black_ratings[i])]
+            else:
+                yield None
+
+
+# Collects players of all games that meet given criterion (in file order)
+def collect_players(game_repo: reader.GameReader,
+                    game_criterion: Callable[[pgn.Game], bool],
+                    batch_criterion: Callable[[reader.Batch], np.ndarray] | None = None) -> list[list[pgn.Player]]:
+    return [players for players in iter_matches(game_repo, game_criterion, batch_criterion) if players is not None]
+
+
+# Yields players and PGN data of all games that meet given criterion and were played by any of given players (or by anyone, if None)
+# - PGN data (without surrounding whitespace) is a view of the parser storage, not a copy - it stays valid after the next game is read
+def iter_games(game_repo: reader.GameReader,
+               game_criterion: Callable[[pgn.Game], bool],
+               player_names: set[str] | None) -> Iterator[tuple[list[pgn.Player], memoryview]]:
+    for game in game_repo:
+        if not game_criterion(game):
+            continue
+
+        players = game.players()
+
+        if player_names is None or any(player.name in player_names for player in players):
+            yield players, game.data.all_data_view(strip=True)
+
+
+# Index version of iter_games() - only the data of selected games is decompressed
+def iter_indexed_games(game_index: index.GameIndex,
+                       index_criterion: Callable[[index.GameIndex], np.ndarray],
+                       player_names: set[str]) -> Iterator[tuple[list[pgn.Player], bytes]]:
+    return game_index.iter_games(index_criterion(game_index) & game_index.played_by(player_names))
+
+
+# A list version of iter_games(), usable as a mapper
+def collect_games(game_repo: reader.GameReader,
+                  game_criterion: Callable[[pgn.Game], bool],
+                  player_names: set[str] | None) -> list[tuple[list[pgn.Player], bytes]]:
+    return [(players, bytes(game_data)) for players, game_data in iter_games(game_repo, game_criterion, player_names)]
+
+
+# --------------
+# Player counter
+# --------------
+
+# Game counts are saturated at this value (it's the maximum of uint16), min_games of PlayerCounter has to be below it
+MAX_COUNT = np.iinfo(np.uint16).max
+
+
+# Returns a 64-bit key of a player name
+# - Unlike hash(), it's the same in every process, so a counter restored from a checkpoint still works
+def player_key(name: str) -> int:
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "little")
+
+
+# A memory-bounded replacement of a {name: number_of_games} dictionary
+# - Names are hashed to 64-bit keys, players get sequential IDs in the order of their first games
+# - IDs are found in an open-addressing table of uint32 (linear probing, load factor below 1/2), keys and game counts (uint16)
+#   are stored in arrays indexed by IDs
+# - Names are kept only for candidates (players with at least min_games), no other player can ever be selected
+#   - They are stored one after another as UTF-8, each candidate has a number pointing to its name
+# - Uses ~25-50 bytes per player (plus names of candidates), instead of ~150 bytes of a dictionary with str keys and int values
+class PlayerCounter:
+    def __init__(self, min_games: int, capacity: int = 1 << 16):
+        # A saturated count has to stay above min_games, so reaching min_games is reported only once
+        if not 1 <= min_games < MAX_COUNT:
+            raise ValueError(f"min_games has to be between 1 and {MAX_COUNT - 1}")
+
+        self.min_games = min_games
+
+        self.__size = 0
+        self.__names = bytearray()                          # Names of candidates
+        self.__name_offsets = array.array("Q", [0])         # Name of candidate i is __names[__name_offsets[i]:__name_offsets[i + 1]]
+        self.__allocate(np.zeros(capacity, dtype=np.uint32), *self.__player_arrays(capacity // 2))
+
+    def __len__(self) -> int:
+        return self.__size
+
+    # Number of players with at least min_games
+    def candidates(self) -> int:
+        return len(self.__name_offsets) - 1
+
+    # Counts a game of a player, returns their ID and the number of their games so far
+    def add(self, name: str) -> tuple[int, int]:
+        key = player_key(name)
+        table, keys, mask = self.__table_view, self.__key_view, self.__mask
+
+        # Table holds IDs + 1, 0 marks empty slots
+        slot = key & mask
+        while (id := table[slot] - 1) >= 0 and keys[id] != key:
+            slot = (slot + 1) & mask
+
+        if id < 0:
+            id = self.__insert(slot, key)
+            count = 1
+        else:
+            count = self.__count_view[id]
+            if count == MAX_COUNT:
+                return id, count
+
+            count += 1
+            self.__count_view[id] = count
+
+        if count == self.min_games:
+            self.__add_candidate(id, name)
+
+        return id, count
+
+    # Returns ID of a player, or -1 if they have not played any game
+    def find(self, name: str) -> int:
+        key = player_key(name)
+        table, keys, mask = self.__table_view, self.__key_view, self.__mask
+
+        slot = key & mask
+        while (id := table[slot] - 1) >= 0 and keys[id] != key:
+            slot = (slot + 1) & mask
+
+        return id
+
+    # Yields names of all players in random order (given by random.shuffle), None stands for players with less than min_games
+    # - The order is the same as the order of shuffled list of all players, ordered by their first games (like dictionary items)
+    def shuffled_names(self) -> Iterator[str | None]:
+        ids = array.array("I", range(self.__size))
+        random.shuffle(ids)
+
+        names, offsets, candidates = self.__names, self.__name_offsets, self.__candidate_view
+        for id in ids:
+            candidate = candidates[id]
+            yield names[offsets[candidate - 1]:offsets[candidate]].decode() if candidate > 0 else None
+
+    # Total size of the counter in bytes
+    def nbytes(self) -> int:
+        players = self.__table.nbytes + self.__keys.nbytes + self.__counts.nbytes + self.__candidates.nbytes
+
+        return players + len(self.__names) + self.__name_offsets.itemsize * len(self.__name_offsets)
+
+    # Arrays are pickled without their memoryviews
+    def __getstate__(self) -> dict:
+        return {
+            "min_games": self.min_games, "size": self.__size, "names": self.__names, "name_offsets": self.__name_offsets,
+            "table": self.__table, "keys": self.__keys, "counts": self.__counts, "candidates": self.__candidates
+        }
+
+    def __setstate__(self, state: dict):
+        self.min_games, self.__size, self.__names, self.__name_offsets = state["min_games"], state["size"], state["names"], state["name_offsets"]
+        self.__allocate(state["table"], state["keys"], state["counts"], state["candidates"])
+
+    # Adds a new player into given (empty) slot, returns their ID
+    def __insert(self, slot: int, key: int) -> int:
+        id = self.__size
+
+        self.__table_view[slot] = id + 1
+        self.__key_view[id] = key
+        self.__count_view[id] = 1
+        self.__size += 1
+
+        if 2 * self.__size >= len(self.__table):
+            self.__grow()
+
+        return id
+
+    def __add_candidate(self, id: int, name: str):
+        self.__names += name.encode()
+        self.__name_offsets.append(len(self.__names))
+        self.__candidate_view[id] = len(self.__name_offsets) - 1
+
+    # Doubles the capacity, all players are reinserted at once
+    # - In each round, every free slot is taken by the first of the players aiming at it, the others move to the next slot
+    def __grow(self):
+        capacity, size = 2 * len(self.__table), self.__size
+        keys, counts, candidates = self.__player_arrays(capacity // 2)
+
+        keys[:size] = self.__keys[:size]
+        counts[:size] = self.__counts[:size]
+        candidates[:size] = self.__candidates[:size]
+
+        # Previous arrays are released before reinsertion
+        self.__allocate(np.zeros(capacity, dtype=np.uint32), keys, counts, candidates)
+        table = self.__table
+
+        pending = np.arange(size, dtype=np.uint32)
+        slots = (keys[:size] & np.uint64(capacity - 1)).astype(np.uint32)
+
+        while len(pending) > 0:
+            taken, first = np.unique(slots, return_index=True)
+            free = table[taken] == 0
+            table[taken[free]] = pending[first[free]] + 1
+
+            left = np.ones(len(pending), dtype=bool)
+            left[first[free]] = False
+            pending, slots = pending[left], (slots[left] + 1) & np.uint32(capacity - 1)
+
+    # Returns empty arrays of keys, game counts and candidate numbers (0 if the player is not a candidate yet)
+    @staticmethod
+    def __player_arrays(size: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return np.zeros(size, dtype=np.uint64), np.zeros(size, dtype=np.uint16), np.zeros(size, dtype=np.uint32)
+
+    def __allocate(self, table: np.ndarray, keys: np.ndarray, counts: np.ndarray, candidates: np.ndarray):
+        self.__table, self.__keys, self.__counts, self.__candidates = table, keys, counts, candidates
+        self.__mask = len(table) - 1
+
+        # Memoryviews are much faster than NumPy arrays when accessing single items
+        self.__table_view, self.__key_view = memoryview(table), memoryview(keys)
+        self.__count_view, self.__candidate_view = memoryview(counts), memoryview(candidates)
+
+
+# ----------------
+# Player selection
+# ----------------
+
+# Selection of players (see find_players), fed with players of all games that meet the criterion, in file order
+class PlayerSelection:
+    def __init__(self, k_players: int, rating_buckets: List[Tuple[int, int, int]], min_games: int):
+        self.k_players = k_players
+        self.rating_buckets = rating_buckets
+        self.min_games = min_games
+
+        # Initialize player set and player-game counters
+        self.players = PlayerCounter(min_games)     # Player-game counters
+        self.selected_players = set()               # Player set
+
+        # Keep the count of total amount of found players, as well as separate counters for each rating bucket
+        self.found = 0
+        self.to_find = [cnt for _, _, cnt in rating_buckets]    # If a value goes to 0, then it means we found enough players for given bucket
+
+    # Counts a game of given players, returns IDs and numbers of games so far of the human ones
+    def add_game(self, game_players: list[pgn.Player]) -> list[tuple[int, int]]:
+        counts = []
+
+        for player in game_players:
+            # Only human players
+            # - NOTE: This is a dubious heuristic, but should make the job
+            if "bot" in player.name.lower():
+                continue
+
+            # Update game counters
+            id, count = self.players.add(player.name)
+            counts.append((id, count))
+
+            # If min_games has been found for the player, he become a candidate for selection
+            # - NOTE: We compare player's rating only at the last game played, which should result in more representative estimation
+            if count == self.min_games:
+                self.found += 1
+
+                rbucket_idx = next((i for i, x in enumerate(self.rating_buckets) if x[0] <= player.rating <= x[1]), -1)
+
+                if rbucket_idx != -1:
+                    self.to_find[rbucket_idx] -= 1
+                    if self.to_find[rbucket_idx] >= 0:
+                        self.selected_players.add(player.name)
+
+        return counts
+
+    # Returns True if we found enough players (and the search can end)
+    def complete(self) -> bool:
+        return self.found >= self.k_players and all(cnt <= 0 for cnt in self.to_find)
+
+    # Finishes the selection, returns names of all selected players
+    def select(self) -> set[str]:
+        # We have already selected some players within rating buckets
+        # Now it's time to select remaining players with at least min_games played
+        # - Let's randomly permutate players first (names of players with less than min_games are None)
+        for name in self.players.shuffled_names():
+            if name is not None:
+                self.selected_players.add(name)
+            
+            if len(self.selected_players) == self.k_players:
+                break
+
+        return self.selected_players
+
+
 # ------------------
 # Search for players
 # ------------------
 
 # Attempts to find a given amount of players with appropriate number of games that meet some criterion
-def find_players(game_repo: reader.GameReader, 
+def find_players(game_repo: reader.GameReader | reader.ParallelReader | index.GameIndex,
                  game_criterion: Callable[[pgn.Game], bool],
+                 batch_criterion: Callable[[reader.Batch], np.ndarray] | None = None,
+                 index_criterion: Callable[[index.GameIndex], np.ndarray] | None = None,
                  k_players: int = 1,
                  rating_buckets: List[Tuple[int, int, int]] = [],
                  min_games: int = 1,
                  verbose: bool = False,
-                 logging_frequency: int = 10000) -> list[pgn.Player]:
+                 logging_frequency: int = 10000,
+                 checkpoint: resume.Checkpoint | None = None,
+                 monitor: instrument.Monitor | None = None) -> list[pgn.Player]:
     '''
     Parameters explanation:
     - game_repo: PGN game reader
     - game_criterion: a predicate function which selects only games that meet some criteria
+    - batch_criterion: optional vectorized version of game_criterion, allows to read games in columnar batches
+    - index_criterion: version of game_criterion selecting games of a game index (required if game_repo is an index)
     - k_players: expected number of players to find
     - rating_buckets: specifies minimum amount of players for given rating ranges (rating_min, rating_max, no_players)
     - min_games: minimum amount of games that meet given criteria, played by a player
+    - checkpoint: optional periodic snapshots of the search (game_repo has to be a quick reader, started at the restored position)
+    - monitor: optional metrics collector, games are counted and player selection is timed in "select" phase
+
+    With parallel reader, games are filtered by the workers and the selection is replayed here in file order,
+    which gives exactly the same result as sequential search.
+    With game index, only the games selected by index_criterion are visited (also in file order).
     '''
 
     print("[ Search for players started ]")
 
-    # Initialize player set and player-game counters
-    players = defaultdict(lambda: 0)    # Player-game counters
-    selected_players = set()            # Player set
+    selection = PlayerSelection(k_players, rating_buckets, min_games)
+
+    # Number of games already processed (before the checkpoint)
+    processed = 0
+
+    if checkpoint is not None and checkpoint.state is not None:
+        selection, processed = checkpoint.state["selection"], checkpoint.state["processed"]
 
-    # Keep the count of total amount of found players, as well as separate counters for each rating bucket
-    found = 0
-    to_find = [cnt for _, _, cnt in rating_buckets]     # If a value goes to 0, then it means we found enough players for given bucket
+    select = instrument.phase(monitor, "select")
 
-    for id, game in enumerate(game_repo):
+    # Players of each game, or None if game does not meet required assumptions
+    if isinstance(game_repo, index.GameIndex):
+        matches = game_repo.iter_players(index_criterion(game_repo))
+    elif isinstance(game_repo, reader.ParallelReader):
+        matches = chain.from_iterable(game_repo.map(partial(collect_players, game_criterion=game_criterion, batch_criterion=batch_criterion)))
+    else:
+        matches = iter_matches(game_repo, game_criterion, batch_criterion)
+
+    for id, game_players in enumerate(matches, start=processed):
         # Check if game meets required assumptions
-        if game_criterion(game):
-            for player in game.players():
-                # Only human players
-                # - NOTE: This is a dubious heuristic, but should make the job
-                if "bot" in player.name.lower():
-                    continue
-
-                # Update game counters
-                players[player.name] += 1
-
-                # If min_games has been found for the player, he become a candidate for selection
-                # - NOTE: We compare player's rating only at the last game played, which should result in more representative estimation
-                if players[player.name] == min_games:
-                    found += 1
-
-                    rbucket_idx = next((i for i, x in enumerate(rating_buckets) if x[0] <= player.rating <= x[1]), -1)
-
-                    if rbucket_idx != -1:
-                        to_find[rbucket_idx] -= 1
-                        if to_find[rbucket_idx] >= 0:
-                            selected_players.add(player.name)
+        if game_players is not None:
+            with select:
+                selection.add_game(game_players)
+
+        if monitor is not None:
+            monitor.tick()
         
         # If we found enough players, we can end the search here
-        if found >= k_players and all(cnt <= 0 for cnt in to_find):
+        if selection.complete():
             break
 
         # Some debugging info
         if verbose and (id + 1) % logging_frequency == 0:
-            print(f"Processed {id + 1} games, found {found} players...")
-    
-    print("[ Search for players ended ]")
+            print(f"Processed {id + 1} games, found {selection.found} players...")
+
+        # Take a snapshot once the reader is right after this game (in batch mode, that's after the last game of a batch)
+        if checkpoint is not None and checkpoint.due() and (position := game_repo.position()).matched == id + 1:
+            with instrument.phase(monitor, "checkpoint"):
+                checkpoint.save(position, {"selection": selection, "processed": id + 1})
     
-    # We have already selected some players within rating buckets
-    # Now it's time to select remaining players with at least min_games played
-    # - Let's randomly permutate players first
-    players = list(players.items())
-    random.shuffle(players)
-
-    for name, no_games in players:
-        if no_games >= min_games:
-            selected_players.add(name)
-        
-        if len(selected_players) == k_players:
-            break
+    players = selection.players
+    print(f"[ Search for players ended: {len(players)} players ({players.candidates()} with at least {min_games} games) counted in {players.nbytes() / 2**20:.1f} MiB ]")
+
+    return list(selection.select())
+
+
+# ----------------------------
+# Search for players and games
+# ----------------------------
+
+# Player ID of an empty spill record entry
+NO_PLAYER = np.iinfo(np.uint32).max
+
+
+# Selects players just like find_players() and writes their games (the first min_games games of each of them that meet the criterion)
+# into output, all in a single pass over the input
+# - Output is the same as the one of find_players() followed by another pass writing games of selected players (the games stage),
+#   that is stripped PGN data of the games in file order
+# - Until the selection is finished, any game can still be needed - each game which is among the first min_games games of one of its
+#   (human) players is kept in a spill buffer, which stays in memory up to buffer_size bytes and goes to a temporary file above that
+# - With a monitor, games are counted and player selection, spilling and writing of games are timed in their phases
+# - Returns names of selected players and the number of written games
+def sample_games(game_repo: reader.GameReader | reader.ParallelReader | index.GameIndex,
+                 output: sink.GameSink,
+                 game_criterion: Callable[[pgn.Game], bool],
+                 index_criterion: Callable[[index.GameIndex], np.ndarray] | None = None,
+                 k_players: int = 1,
+                 rating_buckets: List[Tuple[int, int, int]] = [],
+                 min_games: int = 1,
+                 buffer_size: int = 1 << 30,
+                 verbose: bool = False,
+                 logging_frequency: int = 10000,
+                 monitor: instrument.Monitor | None = None) -> tuple[list[str], int]:
+    print("[ Sampling of players and games started ]")
+
+    selection = PlayerSelection(k_players, rating_buckets, min_games)
+
+    # Players and PGN data of all games that meet the criterion
+    if isinstance(game_repo, index.GameIndex):
+        games = game_repo.iter_games(index_criterion(game_repo))
+    elif isinstance(game_repo, reader.ParallelReader):
+        games = chain.from_iterable(game_repo.map(partial(collect_games, game_criterion=game_criterion, player_names=None)))
+    else:
+        games = iter_games(game_repo, game_criterion, None)
+
+    # Spilled games - data offsets and lengths in the buffer, IDs of (up to two) players who need the game
+    offsets, lengths = array.array("Q"), array.array("I")
+    first_ids, second_ids = array.array("I"), array.array("I")
+
+    select, spill = instrument.phase(monitor, "select"), instrument.phase(monitor, "spill")
+
+    with tempfile.SpooledTemporaryFile(max_size=buffer_size) as buffer:
+        buffer_end = 0
+
+        for id, (game_players, game_data) in enumerate(games):
+            with select:
+                player_ids = [player_id for player_id, count in selection.add_game(game_players) if count <= min_games]
+
+            if player_ids:
+                offsets.append(buffer_end)
+                lengths.append(len(game_data))
+                first_ids.append(player_ids[0])
+                second_ids.append(player_ids[1] if len(player_ids) > 1 else NO_PLAYER)
+
+                with spill:
+                    buffer.write(game_data)
+                    buffer_end += len(game_data)
+
+            if monitor is not None:
+                monitor.tick()
+
+            # If we found enough players, we can end the search here
+            # - All games of the selected players we need have been seen by now
+            if selection.complete():
+                break
+
+            # Some debugging info
+            if verbose and (id + 1) % logging_frequency == 0:
+                print(f"Processed {id + 1} games, found {selection.found} players, {len(offsets)} games spilled ({buffer_end / 2**20:.1f} MiB)...")
+
+        players = selection.select()
+
+        # Write spilled games of selected players, in file order
+        ids = np.array([selection.players.find(name) for name in players], dtype=np.uint32)
+        saved = np.flatnonzero(np.isin(np.frombuffer(first_ids, dtype=np.uint32), ids) | np.isin(np.frombuffer(second_ids, dtype=np.uint32), ids))
+
+        with instrument.phase(monitor, "write"):
+            for i in saved.tolist():
+                buffer.seek(offsets[i])
+                output.write(buffer.read(lengths[i]))
+
+    print(f"[ Sampling of players and games ended: {len(players)} players, {len(saved)} of {len(offsets)} spilled games written ]")
 
-    return list(selected_players)
+    return list(players), len(saved)
@@ -0,0 +1,208 @@
+import glob
+import os
+import zstandard as zstd
+
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from typing import Callable, override
+
+
+# --------------
+# Helper defines
+# --------------
+
+# Every game is followed by an empty line
+GAME_SEPARATOR = b"\n\n"
+
+# Default number of games in a single zstd frame
+FRAME_GAMES = 4096
+
+# Default size of the output buffer
+BUFFER_SIZE = 1 << 22
+
+# A position of a sink after the last written game, from which writing can be resumed
+# - offset is the size of the current shard (the only file, if not sharded), games count all written games
+SinkPosition = namedtuple("SinkPosition", ["shard", "offset", "games"])
+
+
+# Returns the file path of given shard, the index goes before the extensions (games.pgn.zst -> games-00003.pgn.zst)
+def shard_filepath(output_file: str, shard: int) -> str:
+    directory, name = os.path.split(output_file)
+    stem, dot, extensions = name.partition(".")
+
+    return os.path.join(directory, f"{stem}-{shard:05d}{dot}{extensions}")
+
+
+# Returns file paths of all existing shards of given output, in order
+def shard_files(output_file: str) -> list[str]:
+    directory, name = os.path.split(output_file)
+    stem, dot, extensions = name.partition(".")
+
+    return sorted(glob.glob(os.path.join(glob.escape(directory), glob.escape(stem) + "-" + "[0-9]" * 5 + glob.escape(dot + extensions))))
+
+
+# -------------------
+# Game sink interface
+# -------------------
+
+# Game sink writes PGN data of games (as raw bytes, straight from the parser storage) into an output file
+# - Writes go through a large buffer, so each game costs just a copy into it
+# - Writing can continue from a position returned by position() (see resume.Checkpoint), the file is cut to that position
+# - Abstract base class for other sinks
+class GameSink(ABC):
+    def __init__(self, output_file: str, start: SinkPosition | None = None, buffer_size: int = BUFFER_SIZE):
+        self.output_file = output_file
+        self.games = start.games if start is not None else 0
+
+        self.file = open(output_file, "r+b" if start is not None else "wb", buffering=buffer_size)
+
+        if start is not None:
+            self.file.truncate(start.offset)
+            self.file.seek(start.offset)
+
+    # Context menager interface
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # Writes a game (bytes or any other buffer)
+    @abstractmethod
+    def write(self, game_data: bytes | memoryview) -> None:
+        pass
+
+    # Writes out all pending data, returns the position after the last written game
+    def position(self) -> SinkPosition:
+        self._flush()
+        self.file.flush()
+
+        return SinkPosition(0, self.file.tell(), self.games)
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self._flush()
+            self.file.close()
+
+    # Writes out data kept by the sink itself (if any)
+    def _flush(self) -> None:
+        pass
+
+
+# ---------------
+# Plain text sink
+# ---------------
+
+# Writes a standard PGN file
+class PlainSink(GameSink):
+    @override
+    def write(self, game_data):
+        self.file.write(game_data)
+        self.file.write(GAME_SEPARATOR)
+        self.games += 1
+
+
+# ---------
+# Zstd sink
+# ---------
+
+# Writes a .zst file made of independent frames of frame_games games each, so it can be read in parallel (see reader.ZstdParallelReader)
+# - Every frame ends at a game boundary, a frame is cut short only when the position is taken
+class ZstdSink(GameSink):
+    def __init__(self, output_file: str, start: SinkPosition | None = None, buffer_size: int = BUFFER_SIZE, frame_games: int = FRAME_GAMES,
+                 level: int = 3):
+        super().__init__(output_file, start, buffer_size)
+
+        self.frame_games = frame_games
+        self.cctx = zstd.ZstdCompressor(level=level)
+
+        self.frame = bytearray()        # Data of the current frame
+        self.frame_count = 0            # Number of games in the current frame
+
+    @override
+    def write(self, game_data):
+        self.frame += game_data
+        self.frame += GAME_SEPARATOR
+        self.frame_count += 1
+        self.games += 1
+
+        if self.frame_count == self.frame_games:
+            self._flush()
+
+    @override
+    def _flush(self):
+        if self.frame_count > 0:
+            self.file.write(self.cctx.compress(self.frame))
+            self.frame.clear()
+            self.frame_count = 0
+
+
+# ------------
+# Sharded sink
+# ------------
+
+# Splits the output into shards of shard_games games, each one written by its own sink (created by sink_factory(file_path, start))
+# - Shard files are named by shard_filepath(), the output file itself is not written
+class ShardedSink(GameSink):
+    def __init__(self, output_file: str, shard_games: int, sink_factory: Callable[[str, SinkPosition | None], GameSink],
+                 start: SinkPosition | None = None):
+        self.output_file = output_file
+        self.shard_games = shard_games
+        self.sink_factory = sink_factory
+
+        self.shard = start.shard if start is not None else 0
+        self.games = start.games if start is not None else 0
+
+        # Shards written after the position are removed, so no stale shard is left behind
+        if start is not None:
+            for file_path in shard_files(output_file)[self.shard + 1:]:
+                os.remove(file_path)
+
+        shard_start = SinkPosition(0, start.offset, self.games - self.shard * shard_games) if start is not None else None
+        self.sink = sink_factory(shard_filepath(output_file, self.shard), shard_start)
+
+    @override
+    def write(self, game_data):
+        if self.sink.games == self.shard_games:
+            self.sink.close()
+            self.shard += 1
+            self.sink = self.sink_factory(shard_filepath(self.output_file, self.shard), None)
+
+        self.sink.write(game_data)
+        self.games += 1
+
+    @override
+    def position(self):
+        return self.sink.position()._replace(shard=self.shard, games=self.games)
+
+    @override
+    def close(self):
+        self.sink.close()
+
+
+# ------------
+# Sink factory
+# ------------
+
+# Opens a sink writing given output file - .zst files are compressed, anything else is written as plain text
+# - With shard_games, the output is split into shards (see ShardedSink)
+# - A fresh output (not resumed) replaces everything written by earlier runs, sharded or not, so the output is either the file itself
+#   or its shards and readers never mix games of different runs (see reader.ShardedParallelReader)
+def open_sink(output_file: str, frame_games: int = FRAME_GAMES, shard_games: int = 0, start: SinkPosition | None = None) -> GameSink:
+    def sink_factory(file_path: str, start: SinkPosition | None) -> GameSink:
+        if file_path.endswith(".zst"):
+            return ZstdSink(file_path, start, frame_games=frame_games)
+
+        return PlainSink(file_path, start)
+
+    if start is None:
+        for file_path in shard_files(output_file):
+            os.remove(file_path)
+
+        if shard_games > 0 and os.path.exists(output_file):
+            os.remove(output_file)
+
+    if shard_games > 0:
+        return ShardedSink(output_file, shard_games, sink_factory, start)
+
+    return sink_factory(output_file, start)
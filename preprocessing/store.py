@@ -0,0 +1,179 @@
+from . import final
+from . import index
+
+import json
+import numpy as np
+import os
+import shutil
+
+from dataclasses import fields
+
+
+# --------------
+# Helper defines
+# --------------
+
+# Columns of the store - sums of integer PlayerData fields over all ingested games (elo is derived from ratings)
+STORE_FIELDS = [f.name for f in fields(final.PlayerData) if f.type is int and f.name != "elo"]
+
+STORE_VERSION = 1
+
+
+# ------------
+# Player store
+# ------------
+
+# Aggregates of all players over all ingested monthly dumps, in columns keyed by player ID (line numbers in players.txt)
+# - Each field of STORE_FIELDS is a binary file of int64 values, memory-mapped on load (just like index.GameIndex columns), ratings
+#   from the first gpp games of each player are a (players, gpp) matrix - only the first min(no_games, gpp) values of a row are valid
+# - A month is analysed on its own (see final.analyse_dump, with the criterion of the searching stages) and merged in by ingest(),
+#   earlier months are never read again
+# - Months have to be ingested in chronological order, so elo is still taken at the gpp-th game of all of them (see PlayerData.merge)
+# - Each ingestion writes a new generation of all files and then atomically replaces meta.json, which points to it,
+#   so a crash while ingesting leaves the previous state intact
+# - Can be used as a context manager, just like game readers and index.GameIndex
+class PlayerStore:
+    def __init__(self, store_dir: str, gpp: int = 10):
+        self.store_dir = store_dir
+        self.gpp = gpp
+
+        meta_filepath = os.path.join(store_dir, "meta.json")
+
+        if os.path.exists(meta_filepath):
+            with open(meta_filepath, "r") as file:
+                self.meta = json.load(file)
+
+            if self.meta["version"] != STORE_VERSION or self.meta["gpp"] != gpp:
+                raise ValueError(f"{store_dir} is a store of another version or gpp, ingest the dumps again into a new one")
+        else:
+            self.meta = {"version": STORE_VERSION, "gpp": gpp, "generation": 0, "no_players": 0, "sources": []}
+
+        self.columns = {name: self.__load_column(name, np.int64) for name in STORE_FIELDS}
+        self.columns["ratings"] = self.__load_column("ratings", np.int32, gpp)
+
+        self.names = None       # Player names (by ID), loaded on first use
+        self.ids = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def __len__(self) -> int:
+        return self.meta["no_players"]
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    # Returns names of all players, indexed by their IDs
+    def players(self) -> list[str]:
+        if self.names is None:
+            if len(self) == 0:
+                self.names = []
+            else:
+                with open(os.path.join(self.__generation_dir(), "players.txt"), "r", encoding="utf-8") as file:
+                    self.names = file.read().split("\n")[:-1]
+
+            self.ids = {name: i for i, name in enumerate(self.names)}
+
+        return self.names
+
+    # Returns True if a dump of the same name has already been ingested
+    def contains(self, input_file: str) -> bool:
+        return any(source["file"] == os.path.basename(input_file) for source in self.meta["sources"])
+
+    # Merges players of the next monthly dump (all of them, see final.analyse_dump) into the store
+    def ingest(self, players: dict[str, final.PlayerData], input_file: str):
+        source = os.path.basename(input_file)
+
+        if self.contains(input_file):
+            raise ValueError(f"{source} has already been ingested into {self.store_dir}")
+
+        if self.meta["sources"] and source < self.meta["sources"][-1]["file"]:
+            print(f"[ WARNING: {source} is ingested after {self.meta["sources"][-1]["file"]}, months should come in chronological order ]")
+
+        # New players get the next IDs
+        names = self.players() + [name for name in players if name not in self.ids]
+        ids = {name: i for i, name in enumerate(names)}
+
+        columns = {}
+        for name, values in self.columns.items():
+            columns[name] = np.zeros((len(names), *values.shape[1:]), dtype=values.dtype)
+            columns[name][:len(values)] = values
+
+        month_ids = np.fromiter((ids[name] for name in players), dtype=np.int64, count=len(players))
+
+        # Ratings continue the first gpp games of each player (previous counts are taken before summing no_games)
+        counts = np.minimum(columns["no_games"][month_ids], self.gpp).tolist()
+
+        for id, count, data in zip(month_ids.tolist(), counts, players.values()):
+            if count < self.gpp:
+                ratings = data.ratings[:self.gpp - count]
+                columns["ratings"][id, count:count + len(ratings)] = ratings
+
+        for name in STORE_FIELDS:
+            columns[name][month_ids] += np.fromiter((getattr(data, name) for data in players.values()), dtype=np.int64, count=len(players))
+
+        no_games = sum(data.no_games for data in players.values()) // 2
+
+        self.__write(names, columns, {"file": source, "source": index.source_stamp(input_file), "no_games": no_games})
+
+        print(f"[ Ingested {source} into {self.store_dir}: {no_games} games, {len(players)} players ({len(names)} in total) ]")
+
+    # Returns PlayerData of players with at least gpp games (just like final.create_dataset over all ingested months)
+    def dataset(self) -> dict[str, final.PlayerData]:
+        names = self.players()
+        selected = np.flatnonzero(self["no_games"] >= self.gpp)
+
+        values = {name: self[name][selected].tolist() for name in STORE_FIELDS}
+        ratings = self["ratings"][selected, :].tolist()
+
+        dataset = {}
+        for i, id in enumerate(selected.tolist()):
+            data = final.PlayerData(name=names[id], ratings=ratings[i], **{name: values[name][i] for name in STORE_FIELDS})
+            data.elo = data.ratings[self.gpp - 1]
+            dataset[data.name] = data
+
+        return dataset
+
+    # Writes the next generation of the store, the previous one is removed only after meta.json points to the new one
+    def __write(self, names: list[str], columns: dict[str, np.ndarray], source: dict):
+        previous_dir = self.__generation_dir()
+        meta = dict(self.meta, generation=self.meta["generation"] + 1, no_players=len(names), sources=self.meta["sources"] + [source])
+
+        generation_dir = self.__generation_dir(meta["generation"])
+        os.makedirs(generation_dir, exist_ok=True)
+
+        for name, values in columns.items():
+            values.tofile(os.path.join(generation_dir, f"{name}.bin"))
+
+        with open(os.path.join(generation_dir, "players.txt"), "w", encoding="utf-8") as file:
+            for name in names:
+                file.write(name + "\n")
+
+        temporary_filepath = os.path.join(self.store_dir, "meta.json.tmp")
+
+        with open(temporary_filepath, "w") as file:
+            json.dump(meta, file)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temporary_filepath, os.path.join(self.store_dir, "meta.json"))
+
+        # Files of the previous generation are still mapped until the columns are reloaded
+        self.meta = meta
+        self.columns = {name: self.__load_column(name, values.dtype, *values.shape[1:]) for name, values in columns.items()}
+        self.names = names
+        self.ids = {name: i for i, name in enumerate(names)}
+
+        shutil.rmtree(previous_dir, ignore_errors=True)
+
+    def __generation_dir(self, generation: int | None = None) -> str:
+        return os.path.join(self.store_dir, f"generation-{self.meta["generation"] if generation is None else generation}")
+
+    def __load_column(self, name: str, dtype: type, *shape: int) -> np.ndarray:
+        if len(self) == 0:
+            return np.zeros((0, *shape), dtype=dtype)
+
+        return np.memmap(os.path.join(self.__generation_dir(), f"{name}.bin"), dtype=dtype, mode="r", shape=(len(self), *shape))
@@ -1,8 +1,9 @@
 from . import pgn
-from . import reader
+from . import profiler
 
 import chess
 import matplotlib.pyplot as plt
+import numpy as np
 
 from collections import defaultdict
 
@@ -19,34 +20,17 @@ def game_info(game: pgn.Game) -> None:
     print(f"Players: {game.player(chess.WHITE).name} {game.data.header("Result")} {game.player(chess.BLACK).name}")
 
 
-# -------------------------
-# Time control distribution
-# -------------------------
+# --------------------------
+# Dump profile distributions
+# --------------------------
 
-# Plots the histogram of time control distribution among given batch of games
-# - Number of analyzed games is determined by one of GameReader's parameter
+# Plots the most common time controls of a dump profile (see profiler.DumpProfile)
 # - Helps to decide for what time control to collect data
-def time_control_distribution(game_repo: reader.GameReader) -> None:
-    time_controls = [
-        ("blitz", pgn.TimeControl(3, 0)),
-        ("blitz", pgn.TimeControl(3, 2)),
-        ("blitz", pgn.TimeControl(5, 3)),
-        ("rapid", pgn.TimeControl(10, 0)),
-        ("rapid", pgn.TimeControl(10, 5)),
-        ("rapid", pgn.TimeControl(15, 10)),
-    ]
-
-    games_found = defaultdict(lambda: 0)
-
-    for game in game_repo:
-        for time_control in time_controls:
-            tempo, time = time_control
-
-            if game.tempo() == tempo and game.time_control() == time:
-                games_found[f"{tempo} {time[0]}+{time[1]}"] += 1
-    
-    labels = sorted(list(games_found.keys()))
-    counts = [games_found[label] for label in labels]
+def time_control_distribution(profile: profiler.DumpProfile, top: int = 20) -> None:
+    time_controls = [(key, count) for key, count in profile.time_controls.most_common() if key[1] is not None][:top]
+
+    labels = [f"{tempo} {base // 60}+{increment}" if base % 60 == 0 else f"{tempo} {base}s+{increment}" for (tempo, base, increment), _ in time_controls]
+    counts = [count for _, count in time_controls]
 
     # Plot histogram
     plt.figure(figsize=(10, 6))
@@ -56,4 +40,83 @@ def time_control_distribution(game_repo: reader.GameReader) -> None:
     plt.title('Distribution of chess game control times')
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.show()
\ No newline at end of file
+    plt.show()
+
+
+# Plots rating histograms of both sides, games without a rating are left out
+# - Helps to set rating ranges of selected players
+def rating_distribution(profile: profiler.DumpProfile) -> None:
+    bins = np.arange(profiler.RATING_BINS) * profiler.RATING_BIN
+
+    plt.figure(figsize=(10, 6))
+    plt.step(bins, profile.ratings[0, :-1], where='post', label='White')
+    plt.step(bins, profile.ratings[1, :-1], where='post', label='Black')
+    plt.xlabel('Rating')
+    plt.ylabel('Number of games')
+    plt.title(f'Distribution of ratings (missing: {profile.ratings[0, -1]} White, {profile.ratings[1, -1]} Black)')
+    plt.legend()
+    plt.tight_layout()
+    plt.show()
+
+
+# Plots counts of termination types
+def termination_distribution(profile: profiler.DumpProfile) -> None:
+    labels, counts = zip(*profile.terminations.most_common()) if profile.terminations else ((), ())
+
+    plt.figure(figsize=(10, 6))
+    plt.bar([label or "(none)" for label in labels], counts, color='skyblue')
+    plt.xlabel('Termination')
+    plt.ylabel('Number of games')
+    plt.title('Distribution of game terminations')
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.show()
+
+
+# Plots the share of games with eval and clock annotations for each tempo
+def annotation_coverage(profile: profiler.DumpProfile) -> None:
+    games, evals, clocks = defaultdict(lambda: 0), defaultdict(lambda: 0), defaultdict(lambda: 0)
+
+    for (tempo, has_evals, has_clocks), count in profile.coverage.items():
+        games[tempo] += count
+        evals[tempo] += count if has_evals else 0
+        clocks[tempo] += count if has_clocks else 0
+
+    tempos = [tempo for tempo in profiler.TEMPO_NAMES if games[tempo] > 0]
+    positions = np.arange(len(tempos))
+
+    plt.figure(figsize=(10, 6))
+    plt.bar(positions - 0.2, [evals[tempo] / games[tempo] for tempo in tempos], width=0.4, label='Evals')
+    plt.bar(positions + 0.2, [clocks[tempo] / games[tempo] for tempo in tempos], width=0.4, label='Clocks')
+    plt.xticks(positions, tempos)
+    plt.xlabel('Tempo')
+    plt.ylabel('Share of games')
+    plt.title('Coverage of eval and clock annotations')
+    plt.legend()
+    plt.tight_layout()
+    plt.show()
+
+
+# Plots the distribution of games per player on log-log axes
+# - Helps to set the target number of games per player
+def games_per_player_distribution(profile: profiler.DumpProfile) -> None:
+    games, players = zip(*sorted(profile.games_per_player.items())) if profile.games_per_player else ((), ())
+
+    plt.figure(figsize=(10, 6))
+    plt.scatter(games, players, s=8)
+    plt.xscale('log')
+    plt.yscale('log')
+    plt.xlabel('Games played')
+    plt.ylabel('Number of players')
+    plt.title(f'Distribution of games per player ({profile.no_players()} players)')
+    plt.tight_layout()
+    plt.show()
+
+
+# Draws all plots of a dump profile
+def plot_profile(profile: profiler.DumpProfile) -> None:
+    time_control_distribution(profile)
+    rating_distribution(profile)
+    termination_distribution(profile)
+    annotation_coverage(profile)
+    games_per_player_distribution(profile)
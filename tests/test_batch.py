@@ -0,0 +1,92 @@
+import io
+
+import numpy as np
+import pytest
+
+pyparser = pytest.importorskip("pyparser")
+
+
+# --------------
+# Helper defines
+# --------------
+
+MISSING = pyparser.MISSING
+
+
+# Returns PGN data of games with given headers (values are bytes, so they do not have to be valid UTF-8)
+def pgn_data(games: list[dict[str, bytes]]) -> bytes:
+    return b"".join(b"".join(b'[%s "%s"]\n' % (name.encode(), value) for name, value in headers.items()) + b"\n1. e4 e5 *\n\n"
+                    for headers in games)
+
+
+# Returns all batches of given games (the empty one at the end of data is not included)
+def parse_batches(games: list[dict[str, bytes]], fields: list[str], n: int = 1000) -> list[dict]:
+    parser = pyparser.Parser(io.BytesIO(pgn_data(games)))
+    batches = []
+
+    while len((batch := parser.parse_batch(n, fields))["has_evals"]) > 0:
+        batches.append(batch)
+
+    return batches
+
+
+# Returns values of a dictionary-encoded column, game by game
+def decoded(column: tuple[np.ndarray, list[str]]) -> list[str]:
+    codes, values = column
+    return [values[code] for code in codes.tolist()]
+
+
+# -----
+# Tests
+# -----
+
+# Ratings are integers, missing or malformed ones are MISSING (trailing characters are ignored)
+def test_int_columns():
+    values = [b"1500", b"", b"abc", b"-", b"+12", b"-7", b"99999999999", b"2100?"]
+    games = [{"Event": b"Rated Rapid game", "WhiteElo": value, "WhiteRatingDiff": value} for value in values] + [{"Event": b"Rated Rapid game"}]
+
+    [batch] = parse_batches(games, ["WhiteElo", "WhiteRatingDiff", "BlackElo"])
+    expected = [1500, MISSING, MISSING, MISSING, 12, -7, MISSING, 2100, MISSING]
+
+    assert batch["WhiteElo"].dtype == np.int32
+    assert batch["WhiteElo"].tolist() == batch["WhiteRatingDiff"].tolist() == expected
+    assert batch["BlackElo"].tolist() == [MISSING] * len(games)
+
+
+# Time controls are (base, increment) pairs, MISSING for "-" of correspondence games and anything malformed
+def test_time_control_column():
+    values = [b"600+0", b"180+2", b"-", b"", b"600", b"x+1"]
+    [batch] = parse_batches([{"TimeControl": value} for value in values], ["TimeControl"])
+
+    assert batch["TimeControl"].shape == (len(values), 2)
+    assert batch["TimeControl"].tolist() == [[600, 0], [180, 2], [MISSING, MISSING], [MISSING, MISSING], [MISSING, MISSING], [MISSING, MISSING]]
+
+
+# Strings are dictionary-encoded by each batch, in order of first appearance
+def test_string_columns():
+    names = [b"alice", b"bob", b"alice", b"carol", b"bob", b"alice"]
+    batches = parse_batches([{"White": name, "Termination": b"Normal"} for name in names], ["White", "Termination"], n=4)
+
+    assert [len(batch["has_evals"]) for batch in batches] == [4, 2]
+    assert batches[0]["White"][0].tolist() == [0, 1, 0, 2]
+    assert batches[0]["White"][1] == ["alice", "bob", "carol"]
+    assert batches[1]["White"][1] == ["bob", "alice"]
+    assert [decoded(batch["Termination"]) for batch in batches] == [["Normal"] * 4, ["Normal"] * 2]
+
+
+# Invalid UTF-8 is replaced just like bytes.decode(errors="replace") does, instead of failing the whole batch
+def test_invalid_utf8():
+    names = [b"caf\xc3\xa9", b"caf\xe9", b"\xff\xfe", b"ok"]
+    [batch] = parse_batches([{"White": name} for name in names], ["White"])
+
+    assert decoded(batch["White"]) == [name.decode("utf-8", errors="replace") for name in names]
+
+
+# Offsets and lengths point to game data without surrounding whitespace
+def test_offsets():
+    games = [{"Event": b"Rated Blitz game", "White": b"x" * i} for i in range(5)]
+    data = pgn_data(games)
+    [batch] = parse_batches(games, [])
+
+    for i, (offset, length) in enumerate(zip(batch["offset"].tolist(), batch["length"].tolist())):
+        assert data[offset:offset + length] == pgn_data(games[i:i + 1]).strip()
@@ -0,0 +1,92 @@
+import os
+import random
+import sys
+
+import chess
+import chess.engine
+import pytest
+
+pytest.importorskip("pyparser")
+
+from preprocessing import engine
+from preprocessing import fake_engine
+
+
+# --------------
+# Helper defines
+# --------------
+
+# Positions of random games (without finished ones, so every evaluation is in centipawns)
+def random_boards(seed: int, n: int) -> list[chess.Board]:
+    rng = random.Random(seed)
+    boards = []
+
+    while len(boards) < n:
+        board = chess.Board()
+        for _ in range(rng.randrange(1, 60)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+
+        if not board.is_game_over():
+            boards.append(board)
+
+    return boards
+
+
+def engine_command(*options: str) -> list[str]:
+    return [sys.executable, "-m", "preprocessing.fake_engine", *options]
+
+
+@pytest.fixture(autouse=True)
+def engine_path(monkeypatch):
+    # Engines are started as modules of the package, whatever the working directory is
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                       os.environ.get("PYTHONPATH", "")]))
+
+
+# -----
+# Tests
+# -----
+
+@pytest.mark.parametrize("n_engines, options", [(1, []), (4, []), (4, ["--delay=5"])])
+def test_scores_in_order(n_engines: int, options: list[str]):
+    boards = random_boards(1, 40)
+
+    with engine.EnginePool(engine_command(*options), n_engines) as pool:
+        scores = pool.analyse(boards)
+
+        assert pool.engine_id() == "FakeEngine 1.0"
+
+    assert scores == [fake_engine.evaluate(board) for board in boards]
+    assert (pool.analysed, pool.failed, pool.restarts) == (40, 0, 0)
+
+
+# Crashed engines are restarted and their positions analysed again
+@pytest.mark.parametrize("n_engines", [1, 3])
+def test_crashing_engines(n_engines: int):
+    boards = random_boards(2, 30)
+
+    with engine.EnginePool(engine_command("--crash-every=4"), n_engines) as pool:
+        scores = pool.analyse(boards)
+
+    assert scores == [fake_engine.evaluate(board) for board in boards]
+    assert pool.failed == 0
+    assert pool.restarts >= 30 // 4 // n_engines
+
+
+# A position of an engine which can not be restarted is analysed by another one, even if that one has found the queue empty before
+# - The first engine crashes in its second search (the last position), long after the slower second engine is done with its first one
+def test_dead_engine_position_is_taken_over(monkeypatch):
+    boards = random_boards(3, 3)
+
+    commands = iter([engine_command("--delay=40", "--crash-every=2"), engine_command("--delay=60"), [sys.executable, "-c", "pass"]])
+    popen_uci = chess.engine.popen_uci
+    monkeypatch.setattr(chess.engine, "popen_uci", lambda _: popen_uci(next(commands)))
+
+    with engine.EnginePool("engine", 2) as pool:
+        scores = pool.analyse(boards)
+
+    assert scores == [fake_engine.evaluate(board) for board in boards]
+    assert (pool.failed, pool.restarts) == (0, 1)
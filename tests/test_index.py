@@ -0,0 +1,93 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("pyparser")
+
+from benchmarks import corpus
+from preprocessing import index
+from preprocessing import reader
+from preprocessing import search
+
+
+# --------------
+# Helper defines
+# --------------
+
+@pytest.fixture(scope="module")
+def corpus_files(tmp_path_factory) -> tuple[str, str]:
+    output_file = str(tmp_path_factory.mktemp("corpus") / "corpus.pgn")
+    return corpus.write_corpus(output_file, corpus.CorpusConfig(games=3000, players=150), frame_size=1 << 17)
+
+
+# Returns players and PGN data of games read by the parser (just like the searching stages do without an index)
+def scanned_games(input_file: str, player_names: set[str] | None = None) -> list[tuple[list, bytes]]:
+    game_reader = reader.ZstdQuickReader if index.is_compressed(input_file) else reader.StandardQuickReader
+
+    with game_reader(input_file, max_games=sys.maxsize) as game_repo:
+        criterion = search.is_std_rapid_10_minutes_with_eval if player_names else lambda game: True
+        return [(players, bytes(data)) for players, data in search.iter_games(game_repo, criterion, player_names)]
+
+
+# -----
+# Tests
+# -----
+
+def test_multiple_frames(corpus_files: tuple[str, str]):
+    assert len(reader.scan_frames(corpus_files[1])) > 5
+    assert len(index.frame_table(corpus_files[1])) == len(reader.scan_frames(corpus_files[1]))
+
+
+# Every game is read back byte by byte, from the plain file and across frames of the .zst file
+@pytest.mark.parametrize("compressed", [False, True])
+def test_read_games(tmp_path, corpus_files: tuple[str, str], compressed: bool):
+    input_file = corpus_files[compressed]
+    game_index = index.build_index(input_file, str(tmp_path / "index"))
+    games = scanned_games(input_file)
+
+    assert len(game_index) == len(games) == 3000
+    assert list(game_index.iter_games(game_index["length"] > 0)) == games
+
+    # Any selection, not just all games
+    selection = [2999, 17, 1500, 18, 0]
+    assert list(game_index.read_games(selection)) == [games[i][1] for i in sorted(selection)]
+
+
+# The index criterion with played_by selects the same games as the searching stages select by scanning
+def test_selection_matches_scan(tmp_path, corpus_files: tuple[str, str]):
+    game_index = index.build_index(corpus_files[1], str(tmp_path / "index"))
+    player_names = set(game_index.players()[::3])
+
+    games = list(search.iter_indexed_games(game_index, search.is_std_rapid_10_minutes_with_eval_index, player_names))
+
+    assert len(games) > 50
+    assert games == scanned_games(corpus_files[1], player_names)
+
+
+# An index is valid only for the version of the file it was built from
+def test_freshness(tmp_path, corpus_files: tuple[str, str]):
+    input_file = str(tmp_path / "games.pgn.zst")
+    with open(corpus_files[1], "rb") as source, open(input_file, "wb") as file:
+        file.write(source.read())
+
+    assert not index.is_fresh(input_file)
+
+    index.build_index(input_file)
+    assert index.is_fresh(input_file)
+
+    # Touched
+    stat = os.stat(input_file)
+    os.utime(input_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert not index.is_fresh(input_file)
+
+    index.build_index(input_file)
+    assert index.is_fresh(input_file)
+
+    # Appended to
+    with open(input_file, "ab") as file:
+        file.write(b"\n")
+    assert not index.is_fresh(input_file)
+
+    with pytest.raises(ValueError):
+        index.GameIndex(input_file)
@@ -0,0 +1,51 @@
+import io
+
+import pytest
+
+pyparser = pytest.importorskip("pyparser")
+
+
+# --------------
+# Helper defines
+# --------------
+
+SHORT_GAME = b'[Event "Rated Rapid game"]\n[Site "https://lichess.org/short"]\n\n1. e4 e5 1-0'
+
+# Way over the initial capacity of game storage, so it has to grow
+LONG_GAME = b'[Event "Rated Rapid game"]\n[Site "https://lichess.org/long"]\n\n' + b" ".join(
+    f"{i}. Nf3 {{ [%eval 0.17] [%clk 0:10:00] }} {i}... Nf6 {{ [%eval 0.2] [%clk 0:10:00] }}".encode() for i in range(1, 2500)) + b" 1/2-1/2"
+
+
+def parsers(tmp_path, games: list[bytes]):
+    data = b"\n\n".join(games) + b"\n"
+    (tmp_path / "games.pgn").write_bytes(data)
+
+    yield pyparser.Parser(io.BytesIO(data))
+    yield pyparser.Parser(str(tmp_path / "games.pgn"))
+
+
+# -----
+# Tests
+# -----
+
+# Views stay valid and unchanged after next games are parsed, even if game storage grows in the meantime
+def test_views_outlive_next_games(tmp_path):
+    assert len(LONG_GAME) > 160000
+
+    for parser in parsers(tmp_path, [SHORT_GAME, LONG_GAME, SHORT_GAME.replace(b"short", b"other")]):
+        views = []
+        while parser.parse_next():
+            views.append(parser.all_data_view(strip=True))
+
+        assert [bytes(view) for view in views] == [SHORT_GAME, LONG_GAME, SHORT_GAME.replace(b"short", b"other")]
+        assert all(view.readonly for view in views)
+
+
+# Views keep the data even after the parser itself is gone
+def test_views_outlive_parser(tmp_path):
+    for parser in parsers(tmp_path, [SHORT_GAME]):
+        assert parser.parse_next()
+        view = parser.all_data_view(strip=True)
+
+        del parser
+        assert bytes(view) == SHORT_GAME
@@ -0,0 +1,120 @@
+import sys
+
+from collections import Counter
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyparser")
+
+from benchmarks import corpus
+from preprocessing import index
+from preprocessing import pgn
+from preprocessing import profiler
+from preprocessing import reader
+
+
+# --------------
+# Helper defines
+# --------------
+
+@pytest.fixture(scope="module")
+def input_file(tmp_path_factory) -> str:
+    output_file = str(tmp_path_factory.mktemp("corpus") / "corpus.pgn")
+    return corpus.write_corpus(output_file, corpus.CorpusConfig(games=3000, players=400), frame_size=1 << 17)[1]
+
+
+# Profiles the file game by game, straight from the headers
+def brute_force_profile(input_file: str) -> profiler.DumpProfile:
+    profile = profiler.DumpProfile()
+    players = Counter()
+
+    with reader.ZstdQuickReader(input_file, max_games=sys.maxsize) as game_repo:
+        for game in game_repo:
+            tempo = pgn.tempo(game.data.header("Event"))
+            tempo = tempo if tempo in index.TEMPOS else "other"
+            base, _, increment = game.data.header("TimeControl").partition("+")
+
+            profile.games += 1
+            profile.time_controls[(tempo, int(base), int(increment))] += 1
+            profile.terminations[game.data.header("Termination")] += 1
+            profile.coverage[(tempo, game.data.has_evals(), game.data.has_clocks())] += 1
+
+            for side, column in enumerate(["WhiteElo", "BlackElo"]):
+                rating = game.data.header(column)
+                profile.ratings[side, min(int(rating) // profiler.RATING_BIN, profiler.RATING_BINS - 1) if rating else profiler.RATING_BINS] += 1
+
+            for name in [game.data.header("White"), game.data.header("Black")]:
+                players[name] += 1
+
+    profile.games_per_player = Counter(players.values())
+
+    return profile
+
+
+def assert_same_profile(profile: profiler.DumpProfile, expected: profiler.DumpProfile):
+    assert profile.games == expected.games
+    assert profile.time_controls == expected.time_controls
+    assert np.array_equal(profile.ratings, expected.ratings)
+    assert profile.terminations == expected.terminations
+    assert profile.coverage == expected.coverage
+    assert profile.games_per_player == expected.games_per_player
+
+
+# -----
+# Tests
+# -----
+
+# Player counts of many small batches are compacted on the way, parallel profiles are merged from many work units
+@pytest.mark.parametrize("parallel", [False, True])
+def test_profile_matches_brute_force(monkeypatch, input_file: str, parallel: bool):
+    monkeypatch.setattr(profiler, "PENDING_PLAYERS", 100)
+
+    if parallel:
+        game_repo = reader.ZstdParallelReader(input_file, max_games=sys.maxsize, n_workers=2, unit_size=1 << 17)
+    else:
+        game_repo = reader.ZstdQuickReader(input_file, max_games=sys.maxsize)
+
+    with game_repo:
+        profile = profiler.profile_dump(game_repo) if parallel else profiler.profile_games(game_repo, batch_size=64).finish()
+
+    expected = brute_force_profile(input_file)
+
+    assert_same_profile(profile, expected)
+    assert profile.no_players() == sum(expected.games_per_player.values())
+    assert sum(games * players for games, players in profile.games_per_player.items()) == 2 * profile.games
+
+
+def test_merge_is_commutative(input_file: str):
+    profiles = []
+
+    for unit in reader.split_work_units(input_file, 1 << 17)[:2]:
+        with reader.ZstdChunkReader(input_file, unit, max_games=sys.maxsize) as game_repo:
+            profiles.append(profiler.profile_games(game_repo))
+
+    assert_same_profile(profiles[0].merge(profiles[1]).finish(), profiles[1].merge(profiles[0]).finish())
+
+
+def test_without_players(input_file: str):
+    with reader.ZstdQuickReader(input_file, max_games=sys.maxsize) as game_repo:
+        profile = profiler.profile_dump(game_repo, count_players=False)
+
+    assert profile.games == 3000
+    assert profile.no_players() == 0
+
+
+def test_save_and_load(tmp_path, input_file: str):
+    with reader.ZstdQuickReader(input_file, max_games=sys.maxsize) as game_repo:
+        profile = profiler.profile_dump(game_repo)
+
+    profile.save(str(tmp_path / "profile.json"))
+    loaded = profiler.DumpProfile.load(str(tmp_path / "profile.json"))
+
+    assert_same_profile(loaded, profile)
+    assert loaded.no_players() == profile.no_players() > 0
+
+    # Profiles of another version are refused
+    (tmp_path / "old.json").write_text((tmp_path / "profile.json").read_text().replace(f'"version": {profiler.PROFILE_VERSION}', '"version": 0'))
+
+    with pytest.raises(ValueError):
+        profiler.DumpProfile.load(str(tmp_path / "old.json"))
@@ -0,0 +1,101 @@
+import random
+
+import chess
+import chess.polyglot
+import pytest
+
+pyparser = pytest.importorskip("pyparser")
+
+from benchmarks import corpus
+
+
+# --------------
+# Helper defines
+# --------------
+
+PIECE_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0}
+
+
+# Replays given SAN moves with python-chess, up to the first move it fails to parse (just like pyparser.replay should)
+def expected_replay(moves: list[str], fen: str = "") -> dict:
+    board = chess.Board(fen) if fen else chess.Board()
+    turn = board.turn == chess.WHITE
+    keys, book_moves, material = [], [], []
+
+    for san in moves:
+        try:
+            move = board.parse_san(san)
+        except ValueError:
+            break
+
+        raw = move.to_square | move.from_square << 6 | (move.promotion - 1 if move.promotion else 0) << 12
+        castling = raw
+        if board.is_castling(move):
+            rook_square = chess.square(7 if chess.square_file(move.to_square) > chess.square_file(move.from_square) else 0,
+                                       chess.square_rank(move.from_square))
+            castling = rook_square | move.from_square << 6
+
+        keys.append(chess.polyglot.zobrist_hash(board))
+        book_moves.append([raw, castling])
+
+        board.push(move)
+        material.append(sum(PIECE_VALUES[piece.piece_type] * (1 if piece.color == chess.WHITE else -1) for piece in board.piece_map().values()))
+
+    return {
+        "plies": len(keys), "turn": turn, "checkmate": board.is_checkmate(), "stalemate": board.is_stalemate(),
+        "keys": keys, "book_moves": book_moves, "material": material
+    }
+
+
+def assert_same_replay(moves: list[str], fen: str = ""):
+    replay = pyparser.replay(moves, fen)
+    expected = expected_replay(moves, fen)
+
+    assert replay.plies == expected["plies"]
+    assert replay.turn == expected["turn"]
+    assert replay.checkmate == expected["checkmate"]
+    assert replay.stalemate == expected["stalemate"]
+    assert replay.keys.tolist() == expected["keys"]
+    assert replay.book_moves.tolist() == expected["book_moves"]
+    assert replay.material.tolist() == expected["material"]
+
+
+# -----
+# Tests
+# -----
+
+# Random legal games of the benchmark corpus (castling, en passant, promotions and mates show up among them)
+def test_corpus_lines():
+    lines = corpus.generate_lines(random.Random(2025), corpus.CorpusConfig(no_lines=300))
+
+    for moves, _ in lines:
+        assert_same_replay(moves)
+
+
+@pytest.mark.parametrize("moves, fen", [
+    # Castling on both sides, also written with zeros
+    (["e4", "e5", "Nf3", "Nc6", "Bc4", "Bc5", "O-O", "d6", "d3", "Bg4", "Nc3", "Qd7", "Be3", "O-O-O"], ""),
+    (["e4", "e5", "Nf3", "Nc6", "Bc4", "Bc5", "0-0"], ""),
+    # En passant
+    (["e4", "a6", "e5", "d5", "exd6", "cxd6"], ""),
+    # Promotions with and without '=', underpromotion with check
+    (["a8=Q", "Kb2", "Qb7+"], "8/P7/8/8/8/8/8/k6K w - - 0 1"),
+    (["a8Q"], "8/P7/8/8/8/8/8/k6K w - - 0 1"),
+    (["bxa8=N"], "r7/1P6/8/8/8/8/8/k6K w - - 0 1"),
+    # Mate and stalemate
+    (["f3", "e5", "g4", "Qh4#"], ""),
+    (["Qg6"], "7k/5K2/8/8/8/8/8/6Q1 w - - 0 1"),
+    # Ambiguous, illegal and invalid SAN stop the replay
+    (["Nd2", "e5"], "4k3/8/8/8/8/5N2/8/1N2K3 w - - 0 1"),
+    (["e4", "e5", "e5"], ""),
+    (["e4", "Zz9"], ""),
+    # Long algebraic notation, UCI and null moves
+    (["e2e4", "e7-e5", "Ng1f3", "--", "d4"], ""),
+])
+def test_special_moves(moves: list[str], fen: str):
+    assert_same_replay(moves, fen)
+
+
+# Castling rights and en passant squares of the starting FEN are part of zobrist keys
+def test_fen_start():
+    assert_same_replay(["dxe6", "Kd8", "O-O"], "4k3/8/8/3Pp3/8/8/8/4K2R w K e6 0 1")
@@ -0,0 +1,145 @@
+import os
+import random
+import runpy
+import sys
+
+import pytest
+import zstandard as zstd
+
+pytest.importorskip("pyparser")
+
+from benchmarks import corpus
+from preprocessing import reader
+from preprocessing import resume
+from preprocessing import search
+
+
+# --------------
+# Helper defines
+# --------------
+
+RATING_BUCKETS = [(0, 1500, 3), (1500, 3000, 3)]
+
+
+class Interrupted(Exception):
+    pass
+
+
+# Makes every checkpoint stop its task right after the n-th snapshot (just like a crash or Ctrl+C would do)
+def interrupt_after(monkeypatch, n: int):
+    save = resume.Checkpoint.save
+
+    def interrupting_save(checkpoint: resume.Checkpoint, position: reader.ReaderPosition, state):
+        save(checkpoint, position, state)
+        if checkpoint.saves == n:
+            raise Interrupted
+
+    monkeypatch.setattr(resume.Checkpoint, "save", interrupting_save)
+
+
+@pytest.fixture(scope="module")
+def input_file(tmp_path_factory) -> str:
+    output_file = str(tmp_path_factory.mktemp("corpus") / "corpus.pgn")
+    return corpus.write_corpus(output_file, corpus.CorpusConfig(games=4000, players=120))[1]
+
+
+def find_players(input_file: str, checkpoint: resume.Checkpoint | None = None) -> list[str]:
+    random.seed(5)
+    start = checkpoint.position if checkpoint is not None else None
+
+    with reader.ZstdQuickReader(input_file, max_games=sys.maxsize, game_filter=search.STD_RAPID_10_MINUTES_WITH_EVAL_FILTER, start=start) as game_repo:
+        return sorted(search.find_players(game_repo, search.is_std_rapid_10_minutes_with_eval, k_players=12,
+                                          rating_buckets=RATING_BUCKETS, min_games=4, checkpoint=checkpoint))
+
+
+def read_games(file_path) -> bytes:
+    with open(file_path, "rb") as file:
+        return zstd.ZstdDecompressor().stream_reader(file, read_across_frames=True).read()
+
+
+# Runs a stage of the pipeline in given working directory (with its own config.yaml)
+def run_stage(monkeypatch, work_dir, *args: str):
+    monkeypatch.chdir(work_dir)
+    monkeypatch.setattr(sys, "argv", ["preprocessing", "all", *args])
+    runpy.run_module("preprocessing", run_name="__main__", alter_sys=True)
+
+
+# -----
+# Tests
+# -----
+
+# Interrupted search resumed from its checkpoint selects the same players as an uninterrupted one
+@pytest.mark.parametrize("interrupt", [1, 10, 40])
+def test_find_players_resumes(monkeypatch, tmp_path, input_file: str, interrupt: int):
+    expected = find_players(input_file)
+
+    checkpoint_filepath = str(tmp_path / "players.checkpoint")
+    key = ("players", 12, 4)
+
+    interrupt_after(monkeypatch, interrupt)
+    with pytest.raises(Interrupted):
+        find_players(input_file, resume.Checkpoint(checkpoint_filepath, input_file, key, interval=0))
+    monkeypatch.undo()
+
+    checkpoint = resume.Checkpoint(checkpoint_filepath, input_file, key, interval=0, resume=True)
+
+    assert checkpoint.state["processed"] == checkpoint.position.matched > 0
+    assert find_players(input_file, checkpoint) == expected
+
+
+# Games stage resumed from its checkpoint writes the same games as an uninterrupted one (frames may be split differently)
+def test_games_stage_resumes(monkeypatch, tmp_path, input_file: str):
+    players = find_players(input_file)
+
+    for name in ["whole", "resumed"]:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "players.txt").write_text("".join(player + "\n" for player in players), encoding="utf-8")
+        (tmp_path / name / "config.yaml").write_text(
+            f'paths:\n  data_raw: "{input_file}"\n  data_players: "players.txt"\ntarget_size: 12\ntarget_gpp: 4\n'
+        )
+
+    run_stage(monkeypatch, tmp_path / "whole", "games", "--games-output=games.pgn.zst", "--frame-games=8")
+
+    interrupt_after(monkeypatch, 5)
+    with pytest.raises(Interrupted):
+        run_stage(monkeypatch, tmp_path / "resumed", "games", "--games-output=games.pgn.zst", "--frame-games=8", "--checkpoint-interval=0")
+
+    assert os.path.exists(tmp_path / "resumed" / "games.checkpoint")
+
+    monkeypatch.undo()
+    run_stage(monkeypatch, tmp_path / "resumed", "games", "--games-output=games.pgn.zst", "--frame-games=8", "--checkpoint-interval=0",
+              "--resume")
+
+    assert not os.path.exists(tmp_path / "resumed" / "games.checkpoint")
+    assert read_games(tmp_path / "resumed" / "games.pgn.zst") == read_games(tmp_path / "whole" / "games.pgn.zst")
+
+
+# A checkpoint is restored only for the same task and the same version of the input file
+def test_checkpoint_binding(tmp_path, input_file: str):
+    copied_file = str(tmp_path / "games.pgn.zst")
+    with open(input_file, "rb") as source, open(copied_file, "wb") as file:
+        file.write(source.read())
+
+    checkpoint_filepath = str(tmp_path / "task.checkpoint")
+    position = reader.ReaderPosition(0, 0, 1234, 10, 7)
+
+    resume.Checkpoint(checkpoint_filepath, copied_file, ("players", 1)).save(position, {"processed": 7})
+
+    restored = resume.Checkpoint(checkpoint_filepath, copied_file, ("players", 1), resume=True)
+    assert (restored.position, restored.state) == (position, {"processed": 7})
+
+    # Without --resume, with another key and with another input
+    for checkpoint in [resume.Checkpoint(checkpoint_filepath, copied_file, ("players", 1)),
+                       resume.Checkpoint(checkpoint_filepath, copied_file, ("players", 2), resume=True),
+                       resume.Checkpoint(checkpoint_filepath, input_file, ("players", 1), resume=True)]:
+        assert (checkpoint.position, checkpoint.state) == (None, None)
+
+    # Another version of the same input
+    with open(copied_file, "ab") as file:
+        file.write(b"\n")
+
+    checkpoint = resume.Checkpoint(checkpoint_filepath, copied_file, ("players", 1), resume=True)
+    assert (checkpoint.position, checkpoint.state) == (None, None)
+
+    checkpoint.clear()
+    assert not os.path.exists(checkpoint_filepath)
@@ -0,0 +1,100 @@
+import io
+
+import pytest
+
+pyparser = pytest.importorskip("pyparser")
+
+from preprocessing import pgn
+
+
+# --------------
+# Helper defines
+# --------------
+
+SCHEMA = [("WhiteElo", "int"), ("TimeControl", "time_control"), ("Event", "tempo"), ("Result", "enum"), ("White", "str")]
+
+
+# Returns PGN data of games with given headers (values are bytes, so they do not have to be valid UTF-8)
+def pgn_data(games: list[dict[str, bytes]]) -> bytes:
+    return b"".join(b"".join(b'[%s "%s"]\n' % (name.encode(), value) for name, value in headers.items()) + b"\n1. e4 e5 *\n\n"
+                    for headers in games)
+
+
+# Returns typed fields of all games
+def parse_fields(games: list[dict[str, bytes]], schema: list[tuple[str, str]] = SCHEMA) -> list[tuple]:
+    parser = pyparser.Parser(io.BytesIO(pgn_data(games)))
+    parser.set_schema(schema)
+
+    fields = []
+    while parser.parse_next():
+        fields.append(parser.fields())
+
+    return fields
+
+
+# -----
+# Tests
+# -----
+
+# Integers have to be whole header values, anything else is None
+def test_int_fields():
+    values = [b"1500", b"-3", b"+12", b"", b"?", b"1500?", b"99999999999"]
+    fields = parse_fields([{"WhiteElo": value} for value in values] + [{}], [("WhiteElo", "int")])
+
+    assert [value for value, in fields] == [1500, -3, 12, None, None, None, None, None]
+
+
+# Time controls are (base, increment) pairs, None for "-" of correspondence games and anything malformed
+def test_time_control_fields():
+    values = [b"600+0", b"180+2", b"-", b"", b"600", b"600+0 ", b"600+x"]
+    fields = parse_fields([{"TimeControl": value} for value in values], [("TimeControl", "time_control")])
+
+    assert [value for value, in fields] == [(600, 0), (180, 2), None, None, None, None, None]
+
+
+# Tempo is the same as pgn.tempo() of the Event header (for ASCII), tempo and enum strings are shared by all games
+def test_tempo_and_enum_fields():
+    events = [b"Rated Rapid game", b"Casual Bullet game", b"  Rated   Rapid   game ", b"Rated UltraBullet game", b"Rated Rapid game",
+              b"Rated Correspondence game", b"Rapid", b""]
+    results = [b"1-0", b"0-1", b"1/2-1/2", b"1-0", b"*", b"1-0", b"0-1", b"1-0"]
+    fields = parse_fields([{"Event": event, "Result": result} for event, result in zip(events, results)],
+                          [("Event", "tempo"), ("Result", "enum")])
+
+    assert [tempo for tempo, _ in fields] == [pgn.tempo(event.decode()) for event in events]
+    assert [result for _, result in fields] == [result.decode() for result in results]
+
+    assert fields[0][0] is fields[2][0] is fields[4][0]
+    assert fields[0][1] is fields[3][1] is fields[5][1] is fields[7][1]
+
+
+# Strings are decoded just like values of batch columns, with invalid UTF-8 replaced
+def test_string_fields():
+    names = [b"alice", b"caf\xc3\xa9", b"caf\xe9", b"\xff\xfe"]
+    games = [{"White": name, "Result": name} for name in names]
+
+    fields = parse_fields(games, [("White", "str"), ("Result", "enum")])
+    codes, values = pyparser.Parser(io.BytesIO(pgn_data(games))).parse_batch(len(games), ["White"])["White"]
+
+    assert [white for white, _ in fields] == [name.decode("utf-8", errors="replace") for name in names]
+    assert [result for _, result in fields] == [white for white, _ in fields]
+    assert [values[code] for code in codes.tolist()] == [white for white, _ in fields]
+
+
+# The last header wins if there are more of them with the same name, missing headers are like empty ones
+def test_repeated_and_missing_headers():
+    data = b'[White "first"]\n[WhiteElo "1200"]\n[White "second"]\n\n1. e4 *\n\n'
+    parser = pyparser.Parser(io.BytesIO(data))
+
+    assert parser.parse_next()
+    assert parser.fields() is None
+
+    parser.set_schema(SCHEMA)
+    assert parser.fields() == (1200, None, "", "", "second")
+    assert parser.header("White") == "second"
+
+
+def test_unknown_type():
+    parser = pyparser.Parser(io.BytesIO(b""))
+
+    with pytest.raises(ValueError):
+        parser.set_schema([("White", "name")])
@@ -0,0 +1,100 @@
+import pickle
+import random
+
+import pytest
+
+pytest.importorskip("pyparser")
+
+from preprocessing import pgn
+from preprocessing import search
+
+
+# --------------
+# Player counter
+# --------------
+
+# Yields names of games of a skewed population (a few players play a lot), including non-ASCII names
+def random_names(rng: random.Random, no_games: int, no_players: int):
+    players = [f"player{i}" if i % 7 else f"hráč-{i}" for i in range(no_players)]
+
+    for _ in range(no_games):
+        yield players[min(int(rng.paretovariate(1.2)) - 1, no_players - 1) if rng.random() < 0.5 else rng.randrange(no_players)]
+
+
+# The counter behaves just like a {name: number_of_games} dictionary, also after growing from a tiny capacity
+def test_counts_like_dictionary():
+    counter = search.PlayerCounter(min_games=5, capacity=4)
+    counts = {}
+
+    for name in random_names(random.Random(1), 20000, 3000):
+        counts[name] = counts.get(name, 0) + 1
+        assert counter.add(name) == (list(counts).index(name) if counts[name] == 1 else counter.find(name), counts[name])
+
+    assert len(counter) == len(counts)
+    assert [counter.find(name) for name in counts] == list(range(len(counts)))
+    assert counter.find("nobody") == -1
+    assert counter.candidates() == sum(count >= 5 for count in counts.values())
+
+
+# Shuffled names follow random.shuffle of all players in the order of their first games, just like the former dictionary
+def test_shuffled_names():
+    counter = search.PlayerCounter(min_games=3)
+    counts = {}
+
+    for name in random_names(random.Random(2), 5000, 800):
+        counter.add(name)
+        counts[name] = counts.get(name, 0) + 1
+
+    random.seed(3)
+    names = list(counter.shuffled_names())
+    random.seed(3)
+    players = list(counts)
+    random.shuffle(players)
+
+    assert names == [name if counts[name] >= 3 else None for name in players]
+
+
+# Counts saturate at MAX_COUNT, reaching min_games is reported only once
+def test_saturation():
+    counter = search.PlayerCounter(min_games=search.MAX_COUNT - 1)
+    results = [counter.add("grinder")[1] for _ in range(search.MAX_COUNT + 100)]
+
+    assert results[-1] == search.MAX_COUNT
+    assert results.count(counter.min_games) == 1
+    assert counter.candidates() == 1
+
+    for min_games in [0, search.MAX_COUNT]:
+        with pytest.raises(ValueError):
+            search.PlayerCounter(min_games)
+
+
+# A pickled counter (like one restored from a checkpoint) continues counting
+def test_pickle():
+    counter = search.PlayerCounter(min_games=2, capacity=8)
+    names = list(random_names(random.Random(4), 2000, 500))
+
+    for name in names[:1000]:
+        counter.add(name)
+
+    restored = pickle.loads(pickle.dumps(counter))
+
+    for name in names[1000:]:
+        assert restored.add(name) == counter.add(name)
+
+    assert restored.nbytes() == counter.nbytes()
+
+
+# ----------------
+# Player selection
+# ----------------
+
+# A player becomes a candidate exactly once, at their min_games-th game
+def test_selection_counts_candidates_once():
+    selection = search.PlayerSelection(k_players=10, rating_buckets=[(0, 3000, 10)], min_games=3)
+
+    for _ in range(10):
+        selection.add_game([pgn.Player("alice", 1500), pgn.Player("someBOT", 2000)])
+
+    assert selection.found == 1
+    assert selection.to_find == [9]
+    assert selection.selected_players == {"alice"}
@@ -0,0 +1,131 @@
+import os
+
+import pytest
+import zstandard as zstd
+
+pytest.importorskip("pyparser")
+
+from preprocessing import reader
+from preprocessing import sink
+
+
+# --------------
+# Helper defines
+# --------------
+
+GAMES = [f'[Event "Rated Rapid game"]\n[Site "https://lichess.org/g{i:05d}"]\n\n1. e4 e5 {i % 3}-{(i + 1) % 3} *'.encode() for i in range(250)]
+
+
+# Returns the content of a plain or .zst file
+def read_file(file_path: str) -> bytes:
+    with open(file_path, "rb") as file:
+        data = file.read()
+
+    return zstd.ZstdDecompressor().stream_reader(data, read_across_frames=True).read() if file_path.endswith(".zst") else data
+
+
+# Returns decompressed data of each frame of a .zst file
+def read_frames(file_path: str) -> list[bytes]:
+    with open(file_path, "rb") as file:
+        data = file.read()
+
+    return [zstd.ZstdDecompressor().stream_reader(data[offset:offset + size]).read() for offset, size in reader.scan_frames(file_path)]
+
+
+def expected(games: list[bytes]) -> bytes:
+    return b"".join(game + sink.GAME_SEPARATOR for game in games)
+
+
+# -----
+# Tests
+# -----
+
+@pytest.mark.parametrize("name", ["games.pgn", "games.pgn.zst"])
+def test_writes_all_games(tmp_path, name: str):
+    output_file = str(tmp_path / name)
+
+    with sink.open_sink(output_file, frame_games=16) as output:
+        for game in GAMES:
+            output.write(memoryview(game))
+
+    assert output.games == len(GAMES)
+    assert read_file(output_file) == expected(GAMES)
+
+
+# Every frame holds frame_games whole games, so frames can be read in parallel
+def test_zstd_frames(tmp_path):
+    output_file = str(tmp_path / "games.pgn.zst")
+
+    with sink.open_sink(output_file, frame_games=16) as output:
+        for game in GAMES:
+            output.write(game)
+
+    frames = read_frames(output_file)
+
+    assert len(frames) == (len(GAMES) + 15) // 16
+    assert frames == [expected(GAMES[i:i + 16]) for i in range(0, len(GAMES), 16)]
+
+
+# Writing continues from a position, anything written after it is dropped
+@pytest.mark.parametrize("name, shard_games", [("games.pgn", 0), ("games.pgn.zst", 0), ("games.pgn", 40), ("games.pgn.zst", 40)])
+def test_resume(tmp_path, name: str, shard_games: int):
+    output_file = str(tmp_path / name)
+
+    with sink.open_sink(output_file, frame_games=16, shard_games=shard_games) as output:
+        for game in GAMES[:100]:
+            output.write(game)
+
+        position = output.position()
+
+        # Written after the position (like games found before a crash, but after the last checkpoint)
+        for game in GAMES[100:200]:
+            output.write(game)
+
+    with sink.open_sink(output_file, frame_games=16, shard_games=shard_games, start=position) as output:
+        for game in GAMES[100:]:
+            output.write(game)
+
+    files = sink.shard_files(output_file) if shard_games else [output_file]
+
+    assert position.games == 100
+    assert b"".join(read_file(file_path) for file_path in files) == expected(GAMES)
+
+
+# Shards hold shard_games games each, named by shard_filepath()
+def test_shards(tmp_path):
+    output_file = str(tmp_path / "games.pgn.zst")
+
+    with sink.open_sink(output_file, frame_games=16, shard_games=40) as output:
+        for game in GAMES:
+            output.write(game)
+
+    files = sink.shard_files(output_file)
+
+    assert files == [sink.shard_filepath(output_file, shard) for shard in range(7)]
+    assert files[3].endswith("games-00003.pgn.zst")
+    assert [read_file(file_path) for file_path in files] == [expected(GAMES[i:i + 40]) for i in range(0, len(GAMES), 40)]
+    assert not os.path.exists(output_file)
+
+
+# A fresh output replaces shards and the plain file of earlier runs
+def test_fresh_output_removes_earlier_runs(tmp_path):
+    output_file = str(tmp_path / "games.pgn")
+
+    for shard_games in [20, 100]:
+        with sink.open_sink(output_file, shard_games=shard_games) as output:
+            for game in GAMES:
+                output.write(game)
+
+        assert len(sink.shard_files(output_file)) == (len(GAMES) + shard_games - 1) // shard_games
+
+    with sink.open_sink(output_file) as output:
+        output.write(GAMES[0])
+
+    assert sink.shard_files(output_file) == []
+    assert read_file(output_file) == expected(GAMES[:1])
+
+    with sink.open_sink(output_file, shard_games=100) as output:
+        output.write(GAMES[0])
+
+    assert len(sink.shard_files(output_file)) == 1
+    assert not os.path.exists(output_file)
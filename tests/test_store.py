@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+pytest.importorskip("pyparser")
+
+from benchmarks import corpus
+from preprocessing import final
+from preprocessing import reader
+from preprocessing import store
+
+
+# --------------
+# Helper defines
+# --------------
+
+GPP = 4
+
+# A month of games, in two halves (with players of both of them and players of only one of them)
+@pytest.fixture(scope="module")
+def dumps(tmp_path_factory) -> dict[str, str]:
+    dump_dir = tmp_path_factory.mktemp("dumps")
+    games = list(corpus.generate_games(corpus.CorpusConfig(games=1500, players=300, eval_fraction=0.5)))
+
+    # Players of the second half with new names, so some of them are new in the second month
+    rng = random.Random(1)
+    renamed = [game.replace(b'[White "', b'[White "new-') if i >= 750 and rng.random() < 0.2 else game for i, game in enumerate(games)]
+
+    dumps = {"whole": renamed, "2025-01": renamed[:750], "2025-02": renamed[750:]}
+
+    for name, dump in dumps.items():
+        (dump_dir / f"{name}.pgn").write_bytes(b"".join(dump))
+
+    return {name: str(dump_dir / f"{name}.pgn") for name in dumps}
+
+
+def analyse(input_file: str) -> dict[str, final.PlayerData]:
+    with reader.StandardQuickReader(input_file, max_games=10**9) as game_repo:
+        return final.analyse_dump(game_repo, engine_filepath=None, book_filepath=None, gpp=GPP)
+
+
+# -----
+# Tests
+# -----
+
+# Dataset of the store equals the dataset of all ingested months at once, also after the store is opened again
+def test_ingested_months(tmp_path, dumps: dict[str, str]):
+    with reader.StandardQuickReader(dumps["whole"], max_games=10**9) as game_repo:
+        expected = final.create_dataset(game_repo, engine_filepath=None, book_filepath=None, gpp=GPP)
+
+    store_dir = str(tmp_path / "store")
+
+    for month in ["2025-01", "2025-02"]:
+        with store.PlayerStore(store_dir, gpp=GPP) as player_store:
+            player_store.ingest(analyse(dumps[month]), dumps[month])
+
+    with store.PlayerStore(store_dir, gpp=GPP) as player_store:
+        dataset = player_store.dataset()
+
+        assert len(player_store) == len(analyse(dumps["whole"]))
+        assert [source["file"] for source in player_store.meta["sources"]] == ["2025-01.pgn", "2025-02.pgn"]
+
+    assert len(dataset) > 50 and any(name.startswith("new-") for name in dataset)
+    assert dataset == expected
+
+
+def test_duplicate_ingestion(tmp_path, dumps: dict[str, str]):
+    with store.PlayerStore(str(tmp_path / "store"), gpp=GPP) as player_store:
+        player_store.ingest(analyse(dumps["2025-01"]), dumps["2025-01"])
+
+        assert player_store.contains(dumps["2025-01"])
+        assert not player_store.contains(dumps["2025-02"])
+
+        with pytest.raises(ValueError):
+            player_store.ingest(analyse(dumps["2025-01"]), dumps["2025-01"])
+
+    # Nothing was written by the refused ingestion
+    with store.PlayerStore(str(tmp_path / "store"), gpp=GPP) as player_store:
+        assert len(player_store.meta["sources"]) == 1
+
+
+def test_mismatched_store(monkeypatch, tmp_path, dumps: dict[str, str]):
+    store_dir = str(tmp_path / "store")
+
+    with store.PlayerStore(store_dir, gpp=GPP) as player_store:
+        player_store.ingest(analyse(dumps["2025-01"]), dumps["2025-01"])
+
+    with pytest.raises(ValueError):
+        store.PlayerStore(store_dir, gpp=GPP + 1)
+
+    monkeypatch.setattr(store, "STORE_VERSION", store.STORE_VERSION + 1)
+
+    with pytest.raises(ValueError):
+        store.PlayerStore(store_dir, gpp=GPP)